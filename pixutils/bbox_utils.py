@@ -0,0 +1,137 @@
+import logging
+from typing import Dict, Hashable, Iterable, List, Sequence, Union
+import numpy as np
+import shapely
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+from shapely.strtree import STRtree
+
+logger = logging.getLogger("bbox_utils")
+
+GeometryLike = Union[str, bytes, BaseGeometry]
+
+
+def bbox_geometries(swlat, swlon, nelat, nelon) -> np.ndarray:
+    """
+    Creates bounding box polygons from arrays of corner co-ordinates in one call.  The rings run in the same order as
+    'eo_utilities.create_wkt_points': south west, north west, north east, south east.
+    :param swlat: bounding box co-ordinates (southwest-latitude), a scalar or array
+    :param swlon: bounding box co-ordinates (southwest-longitude), a scalar or array
+    :param nelat: bounding box co-ordinates (northeast-latitude), a scalar or array
+    :param nelon: bounding box co-ordinates (northeast-longitude), a scalar or array
+    :return: an array of shapely Polygons, broadcast from the inputs
+    """
+    return shapely.box(swlon, swlat, nelon, nelat, ccw=False)
+
+
+def bbox_wkt(swlat, swlon, nelat, nelon, rounding_precision: int = -1) -> np.ndarray:
+    """
+    Creates WKT strings of bounding boxes from arrays of corner co-ordinates, see 'bbox_geometries'
+    :param rounding_precision: the number of decimal places written, or -1 for full precision
+    :return: an array of WKT strings
+    """
+    return shapely.to_wkt(bbox_geometries(swlat, swlon, nelat, nelon), rounding_precision=rounding_precision)
+
+
+def bbox_wkb(swlat, swlon, nelat, nelon) -> np.ndarray:
+    """
+    Creates WKB of bounding boxes from arrays of corner co-ordinates, see 'bbox_geometries'
+    :return: an array of WKB bytes
+    """
+    return shapely.to_wkb(bbox_geometries(swlat, swlon, nelat, nelon))
+
+
+def as_geometries(geometries: Union[GeometryLike, Iterable[GeometryLike]]) -> np.ndarray:
+    """
+    Converts WKT strings, WKB bytes or shapely geometries (or a mix) to an array of shapely geometries
+    """
+    if isinstance(geometries, (str, bytes, BaseGeometry)):
+        geometries = [geometries]
+    geometries = np.asarray(list(geometries), dtype=object)
+    parsed = geometries.copy()
+    for kind, parse in [(str, shapely.from_wkt), (bytes, shapely.from_wkb)]:
+        mask = np.array([isinstance(g, kind) for g in geometries], dtype=bool)
+        if mask.any():
+            parsed[mask] = parse(geometries[mask].astype(object))
+    return parsed
+
+
+class AoiIndex:
+    """
+    An STRtree index of areas of interest, for finding which AOIs intersect a product footprint without testing every
+    AOI against every footprint.
+    """
+
+    def __init__(self, geometries: Iterable[GeometryLike], ids: Sequence[Hashable] = None):
+        """
+        :param geometries: the AOIs as WKT strings, WKB bytes or shapely geometries
+        :param ids: optional, an identifier for each AOI (default: the position of the AOI)
+        """
+        self.geometries = as_geometries(geometries)
+        self.ids = list(range(len(self.geometries))) if ids is None else list(ids)
+        if len(self.ids) != len(self.geometries):
+            raise ValueError("Expected {} ids, got {}.".format(len(self.geometries), len(self.ids)))
+        self._tree = STRtree(self.geometries)
+
+    @classmethod
+    def from_bboxes(cls, swlat, swlon, nelat, nelon, ids: Sequence[Hashable] = None) -> "AoiIndex":
+        """
+        Creates an index of bounding box AOIs from arrays of corner co-ordinates, see 'bbox_geometries'
+        """
+        return cls(np.atleast_1d(bbox_geometries(swlat, swlon, nelat, nelon)), ids)
+
+    @classmethod
+    def from_geojson(cls, geojson: dict, id_property: str = None) -> "AoiIndex":
+        """
+        Creates an index of the AOIs in a GeoJSON object
+        :param geojson: a FeatureCollection, a Feature or a bare geometry, i.e. as read by 'json.load'
+        :param id_property: optional, the feature property holding each AOI's id (default: the position of the feature)
+        """
+        if geojson.get("type") == "FeatureCollection":
+            features = geojson["features"]
+        elif geojson.get("type") == "Feature":
+            features = [geojson]
+        else:
+            features = [{"geometry": geojson, "properties": {}}]
+        ids = None if id_property is None else [(f.get("properties") or {}).get(id_property) for f in features]
+        return cls([shape(f["geometry"]) for f in features], ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, footprint: GeometryLike) -> List[Hashable]:
+        """
+        Finds the AOIs that intersect a footprint
+        :param footprint: a WKT string, WKB bytes or a shapely geometry
+        :return: the ids of the intersecting AOIs, in index order
+        """
+        indices = self._tree.query(as_geometries(footprint)[0], predicate="intersects")
+        return [self.ids[i] for i in np.sort(indices)]
+
+    def query_many(self, footprints: Iterable[GeometryLike]) -> List[List[Hashable]]:
+        """
+        Finds the AOIs that intersect each of many footprints, with a single bulk tree query
+        :param footprints: WKT strings, WKB bytes or shapely geometries
+        :return: a list, per footprint, of the ids of the intersecting AOIs
+        """
+        footprints = as_geometries(footprints)
+        matches = [[] for _ in range(len(footprints))]
+        if len(footprints):
+            footprint_indices, aoi_indices = self._tree.query(footprints, predicate="intersects")
+            order = np.lexsort((aoi_indices, footprint_indices))
+            for f, a in zip(footprint_indices[order], aoi_indices[order]):
+                matches[f].append(self.ids[a])
+        return matches
+
+    def match_products(self, products: Dict[str, dict]) -> Dict[str, List[Hashable]]:
+        """
+        Matches search results (or downloads) to the AOIs their footprints intersect
+        :param products: a dictionary of product properties keyed by product id, each with a 'footprint' WKT string,
+        as returned by 'SentinelAPI.query'
+        :return: a dictionary of AOI ids keyed by product id, for the products that intersect at least one AOI
+        """
+        keys = [k for k, p in products.items() if p.get("footprint")]
+        if len(keys) < len(products):
+            logger.warning("{} products have no footprint.".format(len(products) - len(keys)))
+        matches = self.query_many([products[k]["footprint"] for k in keys])
+        return {k: m for k, m in zip(keys, matches) if m}
@@ -3,6 +3,9 @@ import logging
 import http.client
 import argparse
 import re
+from urllib.parse import urlsplit
+from pixutils.file_lock import single_flight, partial_path
+from pixutils.instrumentation import timed, count
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger("ceres_download")
 
@@ -13,6 +16,9 @@ DATE_REGEX_STR = r"(?P<year>(\d{4}))[-]?(?P<month>(\d{2}))[-]?(?P<day>(\d{2}))?"
 DAILY_NETFLUX_FILENAME = "CERES_NETFLUX_D_{y:04}-{m:02}-{d:02}.FLOAT.TIFF"
 MONTHLY_NETFLUX_FILENAME = "CERES_NETFLUX_M_{y:04}-{m:02}.FLOAT.TIFF"
 
+#   the server of the CERES archive
+CERES_SERVER = "https://neo.sci.gsfc.nasa.gov"
+
 #   remote filename paths
 DAILY_NETFLUX_PATH = "/archive/geotiff.float/CERES_NETFLUX_D/"
 MONTHLY_NETFLUX_PATH = "/archive/geotiff.float/CERES_NETFLUX_M/"
@@ -48,7 +54,8 @@ def _date_to_string(year: int, month: int, day: int = None) -> str:
         if day is not None else "{y:04}-{m:02}".format(y=year, m=month)
 
 
-def download_ceres_netflux(output_dir: str, year: int, month: int, day: int = None) -> str:
+def download_ceres_netflux(output_dir: str, year: int, month: int, day: int = None,
+                           server: str = CERES_SERVER) -> str:
     """
     Attempts to download CERES data for the date being processed
     :param output_dir: the location to write the downloaded data to
@@ -60,6 +67,7 @@ def download_ceres_netflux(output_dir: str, year: int, month: int, day: int = No
     :param day: the day to be downloaded.  Optional, if omitted the monthly product will be downloaded instead of the
     monthly.
     :type year: int
+    :param server: the URL of the server holding the archive, 'https://' or 'http://' (default: CERES_SERVER)
     :return: a string containing the filename of the requested NDVI data.
     :rtype: str
     :raises RuntimeError: if the remote server doesn't return a 200 OK response or if the output file can't be created
@@ -67,28 +75,38 @@ def download_ceres_netflux(output_dir: str, year: int, month: int, day: int = No
     filename = get_ceres_download_filename(year, month, day)
 
     local_file_path = os.path.join(output_dir, filename)
-    logger.info("Downloading CERES NETFLUX data for {}.".format(_date_to_string(year, month, day)))
-
-    # Connect to server
-    logger.debug('Connecting to CERES NETFLUX')
-    https = http.client.HTTPSConnection('neo.sci.gsfc.nasa.gov')
-
-    # Open and retrieve file
-    remote_path = DAILY_NETFLUX_PATH if day is not None else MONTHLY_NETFLUX_PATH
-    https.request('GET', os.path.join(remote_path, filename))
-    response = https.getresponse()
 
-    # Close connection
-    https.close()
-
-    # expect a '200 OK' response from server
-    if response.code == 200:
-        # download directly to NETFLUX diretory
-        with open(local_file_path, 'wb') as netFlux:
-            netFlux.write(response.read())
-    else:
-        raise RuntimeError("Unexpected response ({code}) from server '{reason}'.".format(code=response.code,
-                                                                                         reason=response.reason))
+    #   only one process downloads a file; others downloading the same file wait for it and return its path
+    with single_flight(local_file_path) as download:
+        if not download:
+            return local_file_path
+        logger.info("Downloading CERES NETFLUX data for {}.".format(_date_to_string(year, month, day)))
+
+        # Connect to server
+        logger.debug('Connecting to CERES NETFLUX')
+        with timed("connect", source="ceres"):
+            url = urlsplit(server)
+            connection = http.client.HTTPConnection if url.scheme == "http" else http.client.HTTPSConnection
+            https = connection(url.netloc)
+
+            # Open and retrieve file
+            remote_path = DAILY_NETFLUX_PATH if day is not None else MONTHLY_NETFLUX_PATH
+            https.request('GET', os.path.join(remote_path, filename))
+            response = https.getresponse()
+
+        # Close connection
+        https.close()
+
+        # expect a '200 OK' response from server
+        if response.code == 200:
+            # download to a partial file, moved in to place once complete so a failed download leaves no file behind
+            part_file_path = partial_path(local_file_path)
+            with timed("transfer", source="ceres"), open(part_file_path, 'wb') as netFlux:
+                count("bytes", netFlux.write(response.read()), phase="transfer", source="ceres")
+            os.replace(part_file_path, local_file_path)
+        else:
+            raise RuntimeError("Unexpected response ({code}) from server '{reason}'.".format(code=response.code,
+                                                                                             reason=response.reason))
 
     # downloaded file
     if not os.path.isfile(local_file_path):
@@ -0,0 +1,278 @@
+import os
+import time
+import shlex
+import signal
+import logging
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Iterable, List, Optional, Sequence, Union
+
+logger = logging.getLogger("command_runner")
+
+#   seconds between checks for the exit of a command, where the platform can't wait for a process without reaping it
+POLL_INTERVAL = 0.05
+
+#   the outcome of a command.  'returncode' is None if the command timed out or was cancelled before it exited
+#   normally, 'wall_time' and 'cpu_time' (user + system time of the command and its waited-for children) are in
+#   seconds, and 'cpu_time' is None where the platform can't report it.
+CommandResult = namedtuple("CommandResult", ["args", "returncode", "stdout", "stderr", "wall_time", "cpu_time",
+                                             "timed_out", "cancelled"])
+
+Command = Union[str, Sequence[str]]
+
+
+def _split(cmd: Command, shell: bool) -> Union[str, List[str]]:
+    if shell:
+        return cmd if isinstance(cmd, str) else " ".join(shlex.quote(c) for c in cmd)
+    return shlex.split(cmd) if isinstance(cmd, str) else [str(c) for c in cmd]
+
+
+class _Job:
+    """
+    A running command.  Output is read line by line on two threads while the command's own thread waits for the
+    process, so the process can be killed on timeout or cancellation from another thread.
+    """
+
+    def __init__(self, args, log: logging.Logger, log_level: int, capture: bool, merge_stderr: bool,
+                 text: bool = True, **popen_kwargs):
+        self.args = args
+        self._empty = "" if text else b""
+        self._log = log
+        self._log_level = log_level
+        self._capture = capture
+        self._name = os.path.basename(args[0] if isinstance(args, list) else shlex.split(args)[0])
+        self._lock = threading.Lock()
+        self._finished = False
+        self.timed_out = False
+        self.cancelled = False
+        self.stdout, self.stderr = [], []
+
+        self.start = time.perf_counter()
+        self.process = subprocess.Popen(args,
+                                        stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT if merge_stderr else subprocess.PIPE,
+                                        universal_newlines=text,
+                                        errors="replace" if text else None,
+                                        start_new_session=True,
+                                        **popen_kwargs)
+        self._readers = [threading.Thread(target=self._read, args=(self.process.stdout, self.stdout, "stdout"),
+                                          daemon=True)]
+        if not merge_stderr:
+            self._readers.append(threading.Thread(target=self._read, args=(self.process.stderr, self.stderr, "stderr"),
+                                                  daemon=True))
+        for reader in self._readers:
+            reader.start()
+
+    def _read(self, stream, lines: List[str], label: str) -> None:
+        for line in iter(stream.readline, self._empty):
+            text = line if isinstance(line, str) else line.decode(errors="replace")
+            self._log.log(self._log_level, "[{} {}] {}".format(self._name, label, text.rstrip("\n")))
+            if self._capture:
+                lines.append(line)
+        stream.close()
+
+    def kill(self, cancelled: bool = False, timed_out: bool = False) -> None:
+        """
+        Kills the command and any processes it started, unless it has already exited
+        """
+        with self._lock:
+            if self._finished:
+                return
+            self.cancelled = self.cancelled or cancelled
+            self.timed_out = self.timed_out or timed_out
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def wait(self, timeout: Optional[float]) -> CommandResult:
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, self.kill, kwargs={"timed_out": True})
+            timer.daemon = True
+            timer.start()
+
+        #   the process is only reaped while holding the lock, so 'kill' never signals a process group whose id has been
+        #   freed and reused by another process
+        cpu_time = None
+        try:
+            if hasattr(os, "waitid") and hasattr(os, "wait4"):
+                os.waitid(os.P_PID, self.process.pid, os.WEXITED | os.WNOWAIT)
+                with self._lock:
+                    _, status, usage = os.wait4(self.process.pid, 0)
+                    self._finished = True
+                    self.process.returncode = os.waitstatus_to_exitcode(status)
+                cpu_time = usage.ru_utime + usage.ru_stime
+            else:
+                while True:
+                    with self._lock:
+                        if self.process.poll() is not None:
+                            self._finished = True
+                            break
+                    time.sleep(POLL_INTERVAL)
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        wall_time = time.perf_counter() - self.start
+        for reader in self._readers:
+            reader.join()
+
+        returncode = None if self.timed_out or self.cancelled else self.process.returncode
+        return CommandResult(self.args, returncode, self._empty.join(self.stdout), self._empty.join(self.stderr),
+                             wall_time, cpu_time, self.timed_out, self.cancelled)
+
+
+class CommandRunner:
+    """
+    Runs external commands (gdal_*, sen2cor, ...) on a bounded pool of threads.  Each command's output is streamed to
+    a logger a line at a time as it is produced, and commands can be given a timeout or cancelled.  Failures are
+    reported in the returned CommandResult rather than raised.
+    """
+
+    def __init__(self,
+                 max_workers: int = None,
+                 timeout: float = None,
+                 log: logging.Logger = None,
+                 log_level: int = logging.INFO,
+                 capture: bool = True):
+        """
+        :param max_workers: the maximum number of commands run at once (default: the number of processors)
+        :param timeout: optional, the default number of seconds a command may run for before it is killed
+        :param log: the logger output lines are written to (default: the "command_runner" logger)
+        :param log_level: the level output lines are logged at
+        :param capture: if True, the output is also kept in the results
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._log = log or logger
+        self._log_level = log_level
+        self._capture = capture
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="command_runner")
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._jobs = set()
+        self._generation = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Waits for submitted commands to finish and releases the worker threads
+        """
+        self._executor.shutdown(wait=True)
+
+    def _run(self, generation: int, args, timeout: Optional[float], merge_stderr: bool, text: bool, **popen_kwargs):
+        empty = "" if text else b""
+        with self._lock:
+            if generation < self._generation:
+                return CommandResult(args, None, empty, empty, 0.0, None, False, True)
+        #   started without holding the lock, so slow process creation doesn't hold up other commands or 'cancel'
+        try:
+            job = _Job(args, self._log, self._log_level, self._capture, merge_stderr, text, **popen_kwargs)
+        except OSError as e:
+            self._log.error("Unable to run {}. {}".format(args, e))
+            return CommandResult(args, None, empty, str(e) if text else str(e).encode(), 0.0, None, False, False)
+        with self._lock:
+            self._jobs.add(job)
+            if generation < self._generation:
+                #   cancelled while the command was starting
+                job.kill(cancelled=True)
+
+        try:
+            result = job.wait(self.timeout if timeout is None else timeout)
+        finally:
+            with self._lock:
+                self._jobs.discard(job)
+
+        if result.timed_out:
+            self._log.error("Timed out after {:.1f}s running {}".format(result.wall_time, args))
+        elif not result.cancelled and result.returncode != 0:
+            self._log.error("Exit code {} running {}".format(result.returncode, args))
+        return result
+
+    def submit(self,
+               cmd: Command,
+               timeout: float = None,
+               cwd: str = None,
+               env: dict = None,
+               merge_stderr: bool = False,
+               shell: bool = False,
+               text: bool = True) -> Future:
+        """
+        Queues a command to run
+        :param cmd: the command, as a list of arguments or a string that is split with shell-like syntax
+        :param timeout: optional, seconds the command may run for before it is killed (default: the runner timeout)
+        :param cwd: optional, the working directory of the command
+        :param env: optional, the environment of the command
+        :param merge_stderr: if True, stderr is merged in to stdout
+        :param shell: if True, the command is run by the shell.  Avoid with untrusted input.
+        :param text: if True, the output is decoded to strings (undecodable bytes are replaced); if False, it is kept as
+        the bytes the command wrote
+        :return: a Future of a CommandResult
+        """
+        args = _split(cmd, shell)
+        with self._lock:
+            future = self._executor.submit(self._run, self._generation, args, timeout, merge_stderr, text,
+                                           cwd=cwd, env=env, shell=shell)
+            self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        return future
+
+    def run(self, cmd: Command, **kwargs) -> CommandResult:
+        """
+        Runs a command and waits for its result.  Keyword arguments are passed to 'submit'.
+        """
+        return result_of(self.submit(cmd, **kwargs), cmd)
+
+    def run_all(self, cmds: Iterable[Command], **kwargs) -> List[CommandResult]:
+        """
+        Runs commands side by side, at most 'max_workers' at a time.  Keyword arguments are passed to 'submit'.
+        :return: the results in the order of 'cmds'
+        """
+        cmds = list(cmds)
+        futures = [self.submit(c, **kwargs) for c in cmds]
+        return [result_of(f, c) for f, c in zip(futures, cmds)]
+
+    def cancel(self) -> None:
+        """
+        Cancels the commands submitted so far: queued commands won't start, and running commands are killed
+        """
+        with self._lock:
+            self._generation += 1
+            for future in list(self._futures):
+                future.cancel()
+            for job in list(self._jobs):
+                job.kill(cancelled=True)
+
+
+def result_of(future: Future, cmd: Command = None) -> CommandResult:
+    """
+    Waits for the result of a submitted command, returning a cancelled result if it was cancelled before it started
+    """
+    try:
+        return future.result()
+    except CancelledError:
+        return CommandResult(cmd, None, "", "", 0.0, None, False, True)
+
+
+_default_runner = None
+_default_runner_lock = threading.Lock()
+
+
+def default_runner() -> CommandRunner:
+    """
+    Returns the runner shared by 'eo_utilities.syscmd' and 'eo_utilities.execmd', creating it on first use
+    """
+    global _default_runner
+    with _default_runner_lock:
+        if _default_runner is None:
+            _default_runner = CommandRunner()
+        return _default_runner
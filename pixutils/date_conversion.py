@@ -9,6 +9,7 @@
 #     Copyright © 2017 Pixalytics Ltd. All rights reserved.
 
 import datetime
+import numpy as np
 
 def is_leap_year(year):
 #   if year is a leap year return True else return False
@@ -39,6 +40,53 @@ def ymd(Y,N):
     D = N - int((275 * M) / 9.0) + K * int((M + 9) / 12.0) + 30
     return Y, M, D
 
+# Vectorised versions of the above for NumPy arrays of any shape (or scalars), e.g. per-pixel day of year layers.
+# Arguments are broadcast against each other and integer arrays are returned; results match the scalar functions.
+
+def is_leap_year_array(year):
+#   return a boolean array, True where year is a leap year
+    year = np.asarray(year)
+    return (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+
+def doy_array(Y,M,D):
+# given arrays of year, month, day return an array of day of year
+    Y, M, D = np.broadcast_arrays(np.asarray(Y), np.asarray(M), np.asarray(D))
+    K = np.where(is_leap_year_array(Y), 1, 2)
+    return (275 * M) // 9 - K * ((M + 9) // 12) + D - 30
+
+def ymd_array(Y,N):
+# given arrays of year and day of year, return arrays of year, month, day
+    Y, N = np.broadcast_arrays(np.asarray(Y), np.asarray(N))
+    K = np.where(is_leap_year_array(Y), 1, 2)
+    M = np.where(N < 32, 1, np.floor((9 * (K + N)) / 275.0 + 0.98).astype(np.int64))
+    D = N - (275 * M) // 9 + K * ((M + 9) // 12) + 30
+    return Y.copy(), M, D
+
+def doy_to_datetime64(Y,N):
+# given arrays of year and day of year, return an array of datetime64[D]
+    Y, N = np.broadcast_arrays(np.asarray(Y), np.asarray(N))
+    return (Y - 1970).astype("datetime64[Y]").astype("datetime64[D]") + (N - 1).astype("timedelta64[D]")
+
+def datetime64_to_doy(dates):
+# given an array of datetime64, return arrays of year and day of year
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    years = dates.astype("datetime64[Y]")
+    return years.astype(np.int64) + 1970, (dates - years.astype("datetime64[D]")).astype(np.int64) + 1
+
+def ymd_to_datetime64(Y,M,D):
+# given arrays of year, month, day return an array of datetime64[D]
+    Y, M, D = np.broadcast_arrays(np.asarray(Y), np.asarray(M), np.asarray(D))
+    months = ((Y - 1970) * 12 + M - 1).astype("datetime64[M]")
+    return months.astype("datetime64[D]") + (D - 1).astype("timedelta64[D]")
+
+def datetime64_to_ymd(dates):
+# given an array of datetime64, return arrays of year, month, day
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    months = dates.astype("datetime64[M]")
+    month_number = months.astype(np.int64)
+    return (month_number // 12 + 1970, month_number % 12 + 1,
+            (dates - months.astype("datetime64[D]")).astype(np.int64) + 1)
+
 
 
 def main():
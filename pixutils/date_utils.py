@@ -1,5 +1,7 @@
 from typing import Union, Iterable
 from datetime import datetime, date, timedelta
+import numpy as np
+from pixutils.date_conversion import ymd_to_datetime64, datetime64_to_ymd, datetime64_to_doy
 
 
 def first_day_of_prev_month(d: Union[str, date, datetime]) -> datetime:
@@ -40,3 +42,87 @@ def date_iterator(start_date: Union[date, datetime], end_date: Union[date, datet
         yield _date
         _date += timedelta(days=1)
     return _date
+
+
+def to_datetime64_array(dates: Union[str, date, datetime, Iterable]) -> np.ndarray:
+    """
+    Converts one or more dates to a datetime64[D] array
+    :param dates: a date or an array-like of dates, which can be passed as strings (YYYYMMDD or YYYY-MM-DD), datetime
+    module date or datetime objects, or datetime64 values
+    :return: a datetime64[D] array
+    :raises ValueError: if a string isn't a valid date
+    """
+    dates = np.asarray(dates)
+    if dates.dtype.kind in "US":
+        strings = np.char.replace(dates.astype(str), "-", "")
+        valid = (np.char.str_len(strings) == 8) & np.char.isdigit(strings)
+        if not valid.all():
+            raise ValueError("'{}' isn't a date as YYYYMMDD or YYYY-MM-DD.".format(dates[~valid].flat[0]))
+        year, month_day = np.divmod(strings.astype(np.int64), 10000)
+        month, day = np.divmod(month_day, 100)
+        converted = ymd_to_datetime64(year, month, day)
+        #   out of range months and days roll over in to the next month or year, so don't survive the round trip
+        _, valid_month, valid_day = datetime64_to_ymd(converted)
+        valid = (valid_month == month) & (valid_day == day)
+        if not np.all(valid):
+            raise ValueError("'{}' isn't a valid date.".format(dates[~valid].flat[0]))
+        return converted
+    return dates.astype("datetime64[D]")
+
+
+def date_range_array(start_date: Union[str, date, datetime], end_date: Union[str, date, datetime]) -> np.ndarray:
+    """
+    Returns a daily series between the specified start and end date (inclusive) as a datetime64[D] array
+    :param start_date: the first date in the sequence, as a string (YYYYMMDD) or a date or datetime object
+    :param end_date: the last date in the sequence, as a string (YYYYMMDD) or a date or datetime object
+    :return: a datetime64[D] array
+    """
+    start, end = to_datetime64_array(start_date), to_datetime64_array(end_date)
+    return np.arange(start, end + np.timedelta64(1, "D"), dtype="datetime64[D]")
+
+
+def format_dates(dates: Union[str, date, datetime, Iterable], day_of_year: bool = False) -> np.ndarray:
+    """
+    Formats dates as YYYYMMDD strings, or as YYYYDDD strings with a three digit day of year
+    :param dates: a date or an array-like of dates, see 'to_datetime64_array'
+    :param day_of_year: if True, format as YYYYDDD instead of YYYYMMDD
+    :return: an array of strings
+    """
+    dates = to_datetime64_array(dates)
+    if day_of_year:
+        year, doy = datetime64_to_doy(dates)
+        return (year * 1000 + doy).astype("U7")
+    year, month, day = datetime64_to_ymd(dates)
+    return (year * 10000 + month * 100 + day).astype("U8")
+
+
+def date_range_strings(start_date: Union[str, date, datetime],
+                       end_date: Union[str, date, datetime],
+                       day_of_year: bool = False) -> np.ndarray:
+    """
+    Returns a daily series between the specified start and end date (inclusive) as YYYYMMDD or YYYYDDD strings
+    :param start_date: the first date in the sequence, as a string (YYYYMMDD) or a date or datetime object
+    :param end_date: the last date in the sequence, as a string (YYYYMMDD) or a date or datetime object
+    :param day_of_year: if True, format as YYYYDDD instead of YYYYMMDD
+    :return: an array of strings
+    """
+    return format_dates(date_range_array(start_date, end_date), day_of_year)
+
+
+def first_day_of_prev_month_array(dates: Union[str, date, datetime, Iterable]) -> np.ndarray:
+    """
+    Vectorised version of 'first_day_of_prev_month'
+    :param dates: a date or an array-like of dates, see 'to_datetime64_array'
+    :return: a datetime64[D] array of the first day of the month before each date
+    """
+    return (to_datetime64_array(dates).astype("datetime64[M]") - 1).astype("datetime64[D]")
+
+
+def last_day_of_prev_month_array(dates: Union[str, date, datetime, Iterable]) -> np.ndarray:
+    """
+    Vectorised version of 'last_day_of_prev_month'
+    :param dates: a date or an array-like of dates, see 'to_datetime64_array'
+    :return: a datetime64[D] array of the last day of the month before each date
+    """
+    return to_datetime64_array(dates).astype("datetime64[M]").astype("datetime64[D]") - 1
+
@@ -18,17 +18,22 @@
 ###############################################################################
 import argparse
 import os
+import re
 import sys
 import shutil
 import numpy as np
 import pylab as plt
 import subprocess
-import pandas as pd
 import logging
 import datetime
-from osgeo import ogr
+from osgeo import gdal, ogr
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
 from os.path import expanduser
 import faulthandler
+from pixutils.date_utils import date_range_strings
+from pixutils.command_runner import default_runner
+from pixutils.quicklook import decimate
 
 home = expanduser("~")
 faulthandler.enable()
@@ -48,102 +53,74 @@ def func_name():
 
 def syscmd(cmd, verb):
     """
-    Enables commands to be run from inside the python code with appropriate outputs and error returns when necessary
-    
+    Enables commands to be run from inside the python code with appropriate outputs and error returns when necessary.
+    Output is logged a line at a time as the command runs.  See 'command_runner' to run commands side by side or
+    without exiting on failure.
+
     :param cmd: command to be run
     :type cmd: str
     :param verb: enable more verbose outputs
     :type verb: bool
+    :return: the CommandResult of the command
     """
-    args = argparse.Namespace()
-    args.verbose = verb
     if verb:
         logger.info("Cmd: {}".format(cmd))
-        cmd = cmd.split()
-        proc = subprocess.Popen(cmd)  # ,stdout=subprocess.PIPE, stderr=subprocess.PIPE,universal_newlines=True)
-    else:
-        cmd = cmd.split()
-        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-
-    out, errors = proc.communicate()
-    if out != "" and out is not None:
-        logger.info("Cmd Output: {}".format(out))
+    result = default_runner().run(cmd)
 
-    if proc.returncode != 0:
-        logger.error("Crash encountered when running {}".format(cmd))
-        logger.error("Cmd Output: {}".format(out))
-        logger.error("Cmd Errors: {}".format(errors))
+    if result.returncode != 0:
+        logger.error("Crash encountered when running {}".format(result.args))
+        logger.error("Cmd Errors: {}".format(result.stderr))
         sys.exit()
+    return result
 
 
 def execmd(cmd, verb):
     """
     Enables commands to be run from inside the python code with the output returned
 
-    :param cmd: command to be run
+    :param cmd: command to be run, it is split with shell-like syntax and not passed to a shell
     :type cmd: str
     :param verb: enable more verbose outputs
     :type verb: bool
+    :return: the output of the command, with stderr merged in to stdout, as bytes; or None if there was no output
     """
+    if verb:
+        logger.info("Cmd: {}".format(cmd))
+    result = default_runner().run(cmd, merge_stderr=True, text=False)
 
-    # Replaced due to shell=True being a security hazard
-    args = argparse.Namespace()
-    args.verbose = verb
-    p = subprocess.Popen(cmd, shell=True, stdin=subprocess.PIPE,
-                         stdout=subprocess.PIPE,
-                         stderr=subprocess.STDOUT,
-                         close_fds=True)
-    output = p.stdout.read()
-    p.stdin.close()
-    p.stdout.close()
-    # p.communicate()
-    if output:
-        return output
+    if result.stdout:
+        return result.stdout
     else:
         logger.warning("No output returned")
         return None
 
 def daterange(sdate, edate, rtv):
     """
-    Generates a list of date strings between two given dates using pandas.  The list is then iterated over and
-    reformatted to obtain the list of dates for usage in other programs
+    Generates a list of date strings between two given dates (inclusive).  The dates are generated and formatted with
+    NumPy arithmetic, see 'date_utils.date_range_strings'
 
     :param sdate: start date string formatted as YYYYMMDD
     :type sdate: str
     :param edate: end date string formatted as YYYYMMDD
     :type edate: str
     :param rtv: integer flag to specify if a conversion to julian day of year is required;
-     with value = 1 to generate it (TBC) otherwise default is 0
+     with value = 1 to generate YYYYDDD strings otherwise default is 0 for YYYYMMDD strings
     :type rtv: int
     :return: list of dates in the specified range
     """
+    return date_range_strings(sdate, edate, day_of_year=(rtv == 1)).tolist()
 
-    rng = pd.date_range(start=sdate, end=edate)
-    dates = []
-    # This first for loop takes the pandas date range and slices the date section
-    # into an integer string format i.e 20160101
-    for i in range(len(rng)):
-        t = str(rng[i])
-        if rtv == 0:
-            y = t[0:4] + t[5:7] + t[8:10]
-        elif rtv == 1:
-            fmt = "%Y-%m-%d %H:%M:%S"
-            dt = datetime.datetime.strptime(t, fmt)
-            tt = dt.timetuple()
-            if int(tt[7]) < 100:
-                y = t[0:4] + "0" + str(tt[7])
-            else:
-                y = t[0:4] + str(tt[7])
-        dates.append(y)
-    return dates
-
-def show_img(array, transpose, reverse=0):
-    """Plots an array of choice with the option to transpose the array if need be
+def show_img(array, transpose, reverse=0, output_path="test.png", max_size=2048, show=True):
+    """Plots an array of choice with the option to transpose the array if need be.  Arrays larger than 'max_size' are
+  reduced with 'quicklook.decimate' before plotting; use 'quicklook.quicklook' to write thumbnails without a figure.
   
   Inputs
   array - numpy array to be plotted
   transpose - True/False integer to flip the array 
-  reverse - True/False integer to invert colours (TBC)?"""
+  reverse - True/False integer to invert colours (TBC)?
+  output_path - the file the plot is saved to
+  max_size - the maximum length of the longest side of the plotted array, or None to plot the full array
+  show - whether the plot is also shown"""
     fig = plt.figure()
     ax = fig.add_axes([0, 0, 1, 1], frameon=False)
     ax.set_axis_off()
@@ -153,13 +130,17 @@ def show_img(array, transpose, reverse=0):
         data = np.flipud(array)  # Verically flip
     else:
         data = array
+    if max_size is not None:
+        data = decimate(data, max_size)
     # Reverse colourmap
     if reverse:
         ax.imshow(data, cmap='Blues_r', origin='lower')
     else:
         ax.imshow(data, cmap='Blues', origin='lower')
-    plt.savefig("test.png")
-    plt.show()
+    plt.savefig(output_path)
+    if show:
+        plt.show()
+    plt.close(fig)
 
 
 def path_to_gdal_translate() -> str:
@@ -171,40 +152,135 @@ def path_to_gdal_translate() -> str:
     return gdal_translate_bin
 
 
+#   creation options used for GeoTIFFs converted from netCDF, matching 'raster_operations.compress_geotiff'
+DEFAULT_GEOTIFF_CREATION_OPTIONS = ["BIGTIFF=IF_SAFER", "TILED=YES", "COMPRESS=LZW"]
+
+
+def netcdf_subdatasets(netcdf_file: str) -> List[Tuple[str, str]]:
+    """
+    Lists the subdatasets (variables) of a netCDF file
+    :param netcdf_file: a path to an existing netcdf file
+    :return: a list of tuples of the GDAL subdataset name, i.e. 'NETCDF:"file.nc":t2m', and the variable name.  The
+    list is empty if the file holds a single variable.
+    """
+    dataset = gdal.Open(netcdf_file)
+    if dataset is None:
+        raise RuntimeError("GDAL is unable to open '{}'. {}".format(netcdf_file, gdal.GetLastErrorMsg()))
+    metadata = dataset.GetMetadata("SUBDATASETS")
+    names = [metadata[k] for k in sorted((k for k in metadata if k.endswith("_NAME")),
+                                         key=lambda k: int(k.split("_")[1]))]
+    dataset = None
+    return [(name, name.rsplit(":", 1)[-1]) for name in names]
+
+
+def geotiff_filename(geotiff_file: str, variable: str) -> str:
+    """
+    Returns the output name of a subdataset of a converted netCDF file, '<stem>_<variable>.tif'
+    :param geotiff_file: the path passed as the output of the conversion
+    :param variable: the subdataset's variable name.  Characters that aren't safe in a filename are replaced by '_'.
+    """
+    stem, extension = os.path.splitext(geotiff_file)
+    variable = re.sub(r"\W+", "_", variable).strip("_")
+    return "{}_{}{}".format(stem, variable, extension or ".tif")
+
+
+def netcdf_to_geotiff(netcdf_file: str,
+                      geotiff_file: str,
+                      srs: str = "EPSG:4326",
+                      creation_options: List[str] = None,
+                      variables: List[str] = None) -> List[str]:
+    """
+    Converts a netCDF file to GeoTIFF in-process with 'gdal.Translate'.  Each subdataset is written to its own file,
+    named by 'geotiff_filename'; a file holding a single variable is written to 'geotiff_file'.
+    :param netcdf_file: a path to an existing netcdf file
+    :param geotiff_file: a path to the output file
+    :param srs: the spatial reference assigned to the output
+    :param creation_options: GeoTIFF creation options (default: DEFAULT_GEOTIFF_CREATION_OPTIONS)
+    :param variables: optional, the variables to convert.  All are converted by default.
+    :return: a list of the paths written
+    :raise FileNotFoundError: if the input file cannot be found, or if an expected output could not be located
+    :raise RuntimeError: if GDAL is unable to read the input or write an output
+    """
+    if not os.path.isfile(netcdf_file):
+        raise FileNotFoundError("Unable to find input file: '{}'.".format(netcdf_file))
+
+    #   GDAL's return values are checked rather than enabling its exceptions, which would change GDAL's behaviour for
+    #   all other code in the process
+    options = gdal.TranslateOptions(format="GTiff",
+                                    outputSRS=srs,
+                                    creationOptions=DEFAULT_GEOTIFF_CREATION_OPTIONS if creation_options is None
+                                    else creation_options)
+
+    subdatasets = netcdf_subdatasets(netcdf_file)
+    if subdatasets:
+        jobs = [(name, geotiff_filename(geotiff_file, v)) for name, v in subdatasets
+                if variables is None or v in variables]
+    else:
+        jobs = [(netcdf_file, geotiff_file)]
+
+    outputs = []
+    for source, destination in jobs:
+        dataset = gdal.Translate(destination, source, options=options)
+        if dataset is None:
+            raise RuntimeError("GDAL is unable to write '{}'. {}".format(destination, gdal.GetLastErrorMsg()))
+        dataset = None
+        if not os.path.isfile(destination):
+            raise FileNotFoundError("Unable to locate output file '{}'.".format(destination))
+        outputs.append(destination)
+
+    logger.debug("Wrote {} geotiff file(s) from '{}'".format(len(outputs), netcdf_file))
+    return outputs
+
+
+def _netcdf_to_geotiff_or_log(netcdf_file: str, geotiff_file: str, kwargs: dict) -> List[str]:
+    try:
+        return netcdf_to_geotiff(netcdf_file, geotiff_file, **kwargs)
+    except (FileNotFoundError, RuntimeError) as e:
+        logger.warning("Failed to convert '{}' to geotiff. {}".format(netcdf_file, e))
+        return []
+
+
+def netcdf_to_geotiff_batch(conversions: List[Tuple[str, str]], max_workers: int = None, **kwargs) -> dict:
+    """
+    Converts many netCDF files to GeoTIFF across a process pool.  Keyword arguments are passed to 'netcdf_to_geotiff'.
+    :param conversions: a list of (netcdf_file, geotiff_file) tuples
+    :param max_workers: the number of worker processes, defaults to the number of processors
+    :return: a dictionary of the paths written keyed by netcdf file; failed conversions have an empty list
+    """
+    netcdf_files = [c[0] for c in conversions]
+    geotiff_files = [c[1] for c in conversions]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        outputs = executor.map(_netcdf_to_geotiff_or_log, netcdf_files, geotiff_files, [kwargs] * len(conversions))
+        return dict(zip(netcdf_files, outputs))
+
+
 def convert_to_geotiff(netcdf_file: str, geotiff_file: str) -> bool:
     """
-    Uses the 'gdal_translate' executable to convert a netcdf file to geotiff
+    Converts a netcdf file to geotiff, see 'netcdf_to_geotiff'
     :param netcdf_file: a path to an existing netcdf file
     :param geotiff_file: a pth to the output file
-    :return: True if the process succeeds and the file is created, otherwise False
+    :return: True if the process succeeds and the files are created, otherwise False
     """
-    args = argparse.Namespace()
-    args.verbose = False
     assert os.path.exists(netcdf_file), "Input file '{:} does not exist.".format(netcdf_file)
-    gdal_translate_bin = path_to_gdal_translate()
-    assert gdal_translate_bin != "", "Unable to locate 'gdal_translate'"
-
-    cmd = gdal_translate_bin + ' -a_srs EPSG:4326 -sds ' + netcdf_file + ' ' + geotiff_file
-    proc = subprocess.run(cmd, shell=True)
 
-    #   todo: checking if output files exist will fail as duplicate files will automatically be suffixed with '_1' etc
-    if proc.returncode == 0:  # and os.path.exists(geotiff_file):
-        logger.debug("Wrote geotiff file '{:}'".format(geotiff_file))
+    outputs = _netcdf_to_geotiff_or_log(netcdf_file, geotiff_file, {})
+    if outputs:
+        logger.debug("Wrote geotiff file(s) {}".format(outputs))
         return True
     else:
         logger.warning("Failed to write geotiff file '{:}'".format(geotiff_file))
         return False
 
 
-def create_wkt_points(swlat, swlon, nelat, nelon, args):
+def create_wkt_points(swlat, swlon, nelat, nelon, args=None):
     """
-    Creates a WKT string based on bounding box co-ordinates
+    Creates a WKT string based on bounding box co-ordinates.  Use 'bbox_utils.bbox_wkt' to create many at once.
 
     :param swlat: bounding box co-ordinates (southwest-latitude)
     :param swlon: bounding box co-ordinates (southwest-longitude)
     :param nelat: bounding box co-ordinates (northeast-latitude)
     :param nelon: bounding box co-ordinates (northeast-longitude)
-    :param args: command line arguments
+    :param args: unused, kept for existing callers
     :return: WKT formatted string of the bounding box
     """
 
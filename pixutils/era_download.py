@@ -3,12 +3,22 @@
 import argparse
 import sys
 import os
+import logging
 import cdsapi
+import numpy as np
+import netCDF4
 import xarray as xr
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import date, time, datetime
-from typing import List, Union
+from typing import Callable, Dict, Iterable, List, Optional, Union
 from enum import Enum, unique, auto
+from pixutils.nc_utils import coordinate_axis
+from pixutils.file_lock import single_flight, partial_path
+from pixutils.instrumentation import timed, count
+
+logger = logging.getLogger("era_download")
 
 
 #   data sources recognized by the download script.  Further fields can be supported by adding them to the 'Var' enum
@@ -48,6 +58,24 @@ map_var_names = {
 }
 
 
+#   map a data source to the variable name used in downloaded netCDF files
+map_var_short_names = {
+    Var.wind_10m_u_component: "u10",
+    Var.wind_10m_v_component: "v10",
+    Var.skin_temperature: "skt",
+    Var.soil_temperature_level_1: "stl1",
+    Var.soil_temperature_level_2: "stl2",
+    Var.soil_temperature_level_3: "stl3",
+    Var.soil_temperature_level_4: "stl4",
+    Var.volumetric_soil_water_layer_1: "swvl1",
+    Var.volumetric_soil_water_layer_2: "swvl2",
+    Var.volumetric_soil_water_layer_3: "swvl3",
+    Var.volumetric_soil_water_layer_4: "swvl4",
+    Var.total_precipitation: "tp",
+    Var.temperature_2m: "t2m"
+}
+
+
 #   recognized file extensions should be specified in lower case
 ext_to_file_type = {
     ".grib": "grib",
@@ -60,7 +88,7 @@ def download_era5_reanalysis_data(variables: Union[Var, List[Var], List[str]],
                                   times: Union[time, List[time]],
                                   area: str,
                                   frequency: str,
-                                  file_path: str) -> None:
+                                  file_path: str) -> str:
     """
     Download data from the the Copernicus Climate Data Store
     :param variables: a list of fields to be downloaded on the specified dates and times
@@ -69,7 +97,8 @@ def download_era5_reanalysis_data(variables: Union[Var, List[Var], List[str]],
     :param area: an area of interest to be included in the file
     :param frequency: 'monthly','daily' or 'hourly'
     :param file_path: a path to the output file containing all of the downloaded data
-    :return: a Boolean value; true, if the download completed successfully
+    :return: the path to the output file.  When several processes download the same file at once, only the first
+    downloads it and the others wait for it to complete.
     """
     path = Path(file_path)
 
@@ -81,157 +110,384 @@ def download_era5_reanalysis_data(variables: Union[Var, List[Var], List[str]],
     if extension not in ext_to_file_type:
         raise ValueError("Unable to determine file type from extension '{}'.".format(extension))
 
-    def time_str(t: time) -> str:
-        return t.strftime("%H:%M")
-
-    def parse_variables() -> List[str]:
-        if isinstance(variables, List):
-            result = set()
-            for variable in variables:
-                if isinstance(variable, Var):
-                    #   if item is an Enum (preferred) lookup the string representation
-                    result.add(map_var_names[variable])
-                elif isinstance(variable, str):
-                    #   if item is a string (generally passed from command line) check the variable name is valid
-                    #   and add to list
-                    if variable in map_var_names.values():
-                        result.add(variable)
-                    else:
-                        print("'{}' is not a valid variable identifier.".format(variable))
-            return list(result)
-        elif isinstance(variables, str):
-            return map_var_names[variables]
-
-    #   convert each parameter into unique lists
-    years = list({_date.year for _date in dates}) if isinstance(dates, List) else [dates.year]
-    months = list({_date.month for _date in dates}) if isinstance(dates, List) else [dates.month]
-    days = list({_date.day for _date in dates}) if isinstance(dates, List) else [dates.day]
-    times = list({time_str(_time) for _time in times}) if isinstance(times, List) else [time_str(times)]
-    variables = parse_variables()
-    file_format = ext_to_file_type[extension]
-
-    # Extract AOI box values
-    vals = area.replace('[','').replace(']','').split(',')
-    area_box = False
-    for val in vals:
-        if float(val) != 0:
-            area_box = True
-
-    # Run C3S API
-    c = cdsapi.Client()
-
-    if frequency == 'monthly':
-        c.retrieve(
-            'reanalysis-era5-land-monthly-means',
-            {
-                'product_type': 'monthly_averaged_reanalysis',
-                'variable': variables,
-                'year': years,
-                'month': months,
-                'time': '00:00',
-                'area': [vals[0], vals[1], vals[2], vals[3]],
-                'format': file_format,
-            },
-            file_path)
+    #   only one process downloads a file; others downloading the same file wait for it and return its path
+    with single_flight(file_path) as download:
+        if not download:
+            return file_path
+
+        #   download to a partial file, moved in to place once complete so a failed download leaves no file behind
+        part_file_path = partial_path(file_path)
+
+        def time_str(t: time) -> str:
+            return t.strftime("%H:%M")
+
+        def parse_variables() -> List[str]:
+            if isinstance(variables, List):
+                result = set()
+                for variable in variables:
+                    if isinstance(variable, Var):
+                        #   if item is an Enum (preferred) lookup the string representation
+                        result.add(map_var_names[variable])
+                    elif isinstance(variable, str):
+                        #   if item is a string (generally passed from command line) check the variable name is valid
+                        #   and add to list
+                        if variable in map_var_names.values():
+                            result.add(variable)
+                        else:
+                            print("'{}' is not a valid variable identifier.".format(variable))
+                return list(result)
+            elif isinstance(variables, str):
+                return map_var_names[variables]
+
+        #   convert each parameter into unique lists
+        years = list({_date.year for _date in dates}) if isinstance(dates, List) else [dates.year]
+        months = list({_date.month for _date in dates}) if isinstance(dates, List) else [dates.month]
+        days = list({_date.day for _date in dates}) if isinstance(dates, List) else [dates.day]
+        times = list({time_str(_time) for _time in times}) if isinstance(times, List) else [time_str(times)]
+        variables = parse_variables()
+        file_format = ext_to_file_type[extension]
+
+        # Extract AOI box values
+        vals = area.replace('[','').replace(']','').split(',')
+        area_box = False
+        for val in vals:
+            if float(val) != 0:
+                area_box = True
+
+        # Run C3S API
+        c = cdsapi.Client()
+
+        if frequency == 'monthly':
+            with timed("transfer", source="era5"):
+                c.retrieve(
+                    'reanalysis-era5-land-monthly-means',
+                    {
+                        'product_type': 'monthly_averaged_reanalysis',
+                        'variable': variables,
+                        'year': years,
+                        'month': months,
+                        'time': '00:00',
+                        'area': [vals[0], vals[1], vals[2], vals[3]],
+                        'format': file_format,
+                    },
+                    part_file_path)
         
-    elif frequency == 'daily':
+        elif frequency == 'daily':
 
-        prefix = file_path.replace('.nc','')
+            prefix = file_path.replace('.nc','')
 
-        # lat and lon should be float
-        vals = [float(v) for v in vals]
+            # lat and lon should be float
+            vals = [float(v) for v in vals]
 
-        def merge(files,topath):
-            coords = ['time','lat','lon']
-            def open_ds(f):
-                with xr.open_dataset(f) as ds:
-                    rtn = ds.load()
+            @timed("merge", source="era5")
+            def merge(files,topath):
+                coords = ['time','lat','lon']
+                def open_ds(f):
+                    with xr.open_dataset(f) as ds:
+                        rtn = ds.load()
 
-                os.remove(f)
-                return rtn.drop_vars([i for i in list(ds.coords) if not i in coords])
-            dses = [open_ds(f) for f in files]
-            xr.merge(dses).to_netcdf(topath)
+                    os.remove(f)
+                    return rtn.drop_vars([i for i in list(ds.coords) if not i in coords])
+                dses = [open_ds(f) for f in files]
+                xr.merge(dses).to_netcdf(topath)
 
-        ymfiles=[]
+            ymfiles=[]
         
-        # TODO JC - don't do all years and months, only within requested timeframe
-        for yr in list(set(years)):
-            for mn in list(set(months)):
+            # TODO JC - don't do all years and months, only within requested timeframe
+            for yr in list(set(years)):
+                for mn in list(set(months)):
 
-                datestr = str(yr) + str(mn)
-                fn_yrmn = prefix + '_{}.nc'.format(datestr)
+                    datestr = str(yr) + str(mn)
+                    fn_yrmn = prefix + '_{}.nc'.format(datestr)
 
-                if not os.path.isfile(fn_yrmn):
-                    varfiles=[]
-                    for var in variables:
-                        fn_var = prefix + '_{}_{}.nc'.format(var,datestr)
+                    if not os.path.isfile(fn_yrmn):
+                        varfiles=[]
+                        for var in variables:
+                            fn_var = prefix + '_{}_{}.nc'.format(var,datestr)
                         
-                        if not os.path.isfile(fn_var):
-
-                            result = c.service(
-                                "tool.toolbox.orchestrator.workflow",
-                                params={
-                                    "realm": "user-apps",
-                                    "project": "app-c3s-daily-era5-statistics",
-                                    "version": "master",
-                                    "kwargs": {
-                                        "dataset": "reanalysis-era5-single-levels",
-                                        "product_type": "reanalysis",
-                                        "variable": var,
-                                        "statistic": "daily_mean",
-                                        "year": str(yr),
-                                        "month": str(mn),
-                                        "time_zone": "UTC+00:0",
-                                        "frequency": "1-hourly",
-                                        "area": {"lat": [vals[2], vals[0]], "lon": [vals[1], vals[3]]}
-                                    },
-                                "workflow_name": "application"
-                                })
-                            c.download(result)
-
-                            oldfn = result[0]['location'][-39:]
-                            os.rename(oldfn, fn_var)
-                            varfiles.append(fn_var)
+                            if not os.path.isfile(fn_var):
+
+                                result = c.service(
+                                    "tool.toolbox.orchestrator.workflow",
+                                    params={
+                                        "realm": "user-apps",
+                                        "project": "app-c3s-daily-era5-statistics",
+                                        "version": "master",
+                                        "kwargs": {
+                                            "dataset": "reanalysis-era5-single-levels",
+                                            "product_type": "reanalysis",
+                                            "variable": var,
+                                            "statistic": "daily_mean",
+                                            "year": str(yr),
+                                            "month": str(mn),
+                                            "time_zone": "UTC+00:0",
+                                            "frequency": "1-hourly",
+                                            "area": {"lat": [vals[2], vals[0]], "lon": [vals[1], vals[3]]}
+                                        },
+                                    "workflow_name": "application"
+                                    })
+                                with timed("transfer", source="era5"):
+                                    c.download(result)
+
+                                oldfn = result[0]['location'][-39:]
+                                os.rename(oldfn, fn_var)
+                                varfiles.append(fn_var)
                     
-                    # merge all variables into single file
-                    merge(varfiles,fn_yrmn)
-                    ymfiles.append(fn_yrmn)
-
-        # merge all months and years into single file
-        merge(ymfiles,file_path)
-
-    elif area_box:
-        c.retrieve(
-            'reanalysis-era5-single-levels',
-            {
-                'product_type': 'reanalysis',
-                'variable': variables,
-                'year': years,
-                'month': months,
-                'day': days,
-                'time': times,
-                'area': [vals[0], vals[1], vals[2], vals[3]],
-                'format': file_format,
-            },
-            file_path)
-    else:
-        c.retrieve(
-            'reanalysis-era5-single-levels',
-            {
-                'product_type': 'reanalysis',
-                'variable': variables,
-                'year': years,
-                'month': months,
-                'day': days,
-                'time': times,
-                'format': file_format,
-            },
-            file_path)
+                        # merge all variables into single file
+                        merge(varfiles,fn_yrmn)
+                        ymfiles.append(fn_yrmn)
+
+            # merge all months and years into single file
+            merge(ymfiles,part_file_path)
+
+        elif area_box:
+            with timed("transfer", source="era5"):
+                c.retrieve(
+                    'reanalysis-era5-single-levels',
+                    {
+                        'product_type': 'reanalysis',
+                        'variable': variables,
+                        'year': years,
+                        'month': months,
+                        'day': days,
+                        'time': times,
+                        'area': [vals[0], vals[1], vals[2], vals[3]],
+                        'format': file_format,
+                    },
+                    part_file_path)
+        else:
+            with timed("transfer", source="era5"):
+                c.retrieve(
+                    'reanalysis-era5-single-levels',
+                    {
+                        'product_type': 'reanalysis',
+                        'variable': variables,
+                        'year': years,
+                        'month': months,
+                        'day': days,
+                        'time': times,
+                        'format': file_format,
+                    },
+                    part_file_path)
+
+        if os.path.isfile(part_file_path):
+            os.replace(part_file_path, file_path)
+            count("bytes", os.path.getsize(file_path), phase="transfer", source="era5")
 
     if not os.path.isfile(file_path):
         raise RuntimeError("Unable to locate output file '{}'.".format(file_path))
 
     print("Downloaded data was saved to '{}'.".format(file_path))
+    return file_path
+
+
+#   the thickness of each ERA5 soil layer in cm, from the surface down (0-7, 7-28, 28-100 and 100-289 cm)
+SOIL_LAYER_THICKNESS_CM = (7, 21, 72, 189)
+
+#   hourly reanalysis accumulations (i.e. total precipitation) are over the hour ending at the time step, and daily
+#   statistics are means of the hourly accumulations.  Monthly means hold the mean daily accumulation.
+ACCUMULATION_HOURS = 1
+MONTHLY_ACCUMULATION_HOURS = 24
+
+#   files with time steps of at least this many hours are taken to hold monthly means
+MONTHLY_STEP_HOURS = 28 * 24
+
+#   the approximate size of each block of time steps read when deriving variables
+DERIVED_BLOCK_BYTES = 64 * 1024 * 1024
+
+#   a variable computed from downloaded variables, given as a dictionary of arrays keyed by short name.  The function of
+#   an 'accumulated' variable is also given the number of hours the file's accumulations are totalled over.
+DerivedVar = namedtuple("DerivedVar", ["inputs", "units", "long_name", "function", "accumulated"], defaults=(False,))
+
+
+#   the short names of the downloaded variables that derived variables are computed from
+_U10, _V10, _T2M, _SKT, _TP = (map_var_short_names[v] for v in (Var.wind_10m_u_component, Var.wind_10m_v_component,
+                                                                 Var.temperature_2m, Var.skin_temperature,
+                                                                 Var.total_precipitation))
+_SOIL_WATER_LAYERS = [map_var_short_names[v] for v in (Var.volumetric_soil_water_layer_1,
+                                                       Var.volumetric_soil_water_layer_2,
+                                                       Var.volumetric_soil_water_layer_3,
+                                                       Var.volumetric_soil_water_layer_4)]
+
+
+def _soil_water(layers: int) -> DerivedVar:
+    thickness = SOIL_LAYER_THICKNESS_CM[:layers]
+    names = _SOIL_WATER_LAYERS[:layers]
+    return DerivedVar(tuple(names), "m3 m-3",
+                      "Volumetric soil water 0-{} cm, weighted by layer thickness".format(sum(thickness)),
+                      lambda v: sum(v[n] * t for n, t in zip(names, thickness)) / sum(thickness))
+
+
+#   variables that can be derived, keyed by the name they're written as
+derived_variables: Dict[str, DerivedVar] = {
+    "wind_speed_10m": DerivedVar((_U10, _V10), "m s-1", "10 metre wind speed",
+                                 lambda v: np.hypot(v[_U10], v[_V10])),
+    "wind_direction_10m": DerivedVar((_U10, _V10), "degree",
+                                     "10 metre wind direction, the direction the wind blows from, clockwise from north",
+                                     lambda v: np.mod(180 + np.degrees(np.arctan2(v[_U10], v[_V10])), 360)),
+    "temperature_2m_celsius": DerivedVar((_T2M,), "degC", "2 metre temperature", lambda v: v[_T2M] - 273.15),
+    "skin_temperature_celsius": DerivedVar((_SKT,), "degC", "Skin temperature", lambda v: v[_SKT] - 273.15),
+    "soil_water_0_7cm": _soil_water(1),
+    "soil_water_0_28cm": _soil_water(2),
+    "soil_water_0_100cm": _soil_water(3),
+    "soil_water_0_289cm": _soil_water(4),
+    "precipitation_rate": DerivedVar((_TP,), "mm h-1", "Total precipitation rate",
+                                     lambda v, hours: v[_TP] * 1000 / hours, accumulated=True),
+}
+
+
+def _accumulation_hours(source: netCDF4.Dataset, time_dim: Optional[str]) -> Optional[int]:
+    """
+    Returns the number of hours the accumulated variables (i.e. total precipitation) of a downloaded file are totalled
+    over, from the file's time step: ACCUMULATION_HOURS for hourly data and daily statistics, and
+    MONTHLY_ACCUMULATION_HOURS for monthly means
+    :param source: the open netCDF file
+    :param time_dim: the name of the file's time dimension
+    :return: the number of hours, or None if the file has fewer than two time steps so the step isn't known
+    """
+    if time_dim is None or len(source.dimensions[time_dim]) < 2:
+        return None
+    coordinate = source.variables[time_dim]
+    dates = netCDF4.num2date(coordinate[:2], coordinate.units, getattr(coordinate, "calendar", "standard"))
+    step_hours = (dates[1] - dates[0]).total_seconds() / 3600
+    return MONTHLY_ACCUMULATION_HOURS if step_hours >= MONTHLY_STEP_HOURS else ACCUMULATION_HOURS
+
+
+def derived_file_path(file_path: str) -> str:
+    """
+    Returns the path derived variables of a downloaded file are written to, '<stem>_derived.nc' alongside it
+    """
+    path = Path(file_path)
+    return str(path.with_name(path.stem + "_derived.nc"))
+
+
+def derive_variables(file_path: str, names: Iterable[str] = None, output_path: str = None,
+                     accumulation_hours: int = None) -> str:
+    """
+    Computes derived variables (see 'derived_variables') from a downloaded netCDF file.  The file is read and the
+    output written a block of whole time chunks at a time, so memory use is bounded by DERIVED_BLOCK_BYTES however
+    long the file is.
+    :param file_path: a netCDF file from 'download_era5_reanalysis_data'
+    :param names: the derived variables to compute; by default every one whose inputs are in the file
+    :param output_path: the output netCDF file, by default 'derived_file_path(file_path)'
+    :param accumulation_hours: the number of hours the file's accumulations are totalled over.  By default it is found
+    from the file's time step (see '_accumulation_hours').  Accumulated variables are only derived by default from a
+    file with a single time step if it is given.
+    :return: the output path
+    :raises ValueError: if a derived variable is unknown or its inputs are not in the file, or if an accumulated
+    variable is requested from a file with a single time step and no 'accumulation_hours'
+    """
+    output_path = output_path or derived_file_path(file_path)
+    requested = names is not None
+    with netCDF4.Dataset(file_path) as source:
+        if names is None:
+            names = [n for n, d in derived_variables.items() if all(i in source.variables for i in d.inputs)]
+        names = list(names)
+        for name in names:
+            if name not in derived_variables:
+                raise ValueError("'{}' is not a derived variable.  Supported: [{}]".format(
+                    name, ", ".join(derived_variables)))
+            missing = [i for i in derived_variables[name].inputs if i not in source.variables]
+            if missing:
+                raise ValueError("'{}' needs [{}], which are not in '{}'.".format(name, ", ".join(missing), file_path))
+        if not names:
+            raise ValueError("No derived variables can be computed from '{}'.".format(file_path))
+
+        inputs = sorted({i for n in names for i in derived_variables[n].inputs})
+        template = source.variables[inputs[0]]
+        dimensions = template.dimensions
+        time_dim = next((d for d in dimensions if d in source.variables and coordinate_axis(
+            d, {a: source.variables[d].getncattr(a) for a in source.variables[d].ncattrs()}) == "time"), None)
+        time_axis = dimensions.index(time_dim) if time_dim is not None else None
+
+        accumulated = [n for n in names if derived_variables[n].accumulated]
+        hours = accumulation_hours or (_accumulation_hours(source, time_dim) if accumulated else None)
+        if accumulated and hours is None:
+            message = "The accumulation period of '{}' isn't known as it has a single time step, so [{}] can't be " \
+                      "derived without 'accumulation_hours'.".format(file_path, ", ".join(accumulated))
+            if requested:
+                raise ValueError(message)
+            logger.warning(message)
+            names = [n for n in names if n not in accumulated]
+            if not names:
+                raise ValueError("No derived variables can be computed from '{}'.".format(file_path))
+            inputs = sorted({i for n in names for i in derived_variables[n].inputs})
+
+        with netCDF4.Dataset(output_path, "w") as target:
+            target.setncatts({a: source.getncattr(a) for a in source.ncattrs()})
+            target.history = "Derived from '{}' by era_download.derive_variables".format(os.path.basename(file_path))
+            for dim in dimensions:
+                size = source.dimensions[dim]
+                target.createDimension(dim, None if size.isunlimited() else len(size))
+                if dim in source.variables:
+                    coordinate = source.variables[dim]
+                    copy = target.createVariable(dim, coordinate.datatype, coordinate.dimensions)
+                    copy.setncatts({a: coordinate.getncattr(a) for a in coordinate.ncattrs()})
+                    copy[:] = coordinate[:]
+
+            chunking = template.chunking()
+            steps = template.shape[time_axis] if time_axis is not None else 1
+            time_chunk = 1 if time_axis is None or chunking == "contiguous" else chunking[time_axis]
+            step_bytes = int(np.prod([n for i, n in enumerate(template.shape) if i != time_axis])) * 8 * \
+                (len(inputs) + len(names))
+            block = time_chunk * max(1, DERIVED_BLOCK_BYTES // (step_bytes * time_chunk))
+            outputs = {}
+            for name in names:
+                derived = derived_variables[name]
+                chunk_sizes = [min(block, steps) if i == time_axis else n for i, n in enumerate(template.shape)]
+                outputs[name] = target.createVariable(name, "f4", dimensions, zlib=True, fill_value=np.float32(np.nan),
+                                                      chunksizes=[max(1, n) for n in chunk_sizes])
+                outputs[name].units = derived.units
+                outputs[name].long_name = derived.long_name
+
+            for start in range(0, steps, block):
+                index = [slice(None)] * len(dimensions)
+                if time_axis is not None:
+                    index[time_axis] = slice(start, min(start + block, steps))
+                index = tuple(index)
+                with timed("read", operation="derive_variables"):
+                    values = {i: np.ma.filled(np.ma.asarray(source.variables[i][index], dtype=float), np.nan)
+                              for i in inputs}
+                count("rows", index[time_axis].stop - start if time_axis is not None else 1,
+                      phase="read", operation="derive_variables")
+                for name in names:
+                    with timed("compute", operation="derive_variables"):
+                        function = derived_variables[name].function
+                        derived = function(values, hours) if derived_variables[name].accumulated else function(values)
+                        derived = derived.astype(np.float32)
+                    with timed("write", operation="derive_variables"):
+                        outputs[name][index] = derived
+    logger.info("Derived [{}] from '{}' in '{}'.".format(", ".join(names), file_path, output_path))
+    return output_path
+
+
+def _derive_variables_or_log(file_path: str, names: List[str], accumulation_hours: int = None) -> str:
+    try:
+        return derive_variables(file_path, names, accumulation_hours=accumulation_hours)
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.warning("Failed to derive variables from '{}'. {}".format(file_path, e))
+        return None
+
+
+def derive_variables_batch(file_paths: Iterable[str], names: Iterable[str] = None,
+                           max_workers: int = None, accumulation_hours: int = None) -> Dict[str, str]:
+    """
+    Computes derived variables for many downloaded files across a process pool, i.e. one file per month of a
+    multi-year download.  See 'derive_variables'.
+    :param file_paths: netCDF files from 'download_era5_reanalysis_data'
+    :param names: the derived variables to compute; by default every one whose inputs are in each file
+    :param max_workers: the number of worker processes, defaults to the number of processors.  1 runs in this process.
+    :param accumulation_hours: optional, the number of hours the files' accumulations are totalled over, see
+    'derive_variables'
+    :return: a dictionary of output paths keyed by input file; failed files have None
+    """
+    file_paths = list(file_paths)
+    names = list(names) if names is not None else None
+    if max_workers == 1:
+        return {f: _derive_variables_or_log(f, names, accumulation_hours) for f in file_paths}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(file_paths, executor.map(_derive_variables_or_log, file_paths, [names] * len(file_paths),
+                                                 [accumulation_hours] * len(file_paths))))
 
 
 def main() -> int:
@@ -244,6 +500,10 @@ def main() -> int:
     parser.add_argument("-t", "--times", nargs="+", help="Time of the data set to be downloaded (format: HH:MM)")
     parser.add_argument("-f", "--frequency", dest="frequency", default='monthly', help="Define frequency of accessed ECMWF data")
     parser.add_argument("-o", "--out_file", nargs=1, help="Filename for the downloaded data.")
+    parser.add_argument("-x", "--derive", nargs="*", help="Derive variables from a downloaded netCDF file, written to"
+                                                          " '<out_file stem>_derived.nc'.  Without names, every"
+                                                          " variable that can be derived is.  Supported variables: [{}]"
+                        .format(", ".join(derived_variables)))
 
     args = parser.parse_args()
     #print("Args: {}".format(args))
@@ -270,6 +530,11 @@ def main() -> int:
 
     try:
         download_era5_reanalysis_data(dates=dates, times=times, variables=args.variables, area=args.area, frequency=args.frequency, file_path=file_path)
+        if args.derive is not None:
+            #   monthly means hold mean daily accumulations, which can't be told from a single month's time step
+            hours = MONTHLY_ACCUMULATION_HOURS if args.frequency == 'monthly' else ACCUMULATION_HOURS
+            print("Derived data was saved to '{}'.".format(derive_variables(file_path, args.derive or None,
+                                                                            accumulation_hours=hours)))
 
         return 0
     except ValueError as ex:
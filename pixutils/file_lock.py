@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator
+
+logger = logging.getLogger("file_lock")
+
+#   appended to an output path to name its lock file
+LOCK_SUFFIX = ".lock"
+
+#   appended to an output path to name the partial file it is written to before being moved in to place
+PARTIAL_SUFFIX = ".part"
+
+#   the number of seconds between attempts to take a held lock
+POLL_INTERVAL = 0.5
+
+#   the age in seconds after which a lock held by a process on another host is treated as stale.  Locks held on this
+#   host are stale as soon as their process has exited.
+DEFAULT_MAX_AGE = 12 * 60 * 60
+
+#   the age in seconds after which a lock file that is empty or can't be parsed is treated as stale.  Its owner writes
+#   it as soon as it is created, so a lock left unreadable for longer was abandoned part way through being written.
+UNREADABLE_MAX_AGE = 10
+
+#   the contents of a lock file
+LockInfo = namedtuple("LockInfo", ["pid", "host", "created", "token"])
+
+
+def lock_path(output_path: str) -> str:
+    """
+    Returns the path of the lock file guarding an output file, alongside it
+    """
+    return output_path + LOCK_SUFFIX
+
+
+def partial_path(output_path: str) -> str:
+    """
+    Returns the path an output file should be written to before being moved in to place with 'os.replace', so other
+    processes never see a partly written file
+    """
+    return output_path + PARTIAL_SUFFIX
+
+
+def read_lock(path: str) -> LockInfo:
+    """
+    Reads the owner of a lock file
+    :param path: path to the lock file
+    :return: a LockInfo, or None if the lock file doesn't exist.  A lock file that is empty or can't be parsed, i.e.
+    one that is still being written, gives a LockInfo with only 'created', from the file's modification time.
+    """
+    try:
+        with open(path) as f:
+            return LockInfo(**json.load(f))
+    except FileNotFoundError:
+        return None
+    except (ValueError, TypeError):
+        try:
+            return LockInfo(None, None, os.stat(path).st_mtime, None)
+        except FileNotFoundError:
+            return None
+
+
+def _process_exists(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def is_stale(info: LockInfo, max_age: float = DEFAULT_MAX_AGE) -> bool:
+    """
+    Determines whether a lock was left behind by a process that has exited.  A lock taken on this host is stale when
+    its process no longer exists; the liveness of processes on other hosts can't be checked, so their locks are stale
+    once they are older than 'max_age' seconds.  A lock file that couldn't be read is stale once it is older than
+    UNREADABLE_MAX_AGE seconds.
+    """
+    if info.pid is None and info.host is None:
+        return time.time() - info.created > min(max_age, UNREADABLE_MAX_AGE)
+    if info.host == socket.gethostname() and info.pid is not None:
+        return not _process_exists(info.pid)
+    return time.time() - info.created > max_age
+
+
+class FileLock:
+    """
+    A cross-process lock held by creating a lock file exclusively (O_CREAT | O_EXCL), which works on local and network
+    file systems.  The lock file records the process, host and time it was taken, so locks left by crashed processes
+    are detected and broken.
+    """
+
+    def __init__(self, path: str, timeout: float = None, poll_interval: float = POLL_INTERVAL,
+                 max_age: float = DEFAULT_MAX_AGE):
+        """
+        :param path: path to the lock file
+        :param timeout: the number of seconds to wait for the lock, or None to wait indefinitely
+        :param poll_interval: the number of seconds between attempts to take the lock
+        :param max_age: the age in seconds after which locks taken on other hosts are stale, see 'is_stale'
+        """
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_age = max_age
+        self.token = None
+        #   true once the lock has been taken after waiting for another process to release it
+        self.waited = False
+
+    def _try_create(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        token = uuid.uuid4().hex
+        with os.fdopen(fd, "w") as f:
+            json.dump(LockInfo(os.getpid(), socket.gethostname(), time.time(), token)._asdict(), f)
+        self.token = token
+        return True
+
+    def _break_stale(self, info: LockInfo) -> None:
+        """
+        Removes a stale lock file.  The file is first moved aside and checked, so a lock taken by another process after
+        this one read the stale lock isn't removed by mistake.
+        """
+        aside = "{}.{}.stale".format(self.path, uuid.uuid4().hex)
+        try:
+            os.rename(self.path, aside)
+        except FileNotFoundError:
+            return
+        if read_lock(aside) == info:
+            logger.warning("Broke stale lock '{}' held by process {} on '{}' since {}.".format(
+                self.path, info.pid, info.host, datetime.fromtimestamp(info.created, timezone.utc).isoformat()))
+            os.remove(aside)
+        else:
+            #   a fresh lock was moved aside; put it back unless yet another process has taken the lock since
+            try:
+                os.link(aside, self.path)
+            except FileExistsError:
+                pass
+            os.remove(aside)
+
+    def acquire(self) -> "FileLock":
+        """
+        Takes the lock, waiting for the process holding it to release it or breaking it if it is stale
+        :raises TimeoutError: if the lock isn't taken within the timeout
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self._try_create():
+            info = read_lock(self.path)
+            if info is None:
+                continue
+            if is_stale(info, self.max_age):
+                self._break_stale(info)
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError("Timed out waiting for lock '{}' held by process {} on '{}'.".format(
+                    self.path, info.pid, info.host))
+            if not self.waited:
+                logger.debug("Waiting for lock '{}' held by process {} on '{}'.".format(self.path, info.pid,
+                                                                                       info.host))
+            self.waited = True
+            time.sleep(self.poll_interval if deadline is None else
+                       max(0.0, min(self.poll_interval, deadline - time.monotonic())))
+        return self
+
+    def release(self) -> None:
+        """
+        Releases the lock, if this lock object still holds it
+        """
+        info = read_lock(self.path)
+        if self.token is not None and info is not None and info.token == self.token:
+            os.remove(self.path)
+        self.token = None
+
+    def __enter__(self) -> "FileLock":
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+@contextmanager
+def single_flight(output_path: str, timeout: float = None, poll_interval: float = POLL_INTERVAL,
+                  max_age: float = DEFAULT_MAX_AGE) -> Iterator[bool]:
+    """
+    Coordinates processes producing the same output file, so only one of them does the work.  The first caller holds
+    the lock while it produces the file; the others wait and are then told the file is ready.  Write the output to
+    'partial_path(output_path)' and move it in to place with 'os.replace' so a failed attempt never leaves a partial
+    file behind.
+    :param output_path: the file being produced
+    :param timeout: the number of seconds to wait for another process, or None to wait indefinitely
+    :return: a context yielding True if the caller should produce the file, or False if another process produced it
+    while this one waited
+    :raises TimeoutError: if the lock isn't taken within the timeout
+    """
+    with FileLock(lock_path(output_path), timeout, poll_interval, max_age) as lock:
+        produced = lock.waited and os.path.isfile(output_path)
+        if produced:
+            logger.info("'{}' was produced by another process.".format(output_path))
+        yield not produced
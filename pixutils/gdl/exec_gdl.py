@@ -1,26 +1,14 @@
-import subprocess
+from pixutils.gdl.gdl_pool import default_pool
 
 
 def exec_gdl(gdl_commands: [str], working_dir: str = None) -> (int, str, str):
     """
-    Creates a GDL interpreter process and then streams commands into the process before exiting.
-    :param gdl_commands: a list of GDL statements to send into the GDL interpreter
+    Runs GDL commands in a long-lived interpreter from the default pool (see 'gdl_pool').  The interpreter is reset
+    after the commands have run, so no state is carried between calls.
+    :param gdl_commands: a list of GDL statements to send into the GDL interpreter.  As with a 'gdl' process, an
+    "exit" statement ends the commands and sets the exit code, i.e. "exit, status=1".
     :param working_dir: the directory where files called in GDL statements exist
-    :return: a tuple containing the exit code, stdout, and stderr from the GDL process
+    :return: a tuple containing the exit code, stdout, and stderr from the GDL commands.  The exit code is 0 unless the
+    commands exit with a status or the interpreter crashes.
     """
-
-    #   create a subprocess for gdl and pipe the specified commands to the subprocess.
-    p = subprocess.run(['gdl'],
-                       cwd=working_dir,
-                       env={
-                           "SHELL": "/bin/bash",
-                           #"PATH": os.environ["PATH"] + os.pathsep + path,
-                           #"DIR": path,
-                       },
-                       stdout=subprocess.PIPE,
-                       stderr=subprocess.PIPE,
-                       input="\n".join(gdl_commands) + "\n",
-                       encoding='ascii')
-
-    #   capture the return code and stdout and stderr outputs
-    return p.returncode, p.stdout, p.stderr
+    return default_pool().run(gdl_commands, working_dir)
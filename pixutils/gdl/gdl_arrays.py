@@ -0,0 +1,233 @@
+import os
+import struct
+import shutil
+import logging
+import tempfile
+from collections import namedtuple
+from typing import List, Tuple
+import numpy as np
+
+logger = logging.getLogger("gdl_arrays")
+
+#   Arrays are exchanged as raw files: a fixed size header followed by the array data, little endian, in C order.
+#   The header holds a magic string, the dtype (i.e. "<f4"), the number of dimensions and the shape, and is padded
+#   to HEADER_SIZE bytes so GDL can skip it with a fixed offset.
+HEADER_SIZE = 128
+MAGIC = b"PIXGDLA1"
+MAX_NDIM = 8
+_HEADER_STRUCT = struct.Struct("<8s8sQ{}Q".format(MAX_NDIM))
+
+#   map NumPy dtypes to GDL type codes
+DTYPE_TO_GDL_TYPE = {
+    np.dtype(np.uint8): 1,
+    np.dtype(np.int16): 2,
+    np.dtype(np.int32): 3,
+    np.dtype(np.float32): 4,
+    np.dtype(np.float64): 5,
+    np.dtype(np.complex64): 6,
+    np.dtype(np.complex128): 9,
+    np.dtype(np.uint16): 12,
+    np.dtype(np.uint32): 13,
+    np.dtype(np.int64): 14,
+    np.dtype(np.uint64): 15,
+}
+
+ArrayHeader = namedtuple("ArrayHeader", ["dtype", "shape"])
+
+
+def _little_endian(dtype) -> np.dtype:
+    """
+    Returns the little endian equivalent of a dtype, checking that GDL has a matching type
+    """
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype.newbyteorder("=") not in DTYPE_TO_GDL_TYPE:
+        raise ValueError("Arrays of type '{}' can't be exchanged with GDL.".format(dtype.name))
+    return dtype
+
+
+def gdl_type(dtype) -> int:
+    """
+    Returns the GDL type code of a NumPy dtype, i.e. 4 for float32
+    :raises ValueError: if GDL has no matching type
+    """
+    return DTYPE_TO_GDL_TYPE[_little_endian(dtype).newbyteorder("=")]
+
+
+def gdl_dims(shape: Tuple[int, ...]) -> List[int]:
+    """
+    Returns the GDL dimensions of an array with the given NumPy shape.  GDL arrays are column major, so the dimensions
+    are reversed: a NumPy array of shape (rows, columns) is a GDL array of dimensions [columns, rows].
+    """
+    return list(reversed(shape)) or [1]
+
+
+def _pack_header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    if len(shape) > MAX_NDIM:
+        raise ValueError("Arrays with more than {} dimensions can't be exchanged with GDL.".format(MAX_NDIM))
+    dims = list(shape) + [0] * (MAX_NDIM - len(shape))
+    header = _HEADER_STRUCT.pack(MAGIC, dtype.str.encode("ascii"), len(shape), *dims)
+    return header.ljust(HEADER_SIZE, b"\0")
+
+
+def read_header(path: str) -> ArrayHeader:
+    """
+    Reads the header of an exchange file
+    :param path: path to the exchange file
+    :return: an ArrayHeader of the array's dtype and shape
+    :raises ValueError: if the file isn't an exchange file
+    """
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or not header.startswith(MAGIC):
+        raise ValueError("'{}' is not an array exchange file.".format(path))
+
+    _, dtype, ndim, *dims = _HEADER_STRUCT.unpack(header[:_HEADER_STRUCT.size])
+    return ArrayHeader(np.dtype(dtype.rstrip(b"\0").decode("ascii")), tuple(dims[:ndim]))
+
+
+def create_array(path: str, shape: Tuple[int, ...], dtype) -> np.memmap:
+    """
+    Creates an exchange file of zeros, i.e. to be filled in place by Python or to receive a result from GDL
+    :param path: path to the exchange file
+    :param shape: the NumPy shape of the array
+    :param dtype: the NumPy dtype of the array, stored little endian
+    :return: a writeable memory map of the array in the file
+    """
+    dtype = _little_endian(dtype)
+    shape = tuple(int(s) for s in shape)
+    with open(path, "wb") as f:
+        f.write(_pack_header(dtype, shape))
+        f.truncate(HEADER_SIZE + dtype.itemsize * int(np.prod(shape)))
+    return np.memmap(path, dtype=dtype, mode="r+", offset=HEADER_SIZE, shape=shape)
+
+
+def write_array(path: str, array: np.ndarray) -> None:
+    """
+    Writes an array to an exchange file
+    :param path: path to the exchange file
+    :param array: the array, converted to little endian and C order if it isn't already
+    """
+    array = np.asarray(array)
+    dtype = _little_endian(array.dtype)
+    with open(path, "wb") as f:
+        f.write(_pack_header(dtype, array.shape))
+        np.ascontiguousarray(array, dtype=dtype).tofile(f)
+
+
+def open_array(path: str, mode: str = "r") -> np.memmap:
+    """
+    Maps the array in an exchange file without copying or parsing it
+    :param path: path to the exchange file
+    :param mode: the memory map mode, "r" (read only), "r+" (read and write) or "c" (copy on write)
+    :return: a memory map of the array
+    """
+    header = read_header(path)
+    expected = HEADER_SIZE + header.dtype.itemsize * int(np.prod(header.shape))
+    if os.path.getsize(path) < expected:
+        raise ValueError("'{}' is truncated, expected {} bytes.".format(path, expected))
+    return np.memmap(path, dtype=header.dtype, mode=mode, offset=HEADER_SIZE, shape=header.shape)
+
+
+def _quote(path: str) -> str:
+    return "'{}'".format(os.path.abspath(path).replace("'", "''"))
+
+
+def gdl_read_statements(variable: str, path: str, use_assoc: bool = False) -> List[str]:
+    """
+    Generates the GDL statements that read an exchange file in to a GDL variable
+    :param variable: the name of the GDL variable
+    :param path: path to the exchange file
+    :param use_assoc: if True, 'variable' is an ASSOC variable whose records are the sub-arrays along the first
+    NumPy axis, i.e. the bands of a (bands, rows, columns) stack, and the file is left open in the logical unit
+    '<variable>_lun' so records can be read on demand.  Otherwise the whole array is read with READ_BINARY.
+    :return: a list of GDL statements
+    """
+    header = read_header(path)
+    type_code = gdl_type(header.dtype)
+    dims = gdl_dims(header.shape)
+
+    if not use_assoc:
+        return ["{} = READ_BINARY({}, DATA_START={}, DATA_TYPE={}, DATA_DIMS=[{}], ENDIAN='little')".format(
+            variable, _quote(path), HEADER_SIZE, type_code, ", ".join(str(d) for d in dims))]
+
+    record_dims = dims[:-1] or [1]
+    return ["OPENR, {}_lun, {}, /GET_LUN, /SWAP_IF_BIG_ENDIAN".format(variable, _quote(path)),
+            "{} = ASSOC({}_lun, MAKE_ARRAY({}, TYPE={}, /NOZERO), {})".format(
+                variable, variable, ", ".join(str(d) for d in record_dims), type_code, HEADER_SIZE)]
+
+
+def gdl_write_statements(variable: str, path: str) -> List[str]:
+    """
+    Generates the GDL statements that write a GDL variable in to an exchange file created with 'create_array'.  The
+    variable is converted to the type of the file; it must have the same number of elements.
+    :param variable: the name of the GDL variable
+    :param path: path to the exchange file
+    :return: a list of GDL statements
+    """
+    header = read_header(path)
+    return ["OPENU, {}_lun, {}, /GET_LUN, /SWAP_IF_BIG_ENDIAN".format(variable, _quote(path)),
+            "POINT_LUN, {}_lun, {}".format(variable, HEADER_SIZE),
+            "WRITEU, {}_lun, FIX({}, TYPE={})".format(variable, variable, gdl_type(header.dtype)),
+            "FREE_LUN, {}_lun".format(variable)]
+
+
+class ArrayExchange:
+    """
+    Manages a temporary folder of exchange files for passing arrays to and from GDL commands, i.e.
+
+        with ArrayExchange() as exchange:
+            commands = exchange.put("image", image)
+            commands += ["result = SMOOTH(image, 5)"]
+            commands += exchange.allocate("result", image.shape, np.float32)
+            exec_gdl(commands)
+            result = exchange.get("result")
+    """
+
+    def __init__(self, folder: str = None):
+        """
+        :param folder: optional, the folder to hold the exchange files, i.e. on a RAM disk.  If not given, a temporary
+        folder is created and removed on close.
+        """
+        self._temporary = folder is None
+        self.folder = tempfile.mkdtemp(prefix="pixutils_gdl_") if folder is None else folder
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Removes the temporary folder.  Arrays returned by 'get' must not be used after closing.
+        """
+        if self._temporary and os.path.isdir(self.folder):
+            shutil.rmtree(self.folder)
+
+    def path(self, variable: str) -> str:
+        """
+        Returns the path of the exchange file for a GDL variable
+        """
+        return os.path.join(self.folder, "{}.raw".format(variable))
+
+    def put(self, variable: str, array: np.ndarray, use_assoc: bool = False) -> List[str]:
+        """
+        Writes an array for GDL to read
+        :return: the GDL statements that read the array in to 'variable', see 'gdl_read_statements'
+        """
+        write_array(self.path(variable), array)
+        return gdl_read_statements(variable, self.path(variable), use_assoc)
+
+    def allocate(self, variable: str, shape: Tuple[int, ...], dtype) -> List[str]:
+        """
+        Preallocates the file for a GDL result
+        :return: the GDL statements that write 'variable' in to the file, see 'gdl_write_statements'
+        """
+        create_array(self.path(variable), shape, dtype)
+        return gdl_write_statements(variable, self.path(variable))
+
+    def get(self, variable: str, mode: str = "r") -> np.memmap:
+        """
+        Maps an array written by GDL without copying it
+        """
+        return open_array(self.path(variable), mode)
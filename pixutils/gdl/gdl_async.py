@@ -0,0 +1,153 @@
+import time
+import asyncio
+import logging
+import subprocess
+from collections import namedtuple
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Union
+from pixutils.gdl.gdl_pool import GDL_EXECUTABLE, GdlPool, LineCallback, default_pool
+
+logger = logging.getLogger("gdl_async")
+
+#   the result of a single GDL job.  'elapsed' is in seconds, and 'returncode' is None if the job timed out.
+GdlResult = namedtuple("GdlResult", ["returncode", "stdout", "stderr", "elapsed", "timed_out"])
+
+#   a job with its own working directory, for use in 'run_gdl_batch'
+GdlJob = namedtuple("GdlJob", ["commands", "working_dir"])
+
+#   the results of a batch of jobs, in the order the jobs were given, with aggregate counts and timings
+GdlBatchResult = namedtuple("GdlBatchResult", ["results", "returncodes", "succeeded", "failed", "timed_out",
+                                               "total_elapsed", "wall_time"])
+
+
+def _threadsafe(loop: asyncio.AbstractEventLoop, callback: Optional[LineCallback]) -> Optional[LineCallback]:
+    """
+    Wraps a line callback so it is called on the event loop, rather than in the thread the job runs in
+    """
+    return None if callback is None else lambda line: loop.call_soon_threadsafe(callback, line)
+
+
+async def _run_in_pool(pool: GdlPool,
+                       gdl_commands: List[str],
+                       working_dir: Optional[str],
+                       timeout: Optional[float],
+                       on_stdout: Optional[LineCallback],
+                       on_stderr: Optional[LineCallback],
+                       executor: Optional[Executor] = None) -> GdlResult:
+    """
+    Runs a job in an interpreter from a pool, in a worker thread so the event loop isn't blocked
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        returncode, stdout, stderr = await loop.run_in_executor(
+            executor, pool.run, gdl_commands, working_dir, timeout,
+            _threadsafe(loop, on_stdout), _threadsafe(loop, on_stderr))
+        timed_out = False
+    except subprocess.TimeoutExpired as e:
+        logger.warning("GDL job timed out after {} seconds.".format(timeout))
+        returncode, stdout, stderr, timed_out = None, e.output or "", e.stderr or "", True
+    return GdlResult(returncode, stdout, stderr, time.perf_counter() - start, timed_out)
+
+
+async def exec_gdl_async(gdl_commands: List[str],
+                         working_dir: str = None,
+                         timeout: float = None,
+                         on_stdout: LineCallback = None,
+                         on_stderr: LineCallback = None,
+                         executable: Union[str, List[str]] = GDL_EXECUTABLE,
+                         env: dict = None,
+                         pool: GdlPool = None) -> GdlResult:
+    """
+    Runs GDL commands in a long-lived interpreter from a pool (see 'gdl_pool'), without blocking the event loop.
+    Output is passed to the callbacks a line at a time as the interpreter produces it.
+    :param gdl_commands: a list of GDL statements to send into the GDL interpreter.  An "exit" statement ends the job
+    with its exit status, i.e. "exit, status=1"; see 'GdlInterpreter.run'.
+    :param working_dir: the directory where files called in GDL statements exist
+    :param timeout: optional, seconds the job may run for before its interpreter is killed
+    :param on_stdout: optional, called with each line written to stdout
+    :param on_stderr: optional, called with each line written to stderr
+    :param executable: the interpreter executable, or a list of the executable and its arguments, if 'pool' isn't given
+    :param env: the environment of the interpreter process (default: GDL_ENV), if 'pool' isn't given
+    :param pool: optional, the pool to run the job in.  Defaults to the pool used by 'exec_gdl', or to an interpreter
+    started for this job if 'executable' or 'env' are given.
+    :return: a GdlResult
+    """
+    if pool is not None:
+        return await _run_in_pool(pool, gdl_commands, working_dir, timeout, on_stdout, on_stderr)
+    if executable == GDL_EXECUTABLE and env is None:
+        return await _run_in_pool(default_pool(), gdl_commands, working_dir, timeout, on_stdout, on_stderr)
+    with GdlPool(1, executable, env) as pool:
+        return await _run_in_pool(pool, gdl_commands, working_dir, timeout, on_stdout, on_stderr)
+
+
+async def run_gdl_batch(jobs: Iterable[Union[List[str], GdlJob]],
+                        max_concurrency: int = 4,
+                        working_dir: str = None,
+                        timeout: float = None,
+                        on_stdout: Callable[[int, str], None] = None,
+                        on_stderr: Callable[[int, str], None] = None,
+                        executable: Union[str, List[str]] = GDL_EXECUTABLE,
+                        env: dict = None,
+                        pool: GdlPool = None) -> GdlBatchResult:
+    """
+    Runs many GDL jobs, with at most 'max_concurrency' running at once.  The jobs run in a pool of long-lived
+    interpreters, so each interpreter is started once and reused for the jobs that follow.
+    :param jobs: GDL command lists, or GdlJob tuples for jobs with their own working directory
+    :param max_concurrency: the maximum number of jobs that run at the same time
+    :param working_dir: the working directory of jobs given as command lists
+    :param timeout: optional, seconds each job may run for before it is killed
+    :param on_stdout: optional, called with the index of the job and each line it writes to stdout
+    :param on_stderr: optional, called with the index of the job and each line it writes to stderr
+    :param executable: the interpreter executable, or a list of the executable and its arguments, if 'pool' isn't given
+    :param env: the environment of the interpreter processes (default: GDL_ENV), if 'pool' isn't given
+    :param pool: optional, the pool to run the jobs in.  By default a pool of 'max_concurrency' interpreters is started
+    for the batch and closed when it completes.
+    :return: a GdlBatchResult, with the results in the order of 'jobs'
+    """
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1, not {}.".format(max_concurrency))
+
+    jobs = [j if isinstance(j, GdlJob) else GdlJob(j, working_dir) for j in jobs]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    start = time.perf_counter()
+
+    batch_pool = GdlPool(max_concurrency, executable, env) if pool is None else pool
+    #   each running job waits on its interpreter in a thread of its own
+    executor = ThreadPoolExecutor(max_concurrency, thread_name_prefix="gdl_batch")
+
+    async def run(index: int, job: GdlJob) -> GdlResult:
+        async with semaphore:
+            return await _run_in_pool(batch_pool,
+                                      job.commands,
+                                      job.working_dir,
+                                      timeout,
+                                      None if on_stdout is None else lambda line: on_stdout(index, line),
+                                      None if on_stderr is None else lambda line: on_stderr(index, line),
+                                      executor)
+
+    try:
+        results = await asyncio.gather(*(run(i, j) for i, j in enumerate(jobs)))
+    finally:
+        executor.shutdown(wait=False)
+        if pool is None:
+            batch_pool.close()
+    returncodes = [r.returncode for r in results]
+
+    return GdlBatchResult(results=results,
+                          returncodes=returncodes,
+                          succeeded=sum(1 for r in returncodes if r == 0),
+                          failed=sum(1 for r in results if r.returncode != 0 and not r.timed_out),
+                          timed_out=sum(1 for r in results if r.timed_out),
+                          total_elapsed=sum(r.elapsed for r in results),
+                          wall_time=time.perf_counter() - start)
+
+
+def exec_gdl_batch(jobs: Iterable[Union[List[str], GdlJob]], max_concurrency: int = 4, **kwargs) -> GdlBatchResult:
+    """
+    Runs 'run_gdl_batch' to completion from synchronous code.  Keyword arguments are passed to 'run_gdl_batch'.
+    :param jobs: GDL command lists, or GdlJob tuples for jobs with their own working directory
+    :param max_concurrency: the maximum number of jobs that run at the same time
+    :return: a GdlBatchResult, with the results in the order of 'jobs'
+    """
+    return asyncio.run(run_gdl_batch(jobs, max_concurrency, **kwargs))
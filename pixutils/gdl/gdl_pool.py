@@ -0,0 +1,280 @@
+import os
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import subprocess
+from typing import Callable, List, Optional, Union
+
+logger = logging.getLogger("gdl_pool")
+
+#   the interpreter executable, and the environment it is run in
+GDL_EXECUTABLE = "gdl"
+GDL_ENV = {
+    "SHELL": "/bin/bash",
+}
+
+#   sent after each job to return the interpreter to a clean state
+RESET_COMMAND = ".reset_session"
+
+#   a plain exit ends a job the same way as finishing it, so trailing ones are dropped and the interpreter is kept
+_EXIT_COMMANDS = {"exit", "exit,", ""}
+
+#   indexes of the interpreter output streams
+_STDOUT, _STDERR = 0, 1
+
+LineCallback = Callable[[str], None]
+
+
+def _read_lines(stream, index: int, lines: queue.Queue) -> None:
+    """
+    Copies lines from an interpreter output stream to a queue shared by both streams, each line paired with the index
+    of its stream, followed by None when the stream closes
+    """
+    for line in iter(stream.readline, ""):
+        lines.put((index, line))
+    stream.close()
+    lines.put((index, None))
+
+
+class GdlInterpreter:
+    """
+    A long-lived GDL interpreter process.  Jobs are sent over stdin, and the output of each job is framed by marker
+    lines printed to stdout and stderr once the job's commands have run.  The interpreter is restarted if it exits.
+    """
+
+    def __init__(self,
+                 executable: Union[str, List[str]] = GDL_EXECUTABLE,
+                 env: dict = None,
+                 reset_command: Optional[str] = RESET_COMMAND):
+        """
+        :param executable: the interpreter executable, or a list of the executable and its arguments
+        :param env: the environment of the interpreter process (default: GDL_ENV)
+        :param reset_command: sent after each job to clear the interpreter state, or None to keep state between jobs
+        """
+        self._args = [executable] if isinstance(executable, str) else list(executable)
+        self._env = GDL_ENV if env is None else env
+        self._reset_command = reset_command
+        self._process = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self) -> None:
+        self._process = subprocess.Popen(self._args,
+                                         env=self._env,
+                                         stdin=subprocess.PIPE,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.PIPE,
+                                         encoding='ascii',
+                                         errors='replace',
+                                         bufsize=1)
+        self._lines = queue.Queue()
+        for index, stream in [(_STDOUT, self._process.stdout), (_STDERR, self._process.stderr)]:
+            threading.Thread(target=_read_lines, args=(stream, index, self._lines), daemon=True).start()
+        logger.debug("Started GDL interpreter (pid {}).".format(self._process.pid))
+
+    def _send(self, commands: List[str]) -> str:
+        """
+        Sends commands followed by the output markers, and returns the marker
+        """
+        marker = "PIXUTILS_GDL_DONE_{}".format(uuid.uuid4().hex)
+        lines = commands + ["print, '{}'".format(marker),
+                            "printf, -2, '{}'".format(marker),
+                            "flush, -1, -2"]
+        self._process.stdin.write("\n".join(lines) + "\n")
+        self._process.stdin.flush()
+        return marker
+
+    def _read_until(self, marker: str, deadline: Optional[float],
+                    callbacks: (LineCallback, LineCallback) = (None, None)) -> (str, str, bool):
+        """
+        Reads output lines from both streams up to the marker line on each
+        :param callbacks: optional, called with each stdout and stderr line respectively as it is read, without the
+        newline
+        :return: a tuple of the stdout and stderr before the markers, and False if the interpreter closed its output
+        before both markers were read
+        """
+        output, done, completed = ([], []), [False, False], True
+        while not all(done):
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                index, line = self._lines.get(timeout=timeout)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired("gdl", timeout, "".join(output[_STDOUT]), "".join(output[_STDERR]))
+            if line is None:
+                #   the interpreter exited, the other stream is given a moment to close too
+                done[index], completed = True, False
+                deadline = time.monotonic() + 1 if deadline is None else min(deadline, time.monotonic() + 1)
+                continue
+            position = line.rfind(marker)
+            if position >= 0:
+                line, done[index] = line[:position], True
+            output[index].append(line)
+            if line and callbacks[index] is not None:
+                callbacks[index](line.rstrip("\n"))
+        return "".join(output[_STDOUT]), "".join(output[_STDERR]), completed
+
+    def run(self, gdl_commands: List[str], working_dir: str = None, timeout: float = None,
+            on_stdout: LineCallback = None, on_stderr: LineCallback = None) -> (int, str, str):
+        """
+        Runs a job in the interpreter, starting or restarting the interpreter process if required
+        :param gdl_commands: a list of GDL statements.  An "exit" statement, i.e. "exit, status=1", ends the
+        interpreter as it would a 'gdl' process, and its exit code is returned; a plain "exit" at the end is ignored.
+        :param working_dir: the directory where files called in GDL statements exist (default: the current directory)
+        :param timeout: optional, seconds to wait for the job to complete
+        :param on_stdout: optional, called with each line the job writes to stdout as it is written
+        :param on_stderr: optional, called with each line the job writes to stderr as it is written
+        :return: a tuple containing the exit code, stdout, and stderr of the job.  The exit code is 0 unless the
+        interpreter exited during the job, in which case it is the process exit code and the interpreter is restarted
+        for the next job.
+        :raises subprocess.TimeoutExpired: if the job doesn't complete within the timeout; the interpreter is killed
+        """
+        if not self.is_running:
+            self._start()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        commands = ["cd, '{}'".format((working_dir or os.getcwd()).replace("'", "''"))]
+        gdl_commands = list(gdl_commands)
+        while gdl_commands and gdl_commands[-1].strip().lower() in _EXIT_COMMANDS:
+            gdl_commands.pop()
+        commands.extend(gdl_commands)
+
+        try:
+            marker = self._send(commands)
+            stdout, stderr, completed = self._read_until(marker, deadline, (on_stdout, on_stderr))
+        except subprocess.TimeoutExpired:
+            self.close(kill=True)
+            raise
+        except BrokenPipeError:
+            completed, stdout, stderr = False, "", ""
+
+        if not completed:
+            #   the interpreter exited part way through the job, it is restarted for the next job
+            returncode = self._process.wait()
+            logger.warning("GDL interpreter exited with code {} during a job.".format(returncode))
+            self.close()
+            return returncode, stdout, stderr
+
+        if self._reset_command is not None:
+            #   the output of the reset is discarded.  The reset gets the job's timeout too, so an interpreter stuck in
+            #   the reset is replaced rather than holding up the next job.
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                self._read_until(self._send([self._reset_command]), deadline)
+            except subprocess.TimeoutExpired:
+                logger.warning("GDL interpreter didn't reset within {} seconds, it is restarted.".format(timeout))
+                self.close(kill=True)
+            except BrokenPipeError:
+                self.close()
+        return 0, stdout, stderr
+
+    def close(self, kill: bool = False) -> None:
+        """
+        Stops the interpreter process
+        :param kill: kill the process rather than asking the interpreter to exit
+        """
+        if self._process is None:
+            return
+        if self.is_running:
+            try:
+                if kill:
+                    self._process.kill()
+                else:
+                    self._process.stdin.write("exit\n")
+                    self._process.stdin.flush()
+                self._process.wait(timeout=5)
+            except (BrokenPipeError, subprocess.TimeoutExpired):
+                self._process.kill()
+                self._process.wait()
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        self._process = None
+
+
+class GdlPool:
+    """
+    A pool of long-lived GDL interpreters.  Interpreters are started when first needed, up to the pool size, and jobs
+    run concurrently from several threads are sent to different interpreters.
+    """
+
+    def __init__(self,
+                 size: int = None,
+                 executable: Union[str, List[str]] = GDL_EXECUTABLE,
+                 env: dict = None,
+                 reset_command: Optional[str] = RESET_COMMAND):
+        """
+        :param size: the maximum number of interpreters (default: the number of processors)
+        :param executable: the interpreter executable, or a list of the executable and its arguments
+        :param env: the environment of the interpreter processes (default: GDL_ENV)
+        :param reset_command: sent after each job to clear the interpreter state, or None to keep state between jobs
+        """
+        self.size = size or os.cpu_count() or 1
+        self._interpreter_args = (executable, env, reset_command)
+        self._interpreters = []
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _acquire(self) -> GdlInterpreter:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._interpreters) < self.size:
+                interpreter = GdlInterpreter(*self._interpreter_args)
+                self._interpreters.append(interpreter)
+                return interpreter
+        return self._idle.get()
+
+    def run(self, gdl_commands: List[str], working_dir: str = None, timeout: float = None,
+            on_stdout: LineCallback = None, on_stderr: LineCallback = None) -> (int, str, str):
+        """
+        Runs a job in an idle interpreter, waiting for one to become free if all are busy.  See 'GdlInterpreter.run'.
+        :param gdl_commands: a list of GDL statements.  See 'GdlInterpreter.run' for "exit" statements.
+        :param working_dir: the directory where files called in GDL statements exist (default: the current directory)
+        :param timeout: optional, seconds to wait for the job to complete
+        :param on_stdout: optional, called with each line the job writes to stdout as it is written
+        :param on_stderr: optional, called with each line the job writes to stderr as it is written
+        :return: a tuple containing the exit code, stdout, and stderr of the job
+        """
+        interpreter = self._acquire()
+        try:
+            return interpreter.run(gdl_commands, working_dir, timeout, on_stdout, on_stderr)
+        finally:
+            self._idle.put(interpreter)
+
+    def close(self) -> None:
+        """
+        Stops all of the interpreters in the pool
+        """
+        with self._lock:
+            for interpreter in self._interpreters:
+                interpreter.close()
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> GdlPool:
+    """
+    Returns the pool used by 'exec_gdl', creating it on first use
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = GdlPool()
+            atexit.register(_default_pool.close)
+        return _default_pool
@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import logging
+import threading
+import functools
+from collections import namedtuple
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger("instrumentation")
+
+#   configures a sink when the module is imported: 'memory', 'jsonl:<path>' or 'prometheus:<path>'
+METRICS_ENVIRONMENT_VARIABLE = "PIXUTILS_METRICS"
+
+#   the prefix of metric names written in the Prometheus text format
+PROMETHEUS_PREFIX = "pixutils"
+
+#   the minimum number of seconds between rewrites of a Prometheus text file
+PROMETHEUS_FLUSH_INTERVAL = 10.0
+
+#   a single measurement; 'kind' is 'timer' (value in seconds) or 'counter'
+Metric = namedtuple("Metric", ["name", "kind", "value", "labels", "time", "pid"])
+
+#   the sink metrics are sent to, or None when instrumentation is disabled
+_sink = None
+
+
+def _labels_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MemorySink:
+    """
+    Keeps metrics in memory, i.e. for tests or for reporting at the end of a run
+    """
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self._lock = threading.Lock()
+
+    def write(self, metric: Metric) -> None:
+        with self._lock:
+            self.metrics.append(metric)
+
+    def summary(self) -> Dict[Tuple[str, str, tuple], Tuple[int, float]]:
+        """
+        Totals the metrics by name, kind and labels
+        :return: a dictionary of (count, total) keyed by (name, kind, labels), where labels is a sorted tuple of
+        (label, value) pairs
+        """
+        totals = {}
+        with self._lock:
+            for m in self.metrics:
+                key = (m.name, m.kind, _labels_key(m.labels))
+                count, total = totals.get(key, (0, 0.0))
+                totals[key] = (count + 1, total + m.value)
+        return totals
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink:
+    """
+    Appends each metric to a file as a line of JSON.  Lines are written whole in append mode, so several processes
+    can share one file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, metric: Metric) -> None:
+        with self._lock:
+            self._file.write(json.dumps(metric._asdict()) + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusSink:
+    """
+    Totals metrics and writes them as a Prometheus text file, i.e. for the node exporter's textfile collector.  Timers
+    are written as '<prefix>_<name>_seconds_total' and '<prefix>_<name>_calls_total', counters as
+    '<prefix>_<name>_total'.  The file is rewritten atomically at most every PROMETHEUS_FLUSH_INTERVAL seconds and when
+    the process exits; totals are per process.
+    """
+
+    def __init__(self, path: str, prefix: str = PROMETHEUS_PREFIX, flush_interval: float = PROMETHEUS_FLUSH_INTERVAL):
+        self.path = path
+        self.prefix = prefix
+        self.flush_interval = flush_interval
+        self._totals = {}
+        self._lock = threading.Lock()
+        #   held while the file is rewritten, so writes from several threads don't interleave
+        self._flush_lock = threading.Lock()
+        self._flushed = 0.0
+        atexit.register(self.flush)
+
+    def write(self, metric: Metric) -> None:
+        with self._lock:
+            labels = _labels_key(metric.labels)
+            if metric.kind == "timer":
+                for name, value in [(metric.name + "_seconds_total", metric.value), (metric.name + "_calls_total", 1)]:
+                    self._totals[(name, labels)] = self._totals.get((name, labels), 0) + value
+            else:
+                name = metric.name + "_total"
+                self._totals[(name, labels)] = self._totals.get((name, labels), 0) + metric.value
+            due = time.monotonic() - self._flushed >= self.flush_interval
+            if due:
+                #   only the thread that finds the flush due rewrites the file
+                self._flushed = time.monotonic()
+        if due:
+            self.flush()
+
+    def text(self) -> str:
+        """
+        Returns the totals in the Prometheus text exposition format
+        """
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._totals.items()):
+                metric_name = "{}_{}".format(self.prefix, name)
+                if metric_name not in typed:
+                    lines.append("# TYPE {} counter".format(metric_name))
+                    typed.add(metric_name)
+                label_text = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"'))
+                                      for k, v in labels)
+                lines.append("{}{} {}".format(metric_name, "{" + label_text + "}" if label_text else "", value))
+        return "\n".join(lines) + "\n"
+
+    def flush(self) -> None:
+        """
+        Rewrites the text file with the current totals
+        """
+        with self._flush_lock:
+            text = self.text()
+            temporary_path = "{}.{}.tmp".format(self.path, uuid.uuid4().hex)
+            try:
+                with open(temporary_path, "w") as f:
+                    f.write(text)
+                os.replace(temporary_path, self.path)
+            finally:
+                if os.path.exists(temporary_path):
+                    os.remove(temporary_path)
+            self._flushed = time.monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        atexit.unregister(self.flush)
+
+
+def sink_from_spec(spec: str):
+    """
+    Creates a sink from a specification: 'memory', 'jsonl:<path>' or 'prometheus:<path>'
+    :raises ValueError: for an unknown specification
+    """
+    kind, _, path = spec.partition(":")
+    if kind == "memory":
+        return MemorySink()
+    if kind == "jsonl" and path:
+        return JsonLinesSink(path)
+    if kind == "prometheus" and path:
+        return PrometheusSink(path)
+    raise ValueError("Unknown metrics sink '{}', expected 'memory', 'jsonl:<path>' or 'prometheus:<path>'.".format(
+        spec))
+
+
+def set_sink(sink):
+    """
+    Sends metrics to a sink, or disables instrumentation
+    :param sink: a MemorySink, JsonLinesSink, PrometheusSink (or any object with 'write(metric)' and 'close()'), or
+    None to disable instrumentation
+    :return: the previous sink, which is not closed
+    """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def get_sink():
+    """
+    Returns the current sink, or None when instrumentation is disabled
+    """
+    return _sink
+
+
+def enabled() -> bool:
+    """
+    Returns True if metrics are being recorded
+    """
+    return _sink is not None
+
+
+def _write(sink, metric: Metric) -> None:
+    """
+    Sends a metric to a sink.  Errors from the sink, i.e. an unwritable metrics file, are logged rather than raised,
+    so instrumentation doesn't change the behaviour of the code it measures.
+    """
+    try:
+        sink.write(metric)
+    except Exception as e:
+        logger.warning("Couldn't record metric '{}'. {}".format(metric.name, e))
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """
+    Adds to a counter, i.e. of bytes transferred or rows read.  Does nothing when instrumentation is disabled.
+    :param name: the counter name, i.e. 'bytes'
+    :param value: the amount to add
+    :param labels: labels identifying the phase or source, i.e. phase="transfer", source="ceres"
+    """
+    sink = _sink
+    if sink is not None:
+        _write(sink, Metric(name, "counter", value, labels, time.time(), os.getpid()))
+
+
+class _Timer:
+    """
+    Times a phase, as a context manager or a decorator.  See 'timed'.
+    """
+    __slots__ = ("name", "labels", "_start")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self._start = None
+
+    def __enter__(self) -> "_Timer":
+        if _sink is not None:
+            self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        sink, start = _sink, self._start
+        if sink is not None and start is not None:
+            labels = self.labels if exc_type is None else dict(self.labels, error=exc_type.__name__)
+            _write(sink, Metric(self.name, "timer", time.perf_counter() - start, labels, time.time(), os.getpid()))
+        self._start = None
+
+    def __call__(self, function: Callable) -> Callable:
+        name, labels = self.name, self.labels
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _sink is None:
+                return function(*args, **kwargs)
+            with _Timer(name, labels):
+                return function(*args, **kwargs)
+        return wrapper
+
+
+def timed(name: str, **labels) -> _Timer:
+    """
+    Times a phase, i.e. a connection, transfer or block read, as a context manager or a function decorator.  When
+    instrumentation is disabled the clock isn't read and nothing is recorded.  A phase that raises is recorded with an
+    'error' label holding the exception type.
+
+        with timed("transfer", source="ceres"):
+            ...
+
+        @timed("raster", operation="clamp")
+        def clamp_raster(...):
+
+    :param name: the phase name
+    :param labels: labels identifying the phase, i.e. source="ceres"
+    """
+    return _Timer(name, labels)
+
+
+if os.environ.get(METRICS_ENVIRONMENT_VARIABLE):
+    set_sink(sink_from_spec(os.environ[METRICS_ENVIRONMENT_VARIABLE]))
@@ -0,0 +1,332 @@
+import os
+import json
+import time
+import hashlib
+import logging
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from typing import Dict, Iterable, List
+from pixutils.instrumentation import count
+
+logger = logging.getLogger("job_scheduler")
+
+#   the slots available to a scheduler by default: concurrent downloads, and concurrent processing
+DEFAULT_RESOURCES = {"network": 4, "cpu": os.cpu_count() or 1}
+
+#   the slots a task takes by default
+DEFAULT_TASK_RESOURCES = {"cpu": 1}
+
+#   task statuses: the task ran and succeeded, was skipped as its outputs were up to date, ran and failed, or wasn't run
+#   as a task it depends on failed
+DONE = "done"
+UP_TO_DATE = "up_to_date"
+FAILED = "failed"
+BLOCKED = "blocked"
+
+Task = namedtuple("Task", ["name", "function", "args", "kwargs", "inputs", "outputs", "resources", "depends", "cost"],
+                  defaults=((), None, (), (), None, (), 1))
+Task.__doc__ = """
+A step in a processing chain: a call of 'function(*args, **kwargs)' that reads the 'inputs' files and writes the
+'outputs' files.  A task depends on the tasks that write its inputs, and on any named in 'depends'.
+:param name: a unique name for the task
+:param function: the function to call.  It must be importable (i.e. defined at module level), as tasks run in worker
+processes.
+:param args: positional arguments to the function
+:param kwargs: keyword arguments to the function
+:param inputs: paths of the files the task reads
+:param outputs: paths of the files the task writes.  A task with outputs is skipped when they are newer than its inputs.
+:param resources: the slots the task takes while running keyed by resource, i.e. {"network": 1}
+(default: DEFAULT_TASK_RESOURCES)
+:param depends: names of tasks that must succeed before this one runs, in addition to those writing its inputs
+:param cost: the relative expected run time, used to start the tasks on the longest chain first
+"""
+
+TaskResult = namedtuple("TaskResult", ["name", "status", "value", "error", "seconds"])
+TaskResult.__doc__ = """
+The outcome of a task
+:param name: the name of the task
+:param status: one of DONE, UP_TO_DATE, FAILED or BLOCKED
+:param value: the value returned by the task's function, or None if it didn't run
+:param error: the exception raised by a failed task, or None
+:param seconds: the time the task ran for
+"""
+
+
+def is_up_to_date(task: Task) -> bool:
+    """
+    Returns true if a task has outputs, they all exist, and none is older than the newest of its inputs
+    """
+    if not task.outputs:
+        return False
+    try:
+        oldest_output = min(os.stat(p).st_mtime_ns for p in task.outputs)
+    except FileNotFoundError:
+        return False
+    newest_input = max((os.stat(p).st_mtime_ns for p in task.inputs), default=None)
+    return newest_input is None or newest_input <= oldest_output
+
+
+def task_fingerprint(task: Task) -> str:
+    """
+    Returns a digest of a task's definition and the current state of its inputs, so a journalled task is run again if
+    either changes
+    :raises FileNotFoundError: if an input doesn't exist
+    """
+    inputs = [(p, os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in task.inputs]
+    definition = ("{}.{}".format(task.function.__module__, task.function.__qualname__), task.args,
+                  sorted((task.kwargs or {}).items()), list(task.outputs), inputs)
+    return hashlib.sha1(repr(definition).encode("utf-8")).hexdigest()
+
+
+def _read_journal(state_path: str) -> Dict[str, dict]:
+    if state_path is None or not os.path.isfile(state_path):
+        return {}
+    with open(state_path, "r") as f:
+        return json.load(f)["tasks"]
+
+
+def _write_journal(state_path: str, journal: Dict[str, dict]) -> None:
+    #   written aside and moved in to place, so a run that is killed leaves the previous journal intact
+    temporary_path = state_path + ".tmp"
+    with open(temporary_path, "w") as f:
+        json.dump({"tasks": journal}, f, indent=1)
+    os.replace(temporary_path, state_path)
+
+
+def _run_in_process(task: Task) -> Future:
+    future = Future()
+    try:
+        future.set_result(task.function(*task.args, **(task.kwargs or {})))
+    except KeyboardInterrupt:
+        raise
+    except BaseException as e:
+        #   i.e. SystemExit from a function that calls sys.exit() on failure, reported as in a worker process
+        future.set_exception(e)
+    return future
+
+
+class TaskScheduler:
+    """
+    Runs a graph of tasks, in parallel where they are independent.  Tasks are started as soon as the tasks they depend
+    on have succeeded and the slots they need are free, those heading the longest remaining chain first, so the run
+    takes about as long as its longest chain of dependent tasks.
+
+    Tasks whose outputs are up to date are skipped.  With a 'state_path', each task that succeeds is recorded in a
+    journal along with a fingerprint of its definition and inputs, so a run that failed can be resumed: only the tasks
+    that failed, didn't run, or have changed are run again.  Tasks with no journal entry, i.e. from a run before the
+    journal was kept, are skipped if their outputs are up to date.
+
+    If a worker process dies, i.e. is killed for running out of memory, no more tasks can be started: the tasks that
+    were running and those ready to start fail, and the tasks that depend on them are blocked.
+    """
+
+    def __init__(self, tasks: Iterable[Task], resources: Dict[str, int] = None, max_workers: int = None,
+                 state_path: str = None):
+        """
+        :param tasks: the tasks to run
+        :param resources: the number of slots of each resource (default: DEFAULT_RESOURCES)
+        :param max_workers: the number of worker processes, defaults to the total number of slots.  1 runs each task in
+        this process, one at a time.
+        :param state_path: optional, path to a JSON journal of succeeded tasks
+        :raises ValueError: if task names or outputs aren't unique, a task depends on an unknown task or needs more of a
+        resource than is available, or the tasks depend on each other in a cycle
+        """
+        self.resources = dict(DEFAULT_RESOURCES if resources is None else resources)
+        self.max_workers = max_workers if max_workers is not None else max(1, sum(self.resources.values()))
+        self.state_path = state_path
+        self.tasks = OrderedDict()
+        for task in tasks:
+            if task.name in self.tasks:
+                raise ValueError("Task '{}' is defined more than once.".format(task.name))
+            self.tasks[task.name] = task
+
+        producers = {}
+        for task in self.tasks.values():
+            for path in task.outputs:
+                path = os.path.abspath(path)
+                if path in producers:
+                    raise ValueError("'{}' is an output of both '{}' and '{}'.".format(path, producers[path],
+                                                                                       task.name))
+                producers[path] = task.name
+
+        self.depends = OrderedDict()
+        for task in self.tasks.values():
+            unknown = [d for d in task.depends if d not in self.tasks]
+            if unknown:
+                raise ValueError("Task '{}' depends on unknown tasks: {}.".format(task.name, ", ".join(unknown)))
+            for resource, slots in self._needs(task).items():
+                if slots > self.resources.get(resource, 0):
+                    raise ValueError("Task '{}' needs {} '{}' slots, only {} are available.".format(
+                        task.name, slots, resource, self.resources.get(resource, 0)))
+            writers = {producers[p] for p in map(os.path.abspath, task.inputs) if p in producers}
+            self.depends[task.name] = (set(task.depends) | writers) - {task.name}
+
+        self.dependents = {name: [] for name in self.tasks}
+        for name, depends in self.depends.items():
+            for d in depends:
+                self.dependents[d].append(name)
+
+        #   the length of the longest chain of tasks starting at each task, used to start tasks on it first
+        self.rank = {}
+        for name in reversed(self._topological_order()):
+            self.rank[name] = self.tasks[name].cost + max((self.rank[d] for d in self.dependents[name]), default=0)
+
+    def _needs(self, task: Task) -> Dict[str, int]:
+        return dict(DEFAULT_TASK_RESOURCES if task.resources is None else task.resources)
+
+    def _topological_order(self) -> List[str]:
+        waiting = {name: len(depends) for name, depends in self.depends.items()}
+        order = [name for name, n in waiting.items() if n == 0]
+        for name in order:
+            for d in self.dependents[name]:
+                waiting[d] -= 1
+                if waiting[d] == 0:
+                    order.append(d)
+        if len(order) != len(self.tasks):
+            cycle = sorted(name for name, n in waiting.items() if n > 0)
+            raise ValueError("Tasks depend on each other in a cycle: {}.".format(", ".join(cycle)))
+        return order
+
+    def critical_path(self) -> List[str]:
+        """
+        Returns the names of the tasks on the longest chain of dependent tasks, weighted by cost
+        """
+        path = []
+        candidates = [name for name, depends in self.depends.items() if not depends]
+        while candidates:
+            name = max(candidates, key=lambda n: self.rank[n])
+            path.append(name)
+            candidates = self.dependents[name]
+        return path
+
+    def _is_current(self, task: Task, journal: Dict[str, dict]) -> bool:
+        if self.state_path is None:
+            return is_up_to_date(task)
+        entry = journal.get(task.name)
+        if entry is None:
+            return is_up_to_date(task)
+        if entry["fingerprint"] != task_fingerprint(task):
+            return False
+        return not task.outputs or is_up_to_date(task)
+
+    def run(self, force: bool = False) -> Dict[str, TaskResult]:
+        """
+        Runs the tasks.  A task that fails doesn't stop the run; the tasks that depend on it aren't run, and all others
+        are.
+        :param force: run every task, even if its outputs are up to date
+        :return: an ordered dictionary of TaskResults keyed by task name, in the order the tasks were given
+        """
+        journal = _read_journal(self.state_path)
+        results = {}
+        waiting = {name: set(depends) for name, depends in self.depends.items()}
+        ready = [name for name, depends in waiting.items() if not depends]
+        free = dict(self.resources)
+        running = {}
+        #   the error from a worker process pool that can't run any more tasks
+        broken = None
+
+        def finish(name, status, value=None, error=None, seconds=0.0):
+            results[name] = TaskResult(name, status, value, error, seconds)
+            count("tasks", 1, status=status)
+            if status in (DONE, UP_TO_DATE):
+                for d in self.dependents[name]:
+                    if d in waiting:
+                        waiting[d].discard(name)
+                        if not waiting[d]:
+                            ready.append(d)
+                return
+            #   tasks downstream of a failure are blocked
+            blocked = list(self.dependents[name])
+            while blocked:
+                d = blocked.pop()
+                if waiting.pop(d, None) is not None:
+                    results[d] = TaskResult(d, BLOCKED, None, None, 0.0)
+                    logger.warning("Task '{}' wasn't run as '{}' failed.".format(d, name))
+                    blocked.extend(self.dependents[d])
+
+        executor = ProcessPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        try:
+            while ready or running:
+                if broken is not None:
+                    while ready:
+                        name = ready.pop(0)
+                        del waiting[name]
+                        logger.error("Task '{}' wasn't started as the worker processes have stopped.".format(name))
+                        finish(name, FAILED, error=broken)
+
+                #   start the ready tasks heading the longest chains, while there are slots for them
+                ready.sort(key=lambda n: self.rank[n], reverse=True)
+                for name in list(ready):
+                    task = self.tasks[name]
+                    needs = self._needs(task)
+                    if any(free.get(r, 0) < n for r, n in needs.items()):
+                        continue
+                    ready.remove(name)
+                    del waiting[name]
+                    try:
+                        if not force and self._is_current(task, journal):
+                            logger.info("Task '{}' is up to date.".format(name))
+                            finish(name, UP_TO_DATE)
+                            continue
+                        fingerprint = task_fingerprint(task)
+                    except FileNotFoundError as e:
+                        logger.error("Task '{}' failed. {}".format(name, e))
+                        finish(name, FAILED, error=e)
+                        continue
+
+                    logger.info("Starting task '{}'.".format(name))
+                    for r, n in needs.items():
+                        free[r] -= n
+                    start = time.perf_counter()
+                    try:
+                        future = executor.submit(task.function, *task.args, **(task.kwargs or {})) \
+                            if executor is not None else _run_in_process(task)
+                    except BrokenProcessPool as e:
+                        for r, n in needs.items():
+                            free[r] += n
+                        logger.error("Task '{}' failed. {}".format(name, e))
+                        broken = e
+                        finish(name, FAILED, error=e)
+                        break
+                    running[future] = (name, needs, fingerprint, start)
+
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, needs, fingerprint, start = running.pop(future)
+                    for r, n in needs.items():
+                        free[r] += n
+                    seconds = time.perf_counter() - start
+                    error = future.exception()
+                    if error is None:
+                        logger.info("Task '{}' finished in {:.1f}s.".format(name, seconds))
+                        journal[name] = {"fingerprint": fingerprint,
+                                         "completed": datetime.now().isoformat(timespec="seconds")}
+                        finish(name, DONE, value=future.result(), seconds=seconds)
+                    else:
+                        logger.error("Task '{}' failed. {}".format(name, error))
+                        if isinstance(error, BrokenProcessPool):
+                            broken = error
+                        #   recorded so its outputs aren't taken as up to date when the run is resumed
+                        journal[name] = {"fingerprint": None,
+                                         "failed": datetime.now().isoformat(timespec="seconds")}
+                        finish(name, FAILED, error=error, seconds=seconds)
+                    if self.state_path is not None:
+                        _write_journal(self.state_path, journal)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        return OrderedDict((name, results[name]) for name in self.tasks)
+
+
+def run_tasks(tasks: Iterable[Task], resources: Dict[str, int] = None, max_workers: int = None,
+              state_path: str = None, force: bool = False) -> Dict[str, TaskResult]:
+    """
+    Runs a graph of tasks with a TaskScheduler
+    :return: an ordered dictionary of TaskResults keyed by task name
+    """
+    return TaskScheduler(tasks, resources, max_workers, state_path).run(force)
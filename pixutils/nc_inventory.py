@@ -0,0 +1,270 @@
+import os
+import json
+import sqlite3
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+import netCDF4
+from pixutils.nc_utils import coordinate_axis, ncdump
+
+logger = logging.getLogger("nc_inventory")
+
+NETCDF_EXTENSIONS = (".nc", ".nc4", ".netcdf")
+
+
+def find_netcdf_files(folder: str) -> List[str]:
+    """
+    Walks a folder for netCDF files
+    :param folder: the folder to be searched
+    :return: a sorted list of paths to files with a netCDF extension
+    """
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(NETCDF_EXTENSIONS))
+    return sorted(paths)
+
+
+def _to_json(value):
+    """
+    Converts netCDF attribute values (NumPy scalars and arrays, bytes) to JSON serialisable values
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+
+def _attributes(item) -> dict:
+    return {a: _to_json(item.getncattr(a)) for a in item.ncattrs()}
+
+
+def read_netcdf_header(path: str) -> dict:
+    """
+    Reads the dimensions, variables and attributes of a netCDF file, plus the bounds of its 1-D coordinate variables.
+    Only coordinate variables are read; data variables are never loaded.
+    :param path: path to the netCDF file
+    :return: a JSON serialisable dictionary with 'attributes', 'dimensions', 'variables', 'coordinates' and 'time'
+    entries.  'time' holds the ISO formatted 'start' and 'end' of the time coordinate, or is None.
+    """
+    with netCDF4.Dataset(path, "r") as nc_fid:
+        nc_fid.set_auto_mask(False)
+        nc_attrs, nc_dims, nc_vars = ncdump(nc_fid)
+
+        record = {
+            "attributes": {a: _to_json(nc_fid.getncattr(a)) for a in nc_attrs},
+            "dimensions": {d: {"size": len(nc_fid.dimensions[d]), "unlimited": nc_fid.dimensions[d].isunlimited()}
+                           for d in nc_dims},
+            "variables": {},
+            "coordinates": {},
+            "time": None,
+        }
+
+        for name in nc_vars:
+            variable = nc_fid.variables[name]
+            attributes = _attributes(variable)
+            record["variables"][name] = {"dimensions": list(variable.dimensions),
+                                         "shape": list(variable.shape),
+                                         "dtype": str(variable.dtype),
+                                         "attributes": attributes}
+
+            #   coordinate variables are 1-D and share their dimension's name
+            if variable.dimensions != (name,) or variable.size == 0 or variable.dtype.kind not in "iuf":
+                continue
+            values = variable[:]
+            coordinate = {"axis": coordinate_axis(name, attributes), "size": int(variable.size),
+                          "min": _to_json(values.min()), "max": _to_json(values.max())}
+            record["coordinates"][name] = coordinate
+
+            if coordinate["axis"] == "time" and record["time"] is None and " since " in str(attributes.get("units")):
+                dates = netCDF4.num2date([coordinate["min"], coordinate["max"]], attributes["units"],
+                                         attributes.get("calendar", "standard"))
+                record["time"] = {"variable": name, "start": dates[0].isoformat(), "end": dates[1].isoformat()}
+
+    return record
+
+
+def _read_or_log(path: str) -> Optional[Tuple[str, int, int, dict]]:
+    try:
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size, read_netcdf_header(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Unable to read the header of '{}'. {}".format(path, e))
+        return None
+
+
+def normalise_longitude(lon: float) -> float:
+    """
+    Wraps a longitude in to [-180, 180)
+    """
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def _longitude_intervals(west: float, east: float) -> List[Tuple[float, float]]:
+    """
+    Splits a longitude range, given in either the -180 to 180 or 0 to 360 convention, in to intervals within
+    [-180, 180].  A range whose west edge is east of its east edge once normalised crosses the antimeridian, and is
+    split in two.
+    """
+    if east - west >= 360.0:
+        return [(-180.0, 180.0)]
+    west, east = normalise_longitude(west), normalise_longitude(east)
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def _longitudes_overlap(lon_min: Optional[float], lon_max: Optional[float], west: float, east: float) -> bool:
+    """
+    Returns true if a file's longitude bounds overlap a query's longitude range, whatever the convention of either
+    """
+    if lon_min is None or lon_max is None:
+        return False
+    return any(a <= d and c <= b for a, b in _longitude_intervals(lon_min, lon_max)
+               for c, d in _longitude_intervals(west, east))
+
+
+def _bounds(record: dict, axis: str) -> Tuple[Optional[float], Optional[float]]:
+    coordinates = [c for c in record["coordinates"].values() if c["axis"] == axis]
+    if not coordinates:
+        return None, None
+    return coordinates[0]["min"], coordinates[0]["max"]
+
+
+class NcInventory:
+    """
+    A SQLite index of netCDF file headers - dimensions, variables, attributes, coordinate bounds and time ranges - so
+    questions like "which files hold 't2m' for June 2020" are answered without reopening the files.  Entries are
+    refreshed when a file's modification time or size changes.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: path to the index database, it is created if it doesn't already exist
+        """
+        self.db_path = db_path
+        self._connection = sqlite3.connect(db_path)
+        #   longitudes are stored as read, and compared in a common convention when queried
+        self._connection.create_function("longitudes_overlap", 4, _longitudes_overlap, deterministic=True)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS files ("
+                                     "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                                     "time_start TEXT, time_end TEXT, lat_min REAL, lat_max REAL, "
+                                     "lon_min REAL, lon_max REAL, header TEXT NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS variables ("
+                                     "path TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (name, path))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS files_time ON files (time_start, time_end)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the index database
+        """
+        self._connection.close()
+
+    def update(self, paths: Iterable[str], max_workers: int = None, chunksize: int = 16) -> int:
+        """
+        Reads the headers of the given files across a process pool and indexes them.  Files already indexed with the
+        same modification time and size are skipped, and indexed files that no longer exist are removed.
+        :param paths: paths to netCDF files, i.e. from 'find_netcdf_files'
+        :param max_workers: the number of worker processes, defaults to the number of processors.  If 1, headers are
+        read in this process.
+        :param chunksize: the number of files sent to a worker at a time
+        :return: the number of files (re)indexed
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        indexed = {p: (m, s) for p, m, s in self._connection.execute("SELECT path, mtime_ns, size FROM files")}
+        missing = [p for p in indexed if not os.path.exists(p)]
+
+        stale = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                #   i.e. removed since the folder was listed
+                logger.warning("Skipping '{}'. {}".format(path, e))
+                continue
+            if indexed.get(path) != (stat.st_mtime_ns, stat.st_size):
+                stale.append(path)
+
+        if max_workers == 1 or len(stale) <= 1:
+            results = map(_read_or_log, stale)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_read_or_log, stale, chunksize=chunksize))
+        results = [r for r in results if r is not None]
+
+        with self._connection:
+            for path in missing + [r[0] for r in results]:
+                self._connection.execute("DELETE FROM files WHERE path = ?", (path,))
+                self._connection.execute("DELETE FROM variables WHERE path = ?", (path,))
+
+            for path, mtime_ns, size, record in results:
+                time_range = record["time"] or {}
+                self._connection.execute("INSERT INTO files (path, mtime_ns, size, time_start, time_end, lat_min, "
+                                         "lat_max, lon_min, lon_max, header) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                         (path, mtime_ns, size, time_range.get("start"), time_range.get("end"),
+                                          *_bounds(record, "lat"), *_bounds(record, "lon"), json.dumps(record)))
+                self._connection.executemany("INSERT INTO variables (path, name) VALUES (?, ?)",
+                                             ((path, v) for v in record["variables"]))
+
+        if stale or missing:
+            logger.info("Indexed {} of {} changed files, removed {} missing files.".format(len(results), len(stale),
+                                                                                           len(missing)))
+        return len(results)
+
+    def scan(self, folder: str, **kwargs) -> int:
+        """
+        Indexes the netCDF files in a folder.  Keyword arguments are passed to 'update'.
+        :return: the number of files (re)indexed
+        """
+        return self.update(find_netcdf_files(folder), **kwargs)
+
+    def header(self, path: str) -> Optional[dict]:
+        """
+        Returns the indexed header of a file, see 'read_netcdf_header', or None if the file isn't indexed
+        """
+        row = self._connection.execute("SELECT header FROM files WHERE path = ?", (os.path.abspath(path),)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def query(self,
+              variable: str = None,
+              start: str = None,
+              end: str = None,
+              bbox: Tuple[float, float, float, float] = None) -> List[str]:
+        """
+        Finds indexed files
+        :param variable: optional, a variable the files must hold
+        :param start: optional, an ISO formatted date; files must have a time range ending on or after it
+        :param end: optional, an ISO formatted date; files must have a time range starting before it
+        :param bbox: optional, (min_lon, min_lat, max_lon, max_lat); files must have coordinate bounds overlapping it.
+        Longitudes may be given from -180 to 180 or 0 to 360 whatever the convention of the files, and a box with
+        min_lon greater than max_lon crosses the antimeridian.
+        :return: a sorted list of paths
+        """
+        clauses, params = [], []
+        if variable is not None:
+            clauses.append("path IN (SELECT path FROM variables WHERE name = ?)")
+            params.append(variable)
+        if start is not None:
+            clauses.append("time_end >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("time_start < ?")
+            params.append(end)
+        if bbox is not None:
+            clauses.append("longitudes_overlap(lon_min, lon_max, ?, ?) AND lat_max >= ? AND lat_min <= ?")
+            params.extend([bbox[0], bbox[2], bbox[1], bbox[3]])
+
+        query = "SELECT path FROM files"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return [p for p, in self._connection.execute(query + " ORDER BY path", params)]
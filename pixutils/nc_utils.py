@@ -5,6 +5,24 @@
 # Examples: 
 #    nc_attrs, nc_dims, nc_vars = nc_utils.ncdump(nc_fid)
 #    nc_utils.plotxyz(lons,lats,zvals,title,cbarlabel,pngfile)
+#    nc_utils.plotxyz(lons,lats,zvals,title,cbarlabel,pngfile,mode='binned',statistic='max')
+#    subset = nc_utils.read_subset(nc_fid, 't2m', bbox=(-10, 49, 2, 61), time_window=('2020-06-01', '2020-07-01'))
+from collections import namedtuple
+from datetime import datetime
+from textwrap import wrap
+import numpy as np
+import netCDF4
+import matplotlib.pyplot as plt
+
+#   Basemap is optional, without it maps are drawn on plain longitude/latitude axes
+try:
+    from mpl_toolkits.basemap import Basemap
+except ImportError:
+    Basemap = None
+
+#   names used to recognise latitude and longitude coordinates, along with CF attributes
+LATITUDE_NAMES = ("lat", "latitude")
+LONGITUDE_NAMES = ("lon", "longitude")
 
 
 # Turn verb to True to print in verbose mode
@@ -71,37 +89,367 @@ def ncdump(nc_fid, verb=False):
                 print_ncattr(var)
     return nc_attrs, nc_dims, nc_vars
 
-def plotxyz(lons,lats,zvals,title,cbarlabel,pngfile):
-      # Plot of parameter
-      fig = plt.figure()
-      fig.subplots_adjust(left=0., right=1., bottom=0., top=0.9)
+#   the statistics 'bin_xyz' can aggregate points with
+BIN_STATISTICS = ("mean", "max", "min", "count")
+
+
+def bin_xyz(x, y, z, shape, extent, statistic="mean"):
+    """
+    Aggregates scattered points in to a regular image grid, so they can be drawn with 'imshow' at a cost that depends
+    on the number of pixels rather than the number of points
+
+    Parameters
+    ----------
+    x, y, z : numpy.ndarray
+        the point coordinates and values.  Points with non-finite or masked values, or outside the extent, are ignored.
+    shape : tuple
+        the (rows, columns) of the grid
+    extent : tuple
+        (x_min, x_max, y_min, y_max) covered by the grid
+    statistic : str
+        how the values in each cell are aggregated: 'mean', 'max', 'min' or 'count'
+
+    Returns
+    -------
+    grid : numpy.ndarray
+        a float array of the given shape with row 0 at y_min.  Cells without points are NaN, or 0 for 'count'.
+    """
+    if statistic not in BIN_STATISTICS:
+        raise ValueError("Unknown statistic '{}', expected one of {}.".format(statistic, BIN_STATISTICS))
+    rows, columns = shape
+    x_min, x_max, y_min, y_max = extent
+
+    x, y = np.ravel(x), np.ravel(y)
+    z = np.ma.filled(np.ma.masked_invalid(np.ravel(z)).astype(float), np.nan)
+    column = np.floor((x - x_min) * (columns / (x_max - x_min))).astype(np.int64)
+    row = np.floor((y - y_min) * (rows / (y_max - y_min))).astype(np.int64)
+
+    #   points on the upper edges of the extent fall in the last cell
+    column[x == x_max] = columns - 1
+    row[y == y_max] = rows - 1
+    keep = (column >= 0) & (column < columns) & (row >= 0) & (row < rows) & np.isfinite(z)
+    cell = row[keep] * columns + column[keep]
+    z = z[keep]
+
+    size = rows * columns
+    count = np.bincount(cell, minlength=size)
+    if statistic == "count":
+        return count.reshape(shape).astype(float)
+
+    grid = np.full(size, np.nan)
+    if statistic == "mean":
+        occupied = count > 0
+        grid[occupied] = np.bincount(cell, weights=z, minlength=size)[occupied] / count[occupied]
+    elif cell.size:
+        #   sort points by cell so each cell's values are contiguous and can be reduced in one pass
+        order = np.argsort(cell, kind="stable")
+        cell, z = cell[order], z[order]
+        starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+        reduce = np.maximum if statistic == "max" else np.minimum
+        grid[cell[starts]] = reduce.reduceat(z, starts)
+    return grid.reshape(shape)
+
+
+def plotxyz(lons,lats,zvals,title,cbarlabel,pngfile,mode="scatter",statistic="mean",shape=(720, 1440)):
+    """
+    Plots values at longitude/latitude points on a map and saves it as a PNG
+
+    Parameters
+    ----------
+    lons, lats, zvals : numpy.ndarray
+        the point longitudes (0-360), latitudes and values
+    title : str
+        the plot title
+    cbarlabel : str
+        the colour bar label
+    pngfile : str
+        the output file
+    mode : str
+        'scatter' draws every point.  'binned' aggregates the points in to a grid of 'shape' pixels with 'bin_xyz' and
+        draws the grid as an image, which is much faster and smaller for millions of points.
+    statistic : str
+        how points in the same pixel are aggregated in 'binned' mode: 'mean', 'max', 'min' or 'count'
+    shape : tuple
+        the (rows, columns) of the grid in 'binned' mode
+    """
+    if mode not in ("scatter", "binned"):
+        raise ValueError("Unknown mode '{}', expected 'scatter' or 'binned'.".format(mode))
+
+    # Plot of parameter
+    fig = plt.figure()
+    fig.subplots_adjust(left=0., right=1., bottom=0., top=0.9)
+
+    if Basemap is not None:
+        # Setup the map. http://matplotlib.org/basemap/users/mapsetup.html
+        m = Basemap(projection='moll', llcrnrlat=-90, urcrnrlat=90,\
+                    llcrnrlon=0, urcrnrlon=360, resolution='c', lon_0=0)
+        m.drawcoastlines()
+        m.drawcountries(color='coral')
+        m.drawrivers(color='aqua')
+        m.drawmapboundary()
+
+        # Transforms lat/lon into plotting coordinates for projection
+        x, y = m(lons, lats)
+        extent = (m.xmin, m.xmax, m.ymin, m.ymax)
+        show = m.imshow
+    else:
+        x, y = lons, lats
+        extent = (0, 360, -90, 90)
+        show = lambda grid, **kwargs: plt.imshow(grid, extent=extent, aspect='auto', **kwargs)
+
+    # Plot with differernt colour palettes
+    if mode == "binned":
+        grid = bin_xyz(x, y, zvals, shape, extent, statistic)
+        show(np.ma.masked_invalid(grid), origin='lower', cmap=plt.cm.jet, interpolation='nearest')
+    else:
+        plt.scatter(x, y, c = zvals, cmap=plt.cm.jet)
+
+    # Add title
+    plt.title("\n".join(wrap(title,50)),multialignment='center')
+
+    # warp around the colourbar title if it's long
+    cbar = plt.colorbar(orientation='horizontal', shrink=0.75, pad=0.04)
+    cbar.set_label("\n".join(wrap(cbarlabel,50)),multialignment='center', labelpad=0)
+
+    # Save plot to PNG file
+    plt.savefig(pngfile, bbox_inches='tight')
+    print("Saved plot to: ",pngfile)
+
+    # Clear out the plot
+    plt.close(fig)
+
+
+def coordinate_axis(name, attributes):
+    """
+    Recognises latitude, longitude and time coordinates by name or by CF attributes
+
+    Parameters
+    ----------
+    name : str
+        the name of the coordinate variable
+    attributes : dict
+        the attributes of the coordinate variable
+
+    Returns
+    -------
+    axis : str
+        'lat', 'lon' or 'time', or None if the coordinate isn't recognised
+    """
+    units = str(attributes.get("units", "")).lower()
+    standard_name = str(attributes.get("standard_name", "")).lower()
+    if name.lower() in LATITUDE_NAMES or standard_name == "latitude" or units.startswith("degrees_n"):
+        return "lat"
+    if name.lower() in LONGITUDE_NAMES or standard_name == "longitude" or units.startswith("degrees_e"):
+        return "lon"
+    if " since " in units or standard_name == "time" or str(attributes.get("axis", "")).upper() == "T":
+        return "time"
+    return None
+
+
+Subset = namedtuple("Subset", ["data", "dimensions", "lats", "lons", "times"])
+Subset.__doc__ = """
+A part of a netCDF variable read by 'read_subset'
+:param data: the values of the variable in the subset
+:param dimensions: the names of the variable's dimensions
+:param lats: the latitudes of the subset, or None if the variable has no latitude dimension
+:param lons: the longitudes of the subset, expressed from the requested minimum longitude so they increase across a
+wrapped window, or None if the variable has no longitude dimension
+:param times: the times of the subset as datetimes, or None if the variable has no time dimension
+"""
+
+
+def coordinate_slice(values, lo, hi):
+    """
+    Finds the indices of the coordinate values within [lo, hi] with 'searchsorted'
+
+    Parameters
+    ----------
+    values : numpy.ndarray
+        monotonic 1-D coordinate values, ascending or descending (i.e. latitudes running north to south)
+    lo, hi : float
+        the inclusive range of values
+
+    Returns
+    -------
+    index : slice
+        a slice with explicit start and stop
+    """
+    values = np.asarray(values)
+    if values.size > 1 and values[0] > values[-1]:
+        reverse = values[::-1]
+        n = values.size
+        return slice(n - int(np.searchsorted(reverse, hi, "right")), n - int(np.searchsorted(reverse, lo, "left")))
+    return slice(int(np.searchsorted(values, lo, "left")), int(np.searchsorted(values, hi, "right")))
+
+
+def longitude_slices(lons, lon_min, lon_max):
+    """
+    Finds the indices of the longitudes within [lon_min, lon_max], allowing for windows that cross the edge of the
+    grid, i.e. -10 to 10 on a 0-360 grid, or 170 to -170 (across the antimeridian) on a -180-180 grid
+
+    Parameters
+    ----------
+    lons : numpy.ndarray
+        ascending longitudes, on a 0-360 or -180-180 grid
+    lon_min, lon_max : float
+        the window, from west to east.  lon_max may be less than lon_min for a window across the antimeridian.
+
+    Returns
+    -------
+    indices : list
+        one slice, or two slices whose values are read one after the other when the window wraps
+    """
+    lons = np.asarray(lons)
+    span = lon_max - lon_min
+    if span < 0:
+        span += 360
+    if span >= 360 or (lon_max - lon_min) >= 360:
+        return [slice(0, lons.size)]
+
+    range_start = 0.0 if lons.max() > 180 else -180.0
+    range_end = range_start + 360
+    lo = (lon_min - range_start) % 360 + range_start
+    hi = lo + span
+    if hi <= range_end:
+        return [coordinate_slice(lons, lo, hi)]
+    return [coordinate_slice(lons, lo, range_end), coordinate_slice(lons, range_start, hi - 360)]
+
+
+def time_slice(time_var, start, end):
+    """
+    Finds the indices of the times within [start, end)
+
+    Parameters
+    ----------
+    time_var : netCDF4.Variable
+        an ascending time coordinate with CF 'units' (and optionally 'calendar')
+    start, end : datetime or str
+        the window, as datetimes or ISO formatted strings.  Either may be None for an open ended window.
+
+    Returns
+    -------
+    index : slice
+        a slice with explicit start and stop
+    """
+    calendar = getattr(time_var, "calendar", "standard")
+    values = time_var[:]
+    limits = []
+    for limit, default in [(start, 0), (end, values.size)]:
+        if limit is None:
+            limits.append(default)
+        else:
+            limit = datetime.fromisoformat(limit) if isinstance(limit, str) else limit
+            limits.append(int(np.searchsorted(values, netCDF4.date2num(limit, time_var.units, calendar), "left")))
+    return slice(limits[0], limits[1])
+
+
+def _read_blocks(variable, index, axis):
+    """
+    Reads a hyperslab in blocks aligned to the variable's chunks along one axis, so each chunk is decompressed once and
+    memory use is the size of the subset plus one block
+    """
+    chunking = variable.chunking()
+    start, stop = index[axis].start, index[axis].stop
+    if chunking == "contiguous" or stop - start <= chunking[axis]:
+        return variable[tuple(index)]
+
+    #   size the chunk cache to hold every chunk a block touches
+    chunk_bytes = int(np.prod(chunking)) * variable.dtype.itemsize
+    chunks_per_block = 1
+    for i, (s, c) in enumerate(zip(index, chunking)):
+        if i != axis:
+            chunks_per_block *= (s.stop - 1) // c - s.start // c + 1 if s.stop > s.start else 1
+    cache_size, cache_elements, preemption = variable.get_var_chunk_cache()
+    if chunk_bytes * chunks_per_block > cache_size:
+        variable.set_var_chunk_cache(size=chunk_bytes * chunks_per_block,
+                                     nelems=max(cache_elements, chunks_per_block * 2 + 1),
+                                     preemption=preemption)
+
+    step = chunking[axis]
+    edges = [start] + list(range((start // step + 1) * step, stop, step)) + [stop]
+    output = None
+    block_index = list(index)
+    for b0, b1 in zip(edges[:-1], edges[1:]):
+        block_index[axis] = slice(b0, b1)
+        block = variable[tuple(block_index)]
+        if output is None:
+            shape = list(block.shape)
+            shape[axis] = stop - start
+            output = np.ma.masked_all(shape, block.dtype) if np.ma.isMaskedArray(block) \
+                else np.empty(shape, block.dtype)
+        target = [slice(None)] * block.ndim
+        target[axis] = slice(b0 - start, b1 - start)
+        output[tuple(target)] = block
+    return output
+
 
-      # Setup the map. http://matplotlib.org/basemap/users/mapsetup.html
-      m = Basemap(projection='moll', llcrnrlat=-90, urcrnrlat=90,\
-                  llcrnrlon=0, urcrnrlon=360, resolution='c', lon_0=0)
-      m.drawcoastlines()
-      m.drawcountries(color='coral')
-      m.drawrivers(color='aqua')
-      m.drawmapboundary()
+def read_subset(nc_fid, varname, bbox=None, time_window=None):
+    """
+    Reads the part of a variable within a bounding box and time window, without reading the rest of the variable.
+    The box and window are mapped to index ranges on the coordinate variables, and only that hyperslab is read, in
+    blocks aligned to the variable's chunks along its time (or first) axis.
 
-      # Transforms lat/lon into plotting coordinates for projection
-      x, y = m(lons, lats)
+    Parameters
+    ----------
+    nc_fid : netCDF4.Dataset
+        an open netCDF4 dataset
+    varname : str
+        the name of the variable to read
+    bbox : tuple
+        optional, (min_lon, min_lat, max_lon, max_lat) inclusive.  Longitudes may be given as -180-180 or 0-360
+        whatever the grid, and min_lon may be greater than max_lon for a box across the antimeridian.
+    time_window : tuple
+        optional, (start, end) as datetimes or ISO formatted strings, start inclusive and end exclusive
 
-      # Plot with differernt colour palettes
-      alpha = 1
-      plt.scatter(x, y, c = zvals, cmap=plt.cm.jet)
+    Returns
+    -------
+    subset : Subset
+        the data, dimension names, and the coordinates of the subset
+    """
+    variable = nc_fid.variables[varname]
+    index = [slice(0, n) for n in variable.shape]
+    lon_parts, lon_axis = None, None
+    coordinates = {}
 
-      # Add title
-      plt.title("\n".join(wrap(title,50)),multialignment='center')
+    for i, dim in enumerate(variable.dimensions):
+        if dim not in nc_fid.variables or nc_fid.variables[dim].dimensions != (dim,):
+            continue
+        coordinate = nc_fid.variables[dim]
+        axis = coordinate_axis(dim, {a: coordinate.getncattr(a) for a in coordinate.ncattrs()})
+        if axis is None:
+            continue
+        values = coordinate[:]
+        if axis == "lat" and bbox is not None:
+            index[i] = coordinate_slice(values, min(bbox[1], bbox[3]), max(bbox[1], bbox[3]))
+        elif axis == "lon" and bbox is not None:
+            lon_parts, lon_axis = longitude_slices(values, bbox[0], bbox[2]), i
+        elif axis == "time" and time_window is not None:
+            index[i] = time_slice(coordinate, time_window[0], time_window[1])
+        coordinates[axis] = (i, coordinate, values)
 
-      # warp around the colourbar title if it's long
-      cbar = plt.colorbar(orientation='horizontal', shrink=0.75, pad=0.04)
-      cbar.set_label("\n".join(wrap(cbarlabel,50)),multialignment='center', labelpad=0)
+    block_axis = coordinates["time"][0] if "time" in coordinates else 0
+    if lon_parts is None:
+        data = _read_blocks(variable, index, block_axis) if variable.ndim else variable[...]
+    else:
+        parts = []
+        for part in lon_parts:
+            index[lon_axis] = part
+            parts.append(_read_blocks(variable, index, block_axis))
+        data = parts[0] if len(parts) == 1 else np.ma.concatenate(parts, axis=lon_axis)
 
-      # Save plot to PNG file
-      plt.plot()
-      plt.savefig(pngfile, bbox_inches='tight')
-      print("Saved plot to: ",pngfile)
+    lats = lons = times = None
+    if "lat" in coordinates:
+        i, _, values = coordinates["lat"]
+        lats = np.asarray(values[index[i]])
+    if "lon" in coordinates:
+        i, _, values = coordinates["lon"]
+        parts = lon_parts if lon_parts is not None else [index[i]]
+        lons = np.concatenate([np.asarray(values[p]) for p in parts])
+        if bbox is not None and lon_parts != [slice(0, values.size)]:
+            lons = bbox[0] + np.mod(lons - bbox[0], 360)
+    if "time" in coordinates:
+        i, coordinate, values = coordinates["time"]
+        if hasattr(coordinate, "units"):
+            times = netCDF4.num2date(values[index[i]], coordinate.units, getattr(coordinate, "calendar", "standard"))
 
-      # Clear out the plot
-      plt.close()
+    return Subset(data, variable.dimensions, lats, lons, times)
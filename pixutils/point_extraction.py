@@ -0,0 +1,337 @@
+import logging
+from typing import Hashable, List, Sequence, Tuple
+import numpy as np
+import pandas as pd
+import netCDF4
+from scipy.spatial import cKDTree
+from pixutils.nc_utils import coordinate_axis
+from pixutils.instrumentation import timed, count
+
+#   GDAL is only needed to extract points from GeoTIFF stacks
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+logger = logging.getLogger("point_extraction")
+
+EXTRACTION_METHODS = ("nearest", "bilinear")
+
+#   the approximate size of each block read from a netCDF variable; whole time chunks are read up to this size
+BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def _axis_weights(coordinates: np.ndarray, values: np.ndarray, method: str, periodic: bool) -> Tuple[np.ndarray,
+                                                                                                    np.ndarray]:
+    """
+    Finds the indices and weights of the grid cells around values along one axis of a regular grid
+    :return: a tuple of (indices, weights), each (N, 1) for 'nearest' or (N, 2) for 'bilinear'.  Values outside the
+    grid have zero weights.
+    """
+    n = coordinates.size
+    descending = n > 1 and coordinates[0] > coordinates[-1]
+    ascending = coordinates[::-1] if descending else coordinates
+    step = np.abs(np.diff(ascending)).mean() if n > 1 else 1.0
+
+    if periodic:
+        #   repeat the first cell a turn later, so values between the last and first cells have two neighbours
+        ascending = np.append(ascending, ascending[0] + 360.0)
+        inside = np.ones(values.shape, bool)
+    else:
+        inside = (values >= ascending[0] - step / 2) & (values <= ascending[-1] + step / 2)
+
+    if ascending.size == 1:
+        upper = lower = np.zeros(values.shape, int)
+        fraction = np.zeros(values.shape)
+    else:
+        upper = np.clip(np.searchsorted(ascending, values, "right"), 1, ascending.size - 1)
+        lower = upper - 1
+        fraction = np.clip((values - ascending[lower]) / (ascending[upper] - ascending[lower]), 0, 1)
+
+    if method == "nearest":
+        indices = np.where(fraction > 0.5, upper, lower)[:, None]
+        weights = inside.astype(float)[:, None]
+    else:
+        indices = np.stack([lower, upper], axis=1)
+        weights = np.stack([1 - fraction, fraction], axis=1) * inside[:, None]
+
+    indices = indices % n
+    if descending:
+        indices = n - 1 - indices
+    return indices, weights
+
+
+def _combine(gathered: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Takes the weighted sum of the cell values gathered for each point, as (..., points, cells).  Masked and NaN cells
+    are left out of the weighting, and points without any valid cells are NaN.
+    """
+    gathered = np.ma.filled(np.ma.masked_invalid(np.ma.asarray(gathered, dtype=float)), np.nan)
+    weights = np.where(np.isnan(gathered), 0, weights)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.nansum(gathered * weights, axis=-1) / weights.sum(axis=-1)
+
+
+class GridIndex:
+    """
+    A reusable index from points to the grid cells, and weights, their values are taken from.  Regular grids (1-D
+    latitude and longitude co-ordinates) are indexed with 'searchsorted' and support nearest neighbour and bilinear
+    extraction.  Curvilinear grids (2-D co-ordinates, i.e. swaths) are indexed with a KD-tree on the unit sphere and
+    support nearest neighbour extraction.  Build the index once, then extract any number of time steps.
+    """
+
+    def __init__(self, grid_lats: np.ndarray, grid_lons: np.ndarray, lats: Sequence[float], lons: Sequence[float],
+                 method: str = "nearest"):
+        """
+        :param grid_lats: the grid latitudes, 1-D for a regular grid or 2-D (rows, columns) for a curvilinear grid
+        :param grid_lons: the grid longitudes, 1-D or 2-D, either 0 to 360 or -180 to 180
+        :param lats: the point latitudes
+        :param lons: the point longitudes, either 0 to 360 or -180 to 180 whatever the grid uses
+        :param method: 'nearest' or 'bilinear'
+        :raises ValueError: for an unknown method, or bilinear extraction on a curvilinear grid
+        """
+        if method not in EXTRACTION_METHODS:
+            raise ValueError("Unknown method '{}', expected one of {}.".format(method, EXTRACTION_METHODS))
+        grid_lats, grid_lons = np.asarray(grid_lats, float), np.asarray(grid_lons, float)
+        lats, lons = np.atleast_1d(np.asarray(lats, float)), np.atleast_1d(np.asarray(lons, float))
+        if lats.shape != lons.shape:
+            raise ValueError("Expected as many latitudes as longitudes, got {} and {}.".format(lats.size, lons.size))
+        self.method = method
+
+        if grid_lats.ndim == 1:
+            self.shape = (grid_lats.size, grid_lons.size)
+            #   express the points in the grid's longitude convention
+            lons = np.mod(lons, 360) if np.nanmax(grid_lons) > 180 else np.mod(lons + 180, 360) - 180
+            step = np.abs(np.diff(grid_lons)).mean() if grid_lons.size > 1 else 0
+            periodic = grid_lons.size > 1 and np.ptp(grid_lons) + step >= 360 - 1e-6
+
+            rows, row_weights = _axis_weights(grid_lats, lats, method, False)
+            columns, column_weights = _axis_weights(grid_lons, lons, method, periodic)
+            k = rows.shape[1]
+            self.rows = np.repeat(rows, k, axis=1)
+            self.columns = np.tile(columns, (1, k))
+            self.weights = (row_weights[:, :, None] * column_weights[:, None, :]).reshape(lats.size, k * k)
+        else:
+            if method != "nearest":
+                raise ValueError("Only nearest neighbour extraction is supported on curvilinear grids.")
+            self.shape = grid_lats.shape
+            tree = cKDTree(self._unit_vectors(grid_lats.ravel(), grid_lons.ravel()))
+            _, flat = tree.query(self._unit_vectors(lats, lons))
+            rows, columns = np.unravel_index(flat, self.shape)
+            self.rows, self.columns = rows[:, None], columns[:, None]
+            self.weights = np.ones((lats.size, 1))
+
+        #   the window of the grid holding every cell the points use
+        self.window = (slice(int(self.rows.min()), int(self.rows.max()) + 1),
+                       slice(int(self.columns.min()), int(self.columns.max()) + 1))
+
+    @staticmethod
+    def _unit_vectors(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        lat, lon = np.radians(lats), np.radians(lons)
+        return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=1)
+
+    def __len__(self) -> int:
+        return self.rows.shape[0]
+
+    def extract(self, data: np.ndarray) -> np.ndarray:
+        """
+        Gathers the point values from gridded data held in memory
+        :param data: an array of (..., rows, columns), i.e. (time, rows, columns)
+        :return: an array of (..., points).  Masked and NaN cells are left out of the weighting, and points without
+        any valid cells are NaN.
+        """
+        return _combine(np.ma.asarray(data)[..., self.rows, self.columns], self.weights)
+
+    def blocks(self, chunk_shape: Tuple[int, int] = None) -> List[Tuple[slice, slice, np.ndarray]]:
+        """
+        Groups the cells the points use by the chunk of the grid they fall in, so each needed chunk is read once
+        however many points use it
+        :param chunk_shape: the (rows, columns) of a chunk, or None to read the window around all the points at once
+        :return: a list of (rows, columns, cells) with the window of the grid to read and the indices of the cells,
+        in to the flattened (points, cells) arrays of 'rows' and 'columns', that are taken from it
+        """
+        if chunk_shape is None:
+            return [(self.window[0], self.window[1], np.arange(self.rows.size))]
+
+        row_chunks, column_chunks = self.rows.ravel() // chunk_shape[0], self.columns.ravel() // chunk_shape[1]
+        keys = row_chunks * (self.shape[1] // chunk_shape[1] + 1) + column_chunks
+        order = np.argsort(keys, kind="stable")
+        _, starts = np.unique(keys[order], return_index=True)
+
+        blocks = []
+        for cells in np.split(order, starts[1:]):
+            r, c = int(row_chunks[cells[0]]) * chunk_shape[0], int(column_chunks[cells[0]]) * chunk_shape[1]
+            blocks.append((slice(r, min(r + chunk_shape[0], self.shape[0])),
+                           slice(c, min(c + chunk_shape[1], self.shape[1])), cells))
+        return blocks
+
+
+def _aligned_blocks(length: int, step: int) -> List[slice]:
+    """
+    Splits [0, length) in to slices aligned to multiples of 'step'
+    """
+    return [slice(start, min(start + step, length)) for start in range(0, length, max(1, step))]
+
+
+def _find_coordinate(nc_fid, variable, axis: str):
+    """
+    Finds the dimension of a variable with the co-ordinate variable for an axis ('lat', 'lon' or 'time')
+    :return: a tuple of (dimension name, co-ordinate variable), or (None, None)
+    """
+    for dim in variable.dimensions:
+        if dim in nc_fid.variables:
+            coordinate = nc_fid.variables[dim]
+            if coordinate_axis(dim, {a: coordinate.getncattr(a) for a in coordinate.ncattrs()}) == axis:
+                return dim, coordinate
+    return None, None
+
+
+def extract_netcdf(nc_fid,
+                   varname: str,
+                   lats: Sequence[float],
+                   lons: Sequence[float],
+                   method: str = "nearest",
+                   index: GridIndex = None) -> Tuple[np.ndarray, np.ndarray, GridIndex]:
+    """
+    Extracts time series at points from a (time, latitude, longitude) netCDF variable, i.e. from
+    'era_download.download_era5_reanalysis_data'.  Only the chunks holding the points' cells are read, each once per
+    block of time chunks, so the cost is about one pass over the needed chunks however many points there are.
+    Contiguous variables are read as the window around the points, a block of time steps at a time.
+    :param nc_fid: an open netCDF4.Dataset
+    :param varname: the name of the variable
+    :param lats: the point latitudes
+    :param lons: the point longitudes
+    :param method: 'nearest' or 'bilinear'
+    :param index: optional, a GridIndex of the same grid and points from an earlier call, so it isn't rebuilt
+    :return: a tuple of the values as a (time, points) array, the times (as datetime64, or step numbers without a time
+    co-ordinate) and the GridIndex
+    :raises ValueError: if the variable isn't on a latitude/longitude grid
+    """
+    variable = nc_fid.variables[varname]
+    lat_dim, lat_var = _find_coordinate(nc_fid, variable, "lat")
+    lon_dim, lon_var = _find_coordinate(nc_fid, variable, "lon")
+    time_dim, time_var = _find_coordinate(nc_fid, variable, "time")
+    expected = 2 if time_dim is None else 3
+    if lat_var is None or lon_var is None or variable.ndim != expected:
+        raise ValueError("Expected a (time, latitude, longitude) variable, '{}' has dimensions {}.".format(
+            varname, variable.dimensions))
+    if index is None:
+        index = GridIndex(lat_var[:], lon_var[:], lats, lons, method)
+
+    #   read blocks as (time, latitude, longitude) whatever order the dimensions are stored in
+    order = [variable.dimensions.index(d) for d in (time_dim, lat_dim, lon_dim) if d is not None]
+    chunking = variable.chunking()
+    if chunking == "contiguous":
+        chunks = dict(zip(variable.dimensions, variable.shape))
+        blocks = index.blocks()
+    else:
+        chunks = dict(zip(variable.dimensions, chunking))
+        blocks = index.blocks((chunks[lat_dim], chunks[lon_dim]))
+
+    steps = 1 if time_dim is None else len(nc_fid.dimensions[time_dim])
+    values = np.full((steps, len(index)), np.nan)
+    if time_dim is None:
+        time_blocks = [slice(0, 1)]
+    else:
+        #   read as many whole time chunks at once as fit in BLOCK_BYTES
+        chunk_bytes = chunks[time_dim] * max((r.stop - r.start) * (c.stop - c.start) for r, c, _ in blocks) * 8
+        time_blocks = _aligned_blocks(steps, chunks[time_dim] * max(1, BLOCK_BYTES // chunk_bytes))
+    logger.debug("Extracting {} points of '{}' from {} chunks in {} blocks of time steps.".format(
+        len(index), varname, len(blocks), len(time_blocks)))
+
+    cell_rows, cell_columns = index.rows.ravel(), index.columns.ravel()
+    for time_block in time_blocks:
+        gathered = np.full((time_block.stop - time_block.start, cell_rows.size), np.nan)
+        for rows, columns, cells in blocks:
+            selection = {lat_dim: rows, lon_dim: columns, time_dim: time_block}
+            with timed("read", operation="extract_netcdf"):
+                data = np.ma.transpose(variable[tuple(selection[d] for d in variable.dimensions)], order)
+            if time_dim is None:
+                data = data[None]
+            gathered[:, cells] = np.ma.filled(np.ma.asarray(data, dtype=float)[:, cell_rows[cells] - rows.start,
+                                                                               cell_columns[cells] - columns.start],
+                                              np.nan)
+        with timed("compute", operation="extract_netcdf"):
+            values[time_block] = _combine(gathered.reshape(gathered.shape[0], len(index), -1), index.weights)
+        count("rows", gathered.shape[0], phase="read", operation="extract_netcdf")
+
+    if time_var is not None and hasattr(time_var, "units"):
+        times = netCDF4.num2date(time_var[:], time_var.units, getattr(time_var, "calendar", "standard"),
+                                 only_use_cftime_datetimes=False, only_use_python_datetimes=True)
+        times = np.array(times, dtype="datetime64[ns]")
+    else:
+        times = np.arange(steps)
+    return values, times, index
+
+
+def geotiff_coordinates(dataset) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the cell centre latitudes and longitudes of a north-up GDAL dataset on a geographic grid
+    :param dataset: an open GDAL dataset
+    :return: a tuple of (latitudes, longitudes), 1-D arrays
+    :raises ValueError: if the dataset is rotated
+    """
+    x0, dx, rx, y0, ry, dy = dataset.GetGeoTransform()
+    if rx != 0 or ry != 0:
+        raise ValueError("Rotated rasters are not supported.")
+    return y0 + (np.arange(dataset.RasterYSize) + 0.5) * dy, x0 + (np.arange(dataset.RasterXSize) + 0.5) * dx
+
+
+def extract_geotiffs(paths: Sequence[str],
+                     lats: Sequence[float],
+                     lons: Sequence[float],
+                     method: str = "nearest",
+                     band: int = 1,
+                     index: GridIndex = None) -> Tuple[np.ndarray, GridIndex]:
+    """
+    Extracts time series at points from a stack of GeoTIFFs on the same grid, one file per time step, i.e. from
+    'ceres_download.download_ceres_netflux'.  Only the window around the points is read from each file.
+    :param paths: the GeoTIFFs, in time order
+    :param lats: the point latitudes
+    :param lons: the point longitudes
+    :param method: 'nearest' or 'bilinear'
+    :param band: the (1-based) band to read
+    :param index: optional, a GridIndex of the same grid and points from an earlier call, so it isn't rebuilt
+    :return: a tuple of the values as a (files, points) array, and the GridIndex.  No data values are NaN.
+    :raises RuntimeError: if GDAL isn't available or can't open a file
+    """
+    if gdal is None:
+        raise RuntimeError("GDAL is required to extract points from GeoTIFFs.")
+    values = None
+    for i, path in enumerate(paths):
+        dataset = gdal.Open(path)
+        if dataset is None:
+            raise RuntimeError("GDAL is unable to open '{}'.".format(path))
+        if index is None:
+            grid_lats, grid_lons = geotiff_coordinates(dataset)
+            index = GridIndex(grid_lats, grid_lons, lats, lons, method)
+        if values is None:
+            values = np.full((len(paths), len(index)), np.nan)
+
+        rows, columns = index.window
+        raster_band = dataset.GetRasterBand(band)
+        data = raster_band.ReadAsArray(columns.start, rows.start, columns.stop - columns.start,
+                                       rows.stop - rows.start).astype(float)
+        nodata = raster_band.GetNoDataValue()
+        if nodata is not None:
+            data[data == nodata] = np.nan
+        values[i] = _combine(data[index.rows - rows.start, index.columns - columns.start], index.weights)
+        dataset = None
+    return values, index
+
+
+def to_dataframe(values: np.ndarray, times: Sequence, point_ids: Sequence[Hashable] = None,
+                 name: str = "value") -> pd.DataFrame:
+    """
+    Converts extracted values to a tidy DataFrame with one row per time step and point
+    :param values: a (time, points) array, as returned by 'extract_netcdf' or 'extract_geotiffs'
+    :param times: the time of each step
+    :param point_ids: optional, an identifier for each point (default: the position of the point)
+    :param name: the name of the value column
+    :return: a DataFrame with 'time', 'point' and 'name' columns
+    """
+    steps, count = values.shape
+    point_ids = np.arange(count) if point_ids is None else np.asarray(point_ids)
+    return pd.DataFrame({"time": np.repeat(np.asarray(times), count),
+                         "point": np.tile(point_ids, steps),
+                         name: values.ravel()})
@@ -0,0 +1,191 @@
+import os
+import re
+import sqlite3
+import logging
+from typing import Iterable, List, Optional
+from pixutils.sentinel_filename import parse_sentinel_filename, SentinelProductInfo
+
+logger = logging.getLogger("product_catalog")
+
+#   suffix of the catalog database file, created alongside the catalogued folder unless a path is given.  It must not
+#   be inside the folder: SQLite creates and deletes a journal file on every commit, which changes the folder's
+#   modification time, so the folder would be re-listed on every scan.
+DEFAULT_CATALOG_SUFFIX = ".pixutils_catalog.sqlite"
+
+#   only entries that look like Sentinel products are catalogued, i.e. "S1A_...", "S2B_..."
+_PRODUCT_NAME_REGEX = re.compile(r"^S\d[A-D_]_", re.IGNORECASE)
+
+#   used for products that 'parse_sentinel_filename' doesn't recognise (i.e. Sentinel-2 titles) - the first date/time
+#   token in the name is the sensing start
+_START_DATE_TIME_REGEX = re.compile(r"_((\d{8})T(\d{6}))")
+
+#   suffix that sentinelsat gives to partial downloads
+_INCOMPLETE_SUFFIX = ".incomplete"
+
+#   the fields extracted by 'parse_sentinel_filename' are stored as columns, 'filename' is stored as 'name'
+_FIELD_COLUMNS = [f for f in SentinelProductInfo._fields if f != "filename"]
+
+#   SQLite limits the number of host parameters in a single statement
+_MAX_QUERY_PARAMETERS = 500
+
+
+def default_catalog_path(folder: str) -> str:
+    """
+    Returns the default path of the catalog database for a folder, '.<folder name>.pixutils_catalog.sqlite' in its
+    parent folder
+    """
+    folder = os.path.abspath(folder)
+    return os.path.join(os.path.dirname(folder), "." + os.path.basename(folder) + DEFAULT_CATALOG_SUFFIX)
+
+
+def _product_fields(name: str) -> Optional[dict]:
+    """
+    Extracts the catalogued fields from the name of a product file or folder
+    :param name: the file or folder name, without a path
+    :return: a dictionary of column values, or None if the name doesn't look like a Sentinel product
+    """
+    if not _PRODUCT_NAME_REGEX.match(name) or name.endswith(_INCOMPLETE_SUFFIX):
+        return None
+
+    title, _, extension = name.partition(".")
+    try:
+        info = parse_sentinel_filename(name)
+        fields = {f: getattr(info, f) for f in _FIELD_COLUMNS}
+    except ValueError:
+        match = _START_DATE_TIME_REGEX.search(title)
+        if match is None:
+            return None
+        fields = dict.fromkeys(_FIELD_COLUMNS)
+        fields.update(mission_identifier=title[0:3],
+                      start_date_time=match.group(1),
+                      start_date=match.group(2),
+                      start_time=match.group(3),
+                      product_format_extension=extension)
+
+    fields.update(name=name, title=title, extension=extension)
+    return fields
+
+
+class ProductCatalog:
+    """
+    A persistent SQLite index of the Sentinel products held in one or more local folders.  Folders are only re-listed
+    when their modification time changes, so repeated scans of a large, unchanged archive are cheap, and lookups by
+    title or sensing date use indexes rather than globbing the folder.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: path to the catalog database, it is created if it doesn't already exist.  It shouldn't be
+        inside a catalogued folder; see 'default_catalog_path'.
+        """
+        self.db_path = os.path.abspath(db_path)
+        self._warned_folders = set()
+        self._connection = sqlite3.connect(db_path)
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the catalog database
+        """
+        self._connection.close()
+
+    def _create_tables(self) -> None:
+        columns = ", ".join("{} TEXT".format(c) for c in _FIELD_COLUMNS)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS directories ("
+                                     "folder TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS products ("
+                                     "folder TEXT NOT NULL, name TEXT NOT NULL, title TEXT NOT NULL, "
+                                     "extension TEXT, {}, PRIMARY KEY (folder, name))".format(columns))
+            self._connection.execute("CREATE INDEX IF NOT EXISTS products_title ON products (folder, title)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS products_start_date ON products (folder, start_date)")
+
+    def scan(self, folder: str, force: bool = False) -> int:
+        """
+        Brings the catalog entries for a folder up to date.  The folder is only listed if its modification time has
+        changed since the last scan; only added and removed entries are then written to the database.  Sub-folders
+        (i.e. extracted .SAFE products) are catalogued as entries but not descended into.
+        :param folder: the folder to be catalogued
+        :param force: list the folder even if its modification time is unchanged
+        :return: the number of entries added or removed
+        """
+        folder = os.path.abspath(folder)
+        if os.path.dirname(self.db_path) == folder and folder not in self._warned_folders:
+            self._warned_folders.add(folder)
+            logger.warning("The catalog '{}' is inside the folder it catalogues, so the folder will be re-listed on "
+                           "every scan.".format(self.db_path))
+        mtime_ns = os.stat(folder).st_mtime_ns
+
+        row = self._connection.execute("SELECT mtime_ns FROM directories WHERE folder = ?", (folder,)).fetchone()
+        if not force and row is not None and row[0] == mtime_ns:
+            return 0
+
+        with os.scandir(folder) as entries:
+            on_disk = {entry.name for entry in entries}
+        known = {r[0] for r in self._connection.execute("SELECT name FROM products WHERE folder = ?", (folder,))}
+
+        added = [fields for fields in (_product_fields(name) for name in on_disk - known) if fields is not None]
+        removed = [(folder, name) for name in known - on_disk]
+
+        columns = ["folder", "name", "title", "extension"] + _FIELD_COLUMNS
+        insert = "INSERT INTO products ({}) VALUES ({})".format(", ".join(columns), ", ".join("?" * len(columns)))
+        with self._connection:
+            self._connection.executemany(insert, ([folder] + [fields[c] for c in columns[1:]] for fields in added))
+            self._connection.executemany("DELETE FROM products WHERE folder = ? AND name = ?", removed)
+            self._connection.execute("INSERT OR REPLACE INTO directories (folder, mtime_ns) VALUES (?, ?)",
+                                     (folder, mtime_ns))
+
+        logger.debug("Scanned '{}': {} added, {} removed.".format(folder, len(added), len(removed)))
+        return len(added) + len(removed)
+
+    def contains(self, folder: str, title: str) -> bool:
+        """
+        Checks whether a product is held in a folder, regardless of its extension (i.e. ".zip" or ".SAFE")
+        :param folder: a previously scanned folder
+        :param title: the product title, i.e. the filename without its extension
+        :return: True if the product is catalogued in the folder, otherwise False
+        """
+        row = self._connection.execute("SELECT 1 FROM products WHERE folder = ? AND title = ? LIMIT 1",
+                                       (os.path.abspath(folder), title)).fetchone()
+        return row is not None
+
+    def find(self,
+             folder: str,
+             title: str = None,
+             start_dates: Iterable[str] = None,
+             suffix: str = None) -> List[str]:
+        """
+        Looks up the products held in a folder
+        :param folder: a previously scanned folder
+        :param title: optional, only return products with this title
+        :param start_dates: optional, only return products with a sensing start date (YYYYMMDD) in this collection
+        :param suffix: optional, only return products whose filename ends with this suffix, i.e. ".zip"
+        :return: a sorted list of full paths to the matching products
+        """
+        folder = os.path.abspath(folder)
+        query = "SELECT name FROM products WHERE folder = ?"
+        params = [folder]
+        if title is not None:
+            query += " AND title = ?"
+            params.append(title)
+
+        if start_dates is None:
+            names = [r[0] for r in self._connection.execute(query, params)]
+        else:
+            start_dates = sorted(set(start_dates))
+            names = []
+            for i in range(0, len(start_dates), _MAX_QUERY_PARAMETERS):
+                chunk = start_dates[i:i + _MAX_QUERY_PARAMETERS]
+                chunk_query = query + " AND start_date IN ({})".format(", ".join("?" * len(chunk)))
+                names.extend(r[0] for r in self._connection.execute(chunk_query, params + chunk))
+
+        if suffix is not None:
+            names = [n for n in names if n.lower().endswith(suffix.lower())]
+
+        return sorted(os.path.join(folder, n) for n in names)
@@ -0,0 +1,160 @@
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import List, Tuple, Union
+
+logger = logging.getLogger("query_cache")
+
+#   how long cached search results are trusted before the remote hub is asked again
+DEFAULT_TTL = timedelta(days=1)
+
+_DATE_FORMAT = "%Y%m%d"
+
+
+def _to_date(d: Union[str, date, datetime]) -> date:
+    """
+    Converts a date passed as a string (YYYYMMDD or YYYY-MM-DD) or a datetime module object to a date
+    """
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    return datetime.strptime(d.replace("-", "")[0:8], _DATE_FORMAT).date()
+
+
+def query_key(footprint: str, platformname: str, producttype: str, cloudcoverpercentage: Tuple[float, float]) -> str:
+    """
+    Builds the normalised key that identifies a search, excluding its date window.  Searches that only differ in
+    their date windows share a key, so their cached results can be merged.
+    :param footprint: the search area as a WKT string
+    :param platformname: the platform searched for, i.e. 'Sentinel-2'
+    :param producttype: the product type searched for, i.e. 'S2MSI1C'
+    :param cloudcoverpercentage: the (min, max) cloud cover range searched for
+    :return: a string key
+    """
+    wkt = " ".join(footprint.upper().replace("(", " ( ").replace(")", " ) ").replace(",", " , ").split())
+    footprint_hash = hashlib.sha1(wkt.encode("utf-8")).hexdigest()
+    return "{}|{}|{}|{:g}-{:g}".format(footprint_hash, platformname, producttype,
+                                       float(cloudcoverpercentage[0]), float(cloudcoverpercentage[1]))
+
+
+def _uncovered(start: date, end: date, covered: List[Tuple[date, date]]) -> List[Tuple[date, date]]:
+    """
+    Returns the parts of the half-open window [start, end) that aren't covered by any of the given windows
+    """
+    gaps = []
+    cursor = start
+    for s, e in sorted(covered):
+        if s > cursor:
+            gaps.append((cursor, min(s, end)))
+        cursor = max(cursor, e)
+        if cursor >= end:
+            break
+    if cursor < end:
+        gaps.append((cursor, end))
+    return [(s, e) for s, e in gaps if s < e]
+
+
+class QueryCache:
+    """
+    An on-disk cache of Sentinel hub search results.  Results are stored per normalised query (see 'query_key') along
+    with the date windows that have been searched; a later search whose window partly overlaps cached windows only
+    sends the uncovered sub-ranges to the hub and merges the results.  Cached windows expire after a time-to-live.
+    """
+
+    def __init__(self, db_path: str, ttl: timedelta = DEFAULT_TTL):
+        """
+        :param db_path: path to the cache database, it is created if it doesn't already exist
+        :param ttl: how long cached results are used before the hub is searched again
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self._connection = sqlite3.connect(db_path)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS windows ("
+                                     "key TEXT NOT NULL, start TEXT NOT NULL, end TEXT NOT NULL, "
+                                     "fetched_at REAL NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS products ("
+                                     "key TEXT NOT NULL, uuid TEXT NOT NULL, begin TEXT NOT NULL, "
+                                     "fetched_at REAL NOT NULL, properties BLOB NOT NULL, PRIMARY KEY (key, uuid))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS windows_key ON windows (key, start)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS products_begin ON products (key, begin)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the cache database
+        """
+        self._connection.close()
+
+    def expire(self) -> None:
+        """
+        Removes cached windows and products that are older than the time-to-live
+        """
+        oldest = time.time() - self.ttl.total_seconds()
+        with self._connection:
+            self._connection.execute("DELETE FROM windows WHERE fetched_at < ?", (oldest,))
+            self._connection.execute("DELETE FROM products WHERE fetched_at < ?", (oldest,))
+
+    def query(self,
+              api,
+              footprint: str,
+              date: Tuple[Union[str, date, datetime], Union[str, date, datetime]],
+              platformname: str,
+              producttype: str,
+              cloudcoverpercentage: Tuple[float, float]) -> OrderedDict:
+        """
+        Equivalent to 'SentinelAPI.query', but only the parts of the date window that haven't been searched within
+        the time-to-live are sent to the hub
+        :param api: a sentinelsat.SentinelAPI instance (or any object with a compatible 'query' method)
+        :param footprint: the search area as a WKT string
+        :param date: the (start, end) of the search window, as YYYYMMDD strings or datetime module objects.  The
+        window is treated as [start, end) at day resolution.
+        :param platformname: the platform to search for, i.e. 'Sentinel-2'
+        :param producttype: the product type to search for, i.e. 'S2MSI1C'
+        :param cloudcoverpercentage: the (min, max) cloud cover range to search for
+        :return: an ordered dictionary of product properties keyed by product id, sorted by sensing start
+        """
+        key = query_key(footprint, platformname, producttype, cloudcoverpercentage)
+        start, end = _to_date(date[0]), _to_date(date[1])
+        self.expire()
+
+        covered = [(_to_date(s), _to_date(e)) for s, e in self._connection.execute(
+            "SELECT start, end FROM windows WHERE key = ? AND start < ? AND end > ?",
+            (key, end.isoformat(), start.isoformat()))]
+
+        for gap_start, gap_end in _uncovered(start, end, covered):
+            logger.debug("Searching hub for {} to {}.".format(gap_start, gap_end))
+            products = api.query(footprint,
+                                 date=(gap_start.strftime(_DATE_FORMAT), gap_end.strftime(_DATE_FORMAT)),
+                                 platformname=platformname,
+                                 producttype=producttype,
+                                 cloudcoverpercentage=cloudcoverpercentage)
+            self._store(key, gap_start, gap_end, products)
+
+        rows = self._connection.execute("SELECT uuid, properties FROM products WHERE key = ? AND begin >= ? AND "
+                                        "begin < ? ORDER BY begin, uuid", (key, start.isoformat(), end.isoformat()))
+        return OrderedDict((uuid, pickle.loads(properties)) for uuid, properties in rows)
+
+    def _store(self, key: str, start: date, end: date, products: dict) -> None:
+        fetched_at = time.time()
+        rows = []
+        for uuid, properties in products.items():
+            begin = properties.get("beginposition") if isinstance(properties, dict) else None
+            begin = _to_date(begin) if begin is not None else start
+            rows.append((key, uuid, begin.isoformat(), fetched_at, pickle.dumps(properties)))
+
+        with self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO products (key, uuid, begin, fetched_at, properties) "
+                                         "VALUES (?, ?, ?, ?, ?)", rows)
+            self._connection.execute("INSERT INTO windows (key, start, end, fetched_at) VALUES (?, ?, ?, ?)",
+                                     (key, start.isoformat(), end.isoformat(), fetched_at))
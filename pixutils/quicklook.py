@@ -0,0 +1,177 @@
+import os
+import math
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Tuple, Union
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+#   GDAL is only needed to make quicklooks of raster files
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+logger = logging.getLogger("quicklook")
+
+#   the length of the longest side of a quicklook, in pixels
+DEFAULT_SIZE = 512
+
+#   the percentiles of the valid values mapped to the ends of the colour map
+DEFAULT_STRETCH = (2, 98)
+
+#   the number of samples averaged along each axis of a block when decimating an array
+BLOCK_SAMPLES = 4
+
+
+def _shape_for(rows: int, columns: int, size: int) -> Tuple[int, int]:
+    """
+    Returns the (rows, columns) of an image scaled so its longest side is at most 'size', keeping the aspect ratio
+    """
+    scale = min(1.0, size / max(rows, columns))
+    return max(1, int(round(rows * scale))), max(1, int(round(columns * scale)))
+
+
+def decimate(array: np.ndarray, size: int = DEFAULT_SIZE, samples: int = BLOCK_SAMPLES) -> np.ndarray:
+    """
+    Reduces an array so its longest side is at most 'size' by block-strided averaging.  The array is split in to
+    blocks of f x f pixels, and the mean of 'samples' x 'samples' evenly strided pixels of each block is taken, so only
+    a small fixed number of pixels are read per output pixel and no full size temporary arrays are created.  Works on
+    memory maps without reading the whole file.
+    :param array: a 2-D array, or a 3-D array with bands last (i.e. RGB)
+    :param size: the maximum length of the longest side of the output
+    :param samples: the number of samples averaged along each axis of a block; 1 gives plain strided subsampling
+    :return: a float32 array.  NaN values are ignored, and output pixels without any valid samples are NaN.
+    """
+    rows, columns = array.shape[0], array.shape[1]
+    factor = max(1, math.ceil(max(rows, columns) / size))
+    if factor == 1:
+        return np.asarray(array, dtype=np.float32)
+
+    output_shape = (math.ceil(rows / factor), math.ceil(columns / factor)) + array.shape[2:]
+    total = np.zeros(output_shape, np.float32)
+    count = np.zeros(output_shape, np.uint16)
+
+    offsets = np.unique(np.linspace(0, factor - 1, min(samples, factor)).astype(int))
+    for i in offsets:
+        for j in offsets:
+            view = np.asarray(array[i::factor, j::factor], dtype=np.float32)
+            valid = np.isfinite(view)
+            target = (slice(0, view.shape[0]), slice(0, view.shape[1]))
+            total[target] += np.where(valid, view, 0)
+            count[target] += valid
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count > 0, total / count, np.nan).astype(np.float32)
+
+
+def read_overview(path: str, size: int = DEFAULT_SIZE, bands: Iterable[int] = (1,)) -> np.ndarray:
+    """
+    Reads a raster file at reduced resolution.  GDAL reads from the file's overviews when it has them, so only the
+    pixels of the nearest overview level are read; otherwise the full resolution pixels are averaged as they're read.
+    :param path: path to a raster file GDAL can open
+    :param size: the maximum length of the longest side of the output
+    :param bands: the (1-based) bands to read, one band or three for RGB
+    :return: a float32 array of (rows, columns), or (rows, columns, bands) for more than one band.  No data values are
+    NaN.
+    :raises RuntimeError: if GDAL isn't available or can't open the file
+    """
+    if gdal is None:
+        raise RuntimeError("GDAL is required to make quicklooks of raster files.")
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise RuntimeError("GDAL is unable to open '{}'.".format(path))
+
+    rows, columns = _shape_for(dataset.RasterYSize, dataset.RasterXSize, size)
+    layers = []
+    for b in bands:
+        band = dataset.GetRasterBand(b)
+        data = band.ReadAsArray(buf_xsize=columns, buf_ysize=rows,
+                                resample_alg=gdal.GRIORA_Average).astype(np.float32)
+        nodata = band.GetNoDataValue()
+        if nodata is not None:
+            data[data == nodata] = np.nan
+        layers.append(data)
+    dataset = None
+    return layers[0] if len(layers) == 1 else np.dstack(layers)
+
+
+def _stretch(image: np.ndarray, stretch: Tuple[float, float]) -> Tuple[float, float]:
+    valid = image[np.isfinite(image)]
+    if valid.size == 0:
+        return 0.0, 1.0
+    vmin, vmax = (float(v) for v in np.percentile(valid, stretch))
+    return vmin, max(vmax, vmin + 1e-6)
+
+
+def write_png(image: np.ndarray,
+              output_path: str,
+              cmap: str = "viridis",
+              stretch: Tuple[float, float] = DEFAULT_STRETCH) -> None:
+    """
+    Writes a decimated image as a PNG, without creating a matplotlib figure
+    :param image: a 2-D array, coloured with 'cmap', or a 3-D RGB array, stretched per band
+    :param output_path: path to the PNG file
+    :param cmap: the matplotlib colour map for 2-D images
+    :param stretch: the percentiles of the valid values mapped to the ends of the colour map
+    """
+    if image.ndim == 3:
+        rgb = np.zeros(image.shape[:2] + (4,), np.float32)
+        for b in range(min(3, image.shape[2])):
+            vmin, vmax = _stretch(image[..., b], stretch)
+            rgb[..., b] = np.clip((image[..., b] - vmin) / (vmax - vmin), 0, 1)
+        rgb[..., 3] = np.all(np.isfinite(image[..., :3]), axis=2)
+        plt.imsave(output_path, np.nan_to_num(rgb))
+    else:
+        vmin, vmax = _stretch(image, stretch)
+        colour_map = matplotlib.colormaps[cmap].with_extremes(bad=(0, 0, 0, 0))
+        plt.imsave(output_path, np.ma.masked_invalid(image), cmap=colour_map, vmin=vmin, vmax=vmax)
+
+
+def quicklook(source: Union[str, np.ndarray],
+              output_path: str,
+              size: int = DEFAULT_SIZE,
+              bands: Iterable[int] = (1,),
+              cmap: str = "viridis",
+              stretch: Tuple[float, float] = DEFAULT_STRETCH) -> str:
+    """
+    Writes a PNG thumbnail of a raster file or an array
+    :param source: a path to a raster file, read with 'read_overview', or an array, reduced with 'decimate'
+    :param output_path: path to the PNG file
+    :param size: the maximum length of the longest side of the thumbnail
+    :param bands: for raster files, the (1-based) bands to read, one band or three for RGB
+    :param cmap: the matplotlib colour map for single band thumbnails
+    :param stretch: the percentiles of the valid values mapped to the ends of the colour map
+    :return: the output path
+    """
+    if isinstance(source, str):
+        image = read_overview(source, size, bands)
+    else:
+        image = decimate(source, size)
+    write_png(image, output_path, cmap, stretch)
+    logger.debug("Wrote quicklook '{}'.".format(output_path))
+    return output_path
+
+
+def _quicklook_or_log(source: str, output_path: str, kwargs: dict) -> str:
+    try:
+        return quicklook(source, output_path, **kwargs)
+    except (OSError, RuntimeError, ValueError) as e:
+        logger.warning("Failed to make a quicklook of '{}'. {}".format(source, e))
+        return None
+
+
+def quicklook_batch(paths: Iterable[str], output_folder: str, max_workers: int = None, **kwargs) -> Dict[str, str]:
+    """
+    Writes thumbnails of many raster files across a process pool.  Keyword arguments are passed to 'quicklook'.
+    :param paths: paths to raster files
+    :param output_folder: the folder for the thumbnails, named '<file stem>.png'
+    :param max_workers: the number of worker processes, defaults to the number of processors
+    :return: a dictionary of thumbnail paths keyed by raster file; failed files have None
+    """
+    paths = list(paths)
+    os.makedirs(output_folder, exist_ok=True)
+    outputs = [os.path.join(output_folder, os.path.splitext(os.path.basename(p))[0] + ".png") for p in paths]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(paths, executor.map(_quicklook_or_log, paths, outputs, [kwargs] * len(paths))))
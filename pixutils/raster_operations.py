@@ -6,6 +6,7 @@ from rsgislib import imageutils
 from rsgislib import imagecalc
 from rsgislib import TYPE_32FLOAT
 from osgeo import gdal
+from pixutils.instrumentation import timed
 
 
 ValueRange = namedtuple("ValueRange", ["min", "max"])
@@ -25,6 +26,7 @@ Used to specify data format for calls to rsgislib functions
 DEFAULT_DATA_FORMAT = DataFormat(format="GTIFF", type=TYPE_32FLOAT)
 
 
+@timed("raster", operation="clamp_raster")
 def clamp_raster(input_file_path: str,
                  output_file_path: str,
                  value_range: ValueRange,
@@ -50,13 +52,16 @@ def clamp_raster(input_file_path: str,
     norm_expr = '(x>={min} ? (x<={max} ? x : {max}) : {min})'.format(min=value_range.min, max=value_range.max)
 
     #   perform the normalisation
-    imagecalc.bandMath(output_file_path, norm_expr, data_format.format, data_format.type, band_definitions)
-    imageutils.popImageStats(output_file_path, False, 0, True)
+    with timed("compute", operation="clamp_raster"):
+        imagecalc.bandMath(output_file_path, norm_expr, data_format.format, data_format.type, band_definitions)
+    with timed("stats", operation="clamp_raster"):
+        imageutils.popImageStats(output_file_path, False, 0, True)
 
     if not os.path.isfile(output_file_path):
         raise FileNotFoundError("Unable to locate output file '{}'.".format(output_file_path))
 
 
+@timed("raster", operation="compress_geotiff")
 def compress_geotiff(input_file_path: str, output_file_path: str) -> None:
     """
     Compress the specified geotiff using 'gdal.warp'.  This will use LZW compression and also set other options suited
@@ -83,6 +88,7 @@ def compress_geotiff(input_file_path: str, output_file_path: str) -> None:
         raise FileNotFoundError("Unable to locate output file '{}'.".format(output_file_path))
 
 
+@timed("raster", operation="apply_mask")
 def apply_mask(input_file_path: str,
                output_file_path: str,
                data_min: float,
@@ -110,7 +116,8 @@ def apply_mask(input_file_path: str,
               data_format.type,
               out_value,
               mask_value)
-    imageutils.popImageStats(output_file_path, True, mask_value, True)
+    with timed("stats", operation="apply_mask"):
+        imageutils.popImageStats(output_file_path, True, mask_value, True)
 
     #   remove the mask file
     mask_file_path.unlink()
@@ -44,16 +44,22 @@ import os
 import sys
 import shutil
 import traceback
-import glob
 import zipfile
 import datetime
 import logging
-import pandas as pd # todo - fix import
+from contextlib import nullcontext
 import sentinelsat as sla
+import numpy as np
 # DFMS libraries
 # import ls8_lst_ndvi_convert as llc
 # from dfms_sharedutils import config_logger
-from dfms_sharedutils import eo_utilities as eou
+from pixutils.date_utils import date_range_strings, format_dates, to_datetime64_array
+from pixutils.product_catalog import ProductCatalog, default_catalog_path
+from pixutils.query_cache import QueryCache, DEFAULT_TTL
+from pixutils.tile_registry import load_tile_registry
+from pixutils.bbox_utils import AoiIndex
+from pixutils.sentinel_filename import parse_product_name
+from pixutils.instrumentation import timed, count as count_metric
 
 # logger = config_logger.configure_logging(__name__)
 logger = logging.getLogger(__name__)
@@ -61,10 +67,7 @@ logger = logging.getLogger(__name__)
 
 def get_tiles(tile_filename):
     try:
-        s2_tiles = pd.read_csv(tile_filename)
-        tiles_src = s2_tiles['Scenes'].values.tolist()
-        print(tiles_src)
-        tiles = list(set([a.split("A")[1] for a in tiles_src]))
+        tiles = sorted(load_tile_registry(tile_filename).tile_ids)
     except Exception as e:
         print("Error: unable to read tiles csv. {}".format(e))
 
@@ -78,12 +81,26 @@ def get_time_epochs():
 
 
 # Core downloading function where all downloading is intialised from
-def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication_filename, tile_filename, geo_path, product, logger):
+def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication_filename, tile_filename, geo_path, product, logger,
+                catalog_path=None, query_cache_path=None, query_cache_ttl=DEFAULT_TTL, grid_filename=None):
     logger.info("tile_filename: {}".format(tile_filename))
 
     if not os.path.exists(zip_folder):
         os.mkdir(zip_folder)
 
+    # Products already held in the zip folder are looked up in a persistent catalog rather than by globbing the folder
+    if catalog_path is None:
+        catalog_path = default_catalog_path(zip_folder)
+    # Hub search results are optionally cached on disk so overlapping date windows aren't searched again
+    cache_context = QueryCache(query_cache_path, query_cache_ttl) if query_cache_path is not None else nullcontext()
+    with ProductCatalog(catalog_path) as catalog, cache_context as query_cache:
+        catalog.scan(zip_folder)
+        return _s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication_filename, tile_filename,
+                            geo_path, product, logger, catalog, query_cache, grid_filename)
+
+
+def _s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication_filename, tile_filename, geo_path, product, logger,
+                 catalog, query_cache, grid_filename):
     logger.info("Sentinel-2 dowloading code initialised")
     # Download Sentinel-2 using sentinelsat
     # https://pypi.org/project/sentinelsat/
@@ -92,18 +109,8 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
     # to the end date to allow for succesful requests to the server api, this
     # is also set up alongside variables for program use
     logger.info("Setting up variables")
-    tiles = get_tiles(tile_filename)
-    edate_dt = datetime.datetime(int(edate[0:4]), int(edate[4:6]), int(edate[6:8]))
-    edate_dt = edate_dt + datetime.timedelta(hours=24)
-    if edate_dt.month < 10:
-        edate_month = "0" + str(edate_dt.month)
-    else:
-        edate_month = str(edate_dt.month)
-    if edate_dt.day < 10:
-        edate_day = "0" + str(edate_dt.day)
-    else:
-        edate_day = str(edate_dt.day)
-    edate = "{}{}{}".format(str(edate_dt.year), edate_month, edate_day)
+    tiles = load_tile_registry(tile_filename, grid_filename)
+    edate = str(format_dates(to_datetime64_array(edate) + np.timedelta64(1, "D")))
 
     fs2files = []
     ids = []    # list of ids of sentinel-2 files
@@ -123,25 +130,39 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
 
     # Connection attempt is made to the Copernicus open access hub and will exit if fails
     try:
-        api = sla.SentinelAPI(credentials[0], credentials[1], 'https://scihub.copernicus.eu/dhus')
+        with timed("connect", source="s2"):
+            api = sla.SentinelAPI(credentials[0], credentials[1], 'https://scihub.copernicus.eu/dhus')
     except Exception as e:
         logger.error("Can't login to Copernicus open access hub. {}".format(e))
         traceback.print_exc()
         sys.exit()
 
-    # Here a footprint is set up to pass along to the search query
-    footprint = sla.geojson_to_wkt(sla.read_geojson(geo_path))
+    # Here a footprint covering every area of interest in the geojson is set up to pass along to the search query,
+    # clipped to the tiles of interest when tile geometries are available
+    aois = AoiIndex.from_geojson(sla.read_geojson(geo_path))
+    footprint = tiles.query_footprint(aois.geometries)
+    if footprint is None:
+        logger.warning("Footprint doesn't intersect any of the tiles of interest")
+        return
 
     # Here the search query is started and a large dictionary is returned
-    products = api.query(footprint,
-                         date=(sdate, edate),
-                         platformname='Sentinel-2',
-                         producttype=product,
-                         cloudcoverpercentage=(float(cloud_cover[0]), float(cloud_cover[1]))
-                         )
+    query_args = dict(platformname='Sentinel-2',
+                      producttype=product,
+                      cloudcoverpercentage=(float(cloud_cover[0]), float(cloud_cover[1])))
+    with timed("query", source="s2"):
+        if query_cache is not None:
+            products = query_cache.query(api, footprint, date=(sdate, edate), **query_args)
+        else:
+            products = api.query(footprint, date=(sdate, edate), **query_args)
+    count_metric("products", len(products), phase="query", source="s2")
 
     logger.info("Query complete. {} products found".format(len(products)))
 
+    # Products that aren't on a tile of interest, or don't intersect any of the areas of interest, are dropped locally
+    # before their metadata is requested from the hub
+    products = tiles.filter_products(products, aois)
+    logger.info("{} products on tiles of interest".format(len(products)))
+
     # Information on the query is returned here
     if len(products) == 0:
         logger.error("Didn't find any files")
@@ -156,7 +177,8 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
     safe_dirs = []
     for key in products:
         try:
-            info = api.get_product_odata(key)
+            with timed("metadata", source="s2"):
+                info = api.get_product_odata(key)
         except Exception as e:
             logger.warning("key {} failed,skipping to next key. {}".format(key, e))
             traceback.print_exc()
@@ -166,11 +188,13 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
         # used in filtering the file based on the orbit number and also the
         # overpass time if it falls within the morning overpass window
         filestem = info['title']
-        f_sdate = filestem.split("_")[2].split("T")[0]
-        f_stime = filestem.split("_")[2].split("T")[1]
-        dt_1 = datetime.datetime(int(f_sdate[0:4]), int(f_sdate[4:6]), int(f_sdate[6:8]), int(f_stime[0:2]),
-                                 int(f_stime[2:4]), int(f_stime[4:6]))
-        tile_number = filestem.split("_")[5]
+        try:
+            product_name = parse_product_name(filestem)
+        except ValueError as e:
+            logger.warning("key {} has an unrecognised title, skipping to next key. {}".format(key, e))
+            continue
+        dt_1 = product_name.start_date_time
+        tile_number = product_name.tile_number
 
         # Here files which pass the orbit number and date time overpass check
         # are appended to a list and used in the downloading iteration
@@ -178,8 +202,7 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
         aclogfile = os.path.join(dl_folder, filestem + "-acfail.txt")
         safefile = os.path.join(dl_folder, filestem + ".SAFE")
         if tile_number in tiles and dt_1.time() >= stime_epoch:  # and dt_2.time() <= etime_epoch:
-            check = glob.glob(os.path.join(zip_folder, filestem))
-            if len(check) == 0: #and not os.path.exists(safefile) and not os.path.exists(aclogfile):
+            if not catalog.contains(zip_folder, filestem): #and not os.path.exists(safefile) and not os.path.exists(aclogfile):
                 ids.append(key)
                 fs2files.append(info['title'])
             else:
@@ -206,7 +229,9 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
     for id in ids:
         count += 1
         try:
-            api.download(id, directory_path=zip_folder)
+            with timed("transfer", source="s2"):
+                downloaded = api.download(id, directory_path=zip_folder)
+            count_metric("bytes", downloaded.get("size", 0), phase="transfer", source="s2")
         except Exception as e:
             logger.warning("Download failed for {}. {}".format(fs2files[count], e))
             traceback.print_exc()
@@ -215,20 +240,14 @@ def s2_download(sdate, edate, zip_folder, dl_folder, cloud_cover, authentication
 
     # The netcdf files and folders are extracted into the final folder
     logger.info("Starting extraction of data")
-    if sdate == edate:
-        zip_files = glob.glob(os.path.join(zip_folder, "*" + sdate + "*.zip"))
-    else:
-        dates_s2 = eou.daterange(sdate, edate, 0)   # todo - find dfms shared utils folder
-        zip_files = []
-        for dates in dates_s2:
-            zips = glob.glob(os.path.join(zip_folder, "*" + dates + "*.zip"))
-            if len(zips) > 0:
-                for zip in zips:
-                    zip_files.append(zip)
+    catalog.scan(zip_folder)
+    dates_s2 = date_range_strings(sdate, edate).tolist()
+    zip_files = catalog.find(zip_folder, start_dates=dates_s2, suffix=".zip")
 
     for a in zip_files:
-        with zipfile.ZipFile(a, "r") as zip_ref:
+        with timed("extraction", source="s2"), zipfile.ZipFile(a, "r") as zip_ref:
             zip_ref.extractall(dl_folder)
+            count_metric("bytes", sum(i.file_size for i in zip_ref.infolist()), phase="extraction", source="s2")
     logger.info("Data extracted from zip files")
 
     # Here the final cleanup is done
@@ -259,6 +278,14 @@ def main():
     parser.add_argument("-a", dest="auth", default=(os.path.join(head_tail[0], "s2dl.txt")),
                         help="Filename containing copernicus login information")
     parser.add_argument("-p", "--product", dest="product", default="1C", help="product type: S2MSI[1C][2A][Ap]")
+    parser.add_argument("-g", "--grid", dest="grid", default=None,
+                        help="Filename of a GeoJSON of tile geometries, used to prefilter the search locally")
+    parser.add_argument("--catalog", dest="catalog", default=None,
+                        help="Filename of the local product catalog (default: alongside zip_folder)")
+    parser.add_argument("--query-cache", dest="query_cache", default=None,
+                        help="Filename of an on-disk cache of hub search results (default: no caching)")
+    parser.add_argument("--query-cache-ttl", dest="query_cache_ttl", type=float, default=24,
+                        help="Hours that cached hub search results are used for")
     args = parser.parse_args()
 
     # Code initalisation goes here alongside error catching
@@ -270,7 +297,9 @@ def main():
 
     try:
         s2_download(args.sdate, args.edate, args.zip_folder, args.dl_folder, args.cloud, args.auth, args.tiles,
-                    args.geo_path, product, logger)
+                    args.geo_path, product, logger, catalog_path=args.catalog,
+                    query_cache_path=args.query_cache, query_cache_ttl=datetime.timedelta(hours=args.query_cache_ttl),
+                    grid_filename=args.grid)
     except Exception as e:
         logger.error("Crash occurred running s2_retrieval.py: {}".format(e))
         traceback.print_exc()
@@ -0,0 +1,219 @@
+import os
+import re
+import sqlite3
+import logging
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional
+import pandas as pd
+
+logger = logging.getLogger("safe_metadata")
+
+#   the product metadata file at the top level of a Sentinel-2 SAFE folder, i.e. "MTD_MSIL1C.xml"
+_MTD_FILENAME_REGEX = re.compile(r"^MTD_\w+\.xml$", re.IGNORECASE)
+
+#   map the tags read from the metadata file to the stored column names
+MTD_TAG_TO_COLUMN = {
+    "PRODUCT_URI": "product_uri",
+    "PRODUCT_TYPE": "product_type",
+    "PROCESSING_LEVEL": "processing_level",
+    "PROCESSING_BASELINE": "processing_baseline",
+    "PRODUCT_START_TIME": "sensing_time",
+    "GENERATION_TIME": "generation_time",
+    "SPACECRAFT_NAME": "spacecraft",
+    "SENSING_ORBIT_NUMBER": "orbit_number",
+    "Cloud_Coverage_Assessment": "cloud_cover",
+}
+
+_COLUMN_TYPES = {
+    "orbit_number": "INTEGER",
+    "cloud_cover": "REAL",
+}
+
+COLUMNS = ["path", "mtime_ns"] + list(MTD_TAG_TO_COLUMN.values())
+
+
+def find_products(folder: str) -> List[str]:
+    """
+    Walks a folder for extracted SAFE folders and zipped products.  SAFE folders are not descended into.
+    :param folder: the folder to be searched
+    :return: a sorted list of paths to ".SAFE" folders and ".zip" files
+    """
+    products = []
+    for root, dirs, files in os.walk(folder):
+        safe_dirs = [d for d in dirs if d.upper().endswith(".SAFE")]
+        products.extend(os.path.join(root, d) for d in safe_dirs)
+        dirs[:] = [d for d in dirs if d not in safe_dirs]
+        products.extend(os.path.join(root, f) for f in files if f.lower().endswith(".zip"))
+    return sorted(products)
+
+
+def _parse_mtd(stream) -> dict:
+    """
+    Reads the recognised fields from a product metadata XML stream with 'iterparse', stopping once all have been found
+    """
+    record = {}
+    for _, element in ET.iterparse(stream, events=("end",)):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag in MTD_TAG_TO_COLUMN and MTD_TAG_TO_COLUMN[tag] not in record:
+            record[MTD_TAG_TO_COLUMN[tag]] = (element.text or "").strip()
+            if len(record) == len(MTD_TAG_TO_COLUMN):
+                break
+        element.clear()
+
+    if "orbit_number" in record:
+        record["orbit_number"] = int(record["orbit_number"])
+    if "cloud_cover" in record:
+        record["cloud_cover"] = float(record["cloud_cover"])
+    return record
+
+
+def parse_product_metadata(path: str) -> Optional[dict]:
+    """
+    Reads the product metadata of an extracted SAFE folder or a zipped product
+    :param path: path to a ".SAFE" folder or a ".zip" file
+    :return: a dictionary keyed by the names in 'COLUMNS', or None if no metadata file was found
+    """
+    record = None
+    if os.path.isdir(path):
+        names = [n for n in os.listdir(path) if _MTD_FILENAME_REGEX.match(n)]
+        if names:
+            with open(os.path.join(path, sorted(names)[0]), "rb") as stream:
+                record = _parse_mtd(stream)
+    else:
+        with zipfile.ZipFile(path, "r") as zip_ref:
+            #   the metadata file sits directly inside the top level SAFE folder of the archive
+            names = [n for n in zip_ref.namelist()
+                     if n.count("/") == 1 and _MTD_FILENAME_REGEX.match(n.split("/")[1])]
+            if names:
+                with zip_ref.open(sorted(names)[0]) as stream:
+                    record = _parse_mtd(stream)
+
+    if record is None:
+        return None
+
+    record.update(path=path, mtime_ns=os.stat(path).st_mtime_ns)
+    return {c: record.get(c) for c in COLUMNS}
+
+
+def _parse_or_log(path: str) -> Optional[dict]:
+    try:
+        return parse_product_metadata(path)
+    except (OSError, zipfile.BadZipFile, ET.ParseError) as e:
+        logger.warning("Unable to read metadata from '{}'. {}".format(path, e))
+        return None
+
+
+class MetadataStore:
+    """
+    A SQLite store of Sentinel-2 product metadata harvested from local SAFE folders and zip files, so cloud cover,
+    sensing time and processing baseline can be filtered locally rather than by querying the hub.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        :param db_path: path to the store database, it is created if it doesn't already exist
+        """
+        self.db_path = db_path
+        self._connection = sqlite3.connect(db_path)
+        columns = ", ".join("{} {}".format(c, _COLUMN_TYPES.get(c, "TEXT")) for c in COLUMNS[2:])
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS product_metadata ("
+                                     "path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, {})".format(columns))
+            self._connection.execute("CREATE INDEX IF NOT EXISTS product_metadata_sensing_time "
+                                     "ON product_metadata (sensing_time)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS product_metadata_cloud_cover "
+                                     "ON product_metadata (cloud_cover)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes the connection to the store database
+        """
+        self._connection.close()
+
+    def harvest(self, paths: Iterable[str], max_workers: int = None, chunksize: int = 16, prune: bool = True) -> int:
+        """
+        Parses the metadata of the given products across a process pool and stores the results.  Products that are
+        already stored with the same modification time are skipped, and products that no longer have readable metadata
+        are removed.
+        :param paths: paths to ".SAFE" folders or ".zip" files, i.e. from 'find_products'
+        :param max_workers: the number of worker processes, defaults to the number of processors.  If 1, products are
+        parsed in this process.
+        :param chunksize: the number of products sent to a worker at a time
+        :param prune: remove the stored products that no longer exist first; see 'prune'
+        :return: the number of products stored
+        """
+        if prune:
+            self.prune()
+        stored = dict(self._connection.execute("SELECT path, mtime_ns FROM product_metadata"))
+        paths = [p for p in paths if stored.get(p) != os.stat(p).st_mtime_ns]
+        if not paths:
+            return 0
+
+        if max_workers == 1:
+            results = map(_parse_or_log, paths)
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(_parse_or_log, paths, chunksize=chunksize))
+        results = list(results)
+        records = [r for r in results if r is not None]
+        unreadable = [(p,) for p, r in zip(paths, results) if r is None and p in stored]
+
+        insert = "INSERT OR REPLACE INTO product_metadata ({}) VALUES ({})".format(", ".join(COLUMNS),
+                                                                                  ", ".join("?" * len(COLUMNS)))
+        with self._connection:
+            self._connection.executemany(insert, ([r[c] for c in COLUMNS] for r in records))
+            self._connection.executemany("DELETE FROM product_metadata WHERE path = ?", unreadable)
+
+        logger.info("Harvested metadata from {} of {} products.".format(len(records), len(paths)))
+        return len(records)
+
+    def prune(self) -> int:
+        """
+        Removes the stored products that no longer exist, i.e. that were deleted or moved since they were harvested
+        :return: the number of products removed
+        """
+        missing = [(p,) for (p,) in self._connection.execute("SELECT path FROM product_metadata")
+                   if not os.path.exists(p)]
+        with self._connection:
+            self._connection.executemany("DELETE FROM product_metadata WHERE path = ?", missing)
+        if missing:
+            logger.info("Removed {} products that no longer exist.".format(len(missing)))
+        return len(missing)
+
+    def query(self,
+              start: str = None,
+              end: str = None,
+              max_cloud_cover: float = None,
+              product_type: str = None,
+              processing_baseline: str = None) -> pd.DataFrame:
+        """
+        Filters the stored metadata
+        :param start: optional, the earliest sensing time as an ISO formatted string, i.e. "2020-06-01"
+        :param end: optional, sensing times must be before this ISO formatted string
+        :param max_cloud_cover: optional, the maximum cloud cover percentage
+        :param product_type: optional, i.e. "S2MSI1C"
+        :param processing_baseline: optional, i.e. "02.09"
+        :return: a DataFrame with a row per matching product, sorted by sensing time
+        """
+        clauses, params = [], []
+        for clause, value in [("sensing_time >= ?", start),
+                              ("sensing_time < ?", end),
+                              ("cloud_cover <= ?", max_cloud_cover),
+                              ("product_type = ?", product_type),
+                              ("processing_baseline = ?", processing_baseline)]:
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+
+        query = "SELECT {} FROM product_metadata".format(", ".join(COLUMNS))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return pd.read_sql_query(query + " ORDER BY sensing_time", self._connection, params=params)
@@ -1,5 +1,9 @@
 import re
+from datetime import datetime
+from functools import lru_cache
 from collections import namedtuple
+from typing import Callable, Dict, Iterable
+import numpy as np
 
 #   https://sentinel.esa.int/web/sentinel/technical-guides/sentinel-1-sar/products-algorithms/level-1-product-formatting
 SENTINEL_FILENAME_PATTERN = \
@@ -52,3 +56,261 @@ def parse_sentinel_filename(filename):
     else:
         raise ValueError("'{}' does not appear to be a valid Sentinel filename pattern.".format(filename))
 
+
+#   the schema matched by 'parse_sentinel_filename' has fixed width fields, so 'parse_sentinel_filenames' matches the
+#   whole name once per line of a joined block of filenames and then slices the fields out of the matched product
+#   names as character arrays.  Each line yields a (filename, product name, extension) tuple, empty if it doesn't match.
+_BULK_FILENAME_REGEX = re.compile(
+    r"^[^\n]*?(?:((\w{3}_\w{2}_\w{4}_\d\D{3}_\d{8}T\d{6}_\d{8}T\d{6}_\d{6}_\w{6}_\w{4})\.([^\n]*))|$)",
+    re.IGNORECASE | re.MULTILINE | re.ASCII)
+_PRODUCT_NAME_LENGTH = 67
+
+#   character positions of each field within the product name, i.e. "S1A_IW_GRDH_1SDV_20190925T062938_..."
+_FIELD_SLICES = {
+    "mission_identifier": (0, 3),
+    "mode_beam_identifier": (4, 6),
+    "product_type": (7, 10),
+    "resolution_class": (10, 11),
+    "processing_level": (12, 13),
+    "product_class": (13, 14),
+    "polarisation": (14, 16),
+    "start_date": (17, 25),
+    "start_time": (26, 32),
+    "stop_date": (33, 41),
+    "stop_time": (42, 48),
+    "absolute_orbit_number": (49, 55),
+    "mission_data_take_id": (56, 62),
+    "product_unique_identifier": (63, 67),
+}
+_DATE_FIELDS = ("start_date", "stop_date")
+_TIME_FIELDS = ("start_time", "stop_time")
+_DATE_TIME_FIELDS = {"start_date_time": ("start_date", "start_time"), "stop_date_time": ("stop_date", "stop_time")}
+_INTEGER_FIELDS = ("absolute_orbit_number",)
+
+
+def _digits_to_int(codes: np.ndarray) -> np.ndarray:
+    """
+    Converts a 2D array of ASCII digit character codes to an array of integers, one per row
+    """
+    return (codes.astype(np.int64) - ord("0")) @ (10 ** np.arange(codes.shape[1] - 1, -1, -1, dtype=np.int64))
+
+
+def _dates_to_datetime64(dates: np.ndarray) -> np.ndarray:
+    """
+    Converts an array of YYYYMMDD integers to datetime64[D]
+    """
+    year, month_day = np.divmod(dates, 10000)
+    month, day = np.divmod(month_day, 100)
+    months = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    return months.astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+
+
+def _times_to_timedelta64(times: np.ndarray) -> np.ndarray:
+    """
+    Converts an array of HHMMSS integers to timedelta64[s] since midnight
+    """
+    hours, minutes_seconds = np.divmod(times, 10000)
+    minutes, seconds = np.divmod(minutes_seconds, 100)
+    return (hours * 3600 + minutes * 60 + seconds).astype("timedelta64[s]")
+
+
+def parse_sentinel_filenames(filenames: Iterable[str]) -> Dict[str, np.ndarray]:
+    """
+    Extracts details from many Sentinel filenames at once, using the same schema as 'parse_sentinel_filename'.  The
+    result is columnar: a dictionary of NumPy arrays keyed by SentinelProductInfo field name, each with one element
+    per input filename.  Dates are returned as datetime64[D], date-times as datetime64[s], times as timedelta64[s]
+    since midnight and orbit numbers as int64; other fields are returned as strings.
+    Invalid filenames don't raise an exception, instead they are marked False in the additional 'valid' column and
+    their fields are empty strings, NaT or -1.  Filenames containing line breaks are treated as invalid.
+    :param filenames: an iterable of filename strings that can include full paths
+    :type filenames: Iterable[str]
+    :return: a dictionary of NumPy arrays
+    :rtype: Dict[str, np.ndarray]
+    """
+    filenames = ["" if "\n" in f else f for f in filenames]
+    found = _BULK_FILENAME_REGEX.findall("\n".join(filenames)) if filenames else []
+    found = np.array(found, dtype=str).reshape(len(filenames), 3)
+    valid = found[:, 1] != ""
+
+    #   the matched product names as a 2D array of character codes, one row per valid filename
+    codes = found[valid, 1].astype("U{}".format(_PRODUCT_NAME_LENGTH)).view(np.uint32)
+    codes = codes.reshape(-1, _PRODUCT_NAME_LENGTH)
+
+    values = {"filename": found[valid, 0], "product_format_extension": found[valid, 2]}
+    empty = dict.fromkeys(values, "")
+    for field, (start, stop) in _FIELD_SLICES.items():
+        field_codes = codes[:, start:stop]
+        if field in _DATE_FIELDS:
+            values[field] = _dates_to_datetime64(_digits_to_int(field_codes))
+            empty[field] = np.datetime64("NaT", "D")
+        elif field in _TIME_FIELDS:
+            values[field] = _times_to_timedelta64(_digits_to_int(field_codes))
+            empty[field] = np.timedelta64("NaT", "s")
+        elif field in _INTEGER_FIELDS:
+            values[field], empty[field] = _digits_to_int(field_codes), -1
+        else:
+            values[field] = np.ascontiguousarray(field_codes).view("U{}".format(stop - start)).ravel()
+            empty[field] = ""
+    for field, (date_field, time_field) in _DATE_TIME_FIELDS.items():
+        values[field] = values[date_field].astype("datetime64[s]") + values[time_field]
+        empty[field] = np.datetime64("NaT", "s")
+
+    result = {"valid": valid}
+    for field in _SENTINEL_IDENTIFIER_TO_GROUP_ID:
+        column = np.full(len(valid), empty[field], dtype=values[field].dtype)
+        column[valid] = values[field]
+        result[field] = column
+
+    return result
+
+
+def _datetime(s: str) -> datetime:
+    """
+    Converts a "YYYYMMDDTHHMMSS" string to a datetime, without the overhead of 'strptime'
+    """
+    return datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]), int(s[9:11]), int(s[11:13]), int(s[13:15]))
+
+
+class ProductName:
+    """
+    Base class of the compact, immutable records returned by 'parse_product_name'.  Subclasses declare their typed
+    fields in '__slots__', in the order that the values are passed to the constructor.  Records are shared by the
+    'parse_product_name' cache, so fields can't be changed once set; use '_replace' for a modified copy.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("'{}' records are immutable.".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("'{}' records are immutable.".format(type(self).__name__))
+
+    def __reduce__(self):
+        return type(self), self._astuple()
+
+    def _replace(self, **changes) -> "ProductName":
+        return type(self)(*(changes.pop(f, getattr(self, f)) for f in self.__slots__))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._astuple() == other._astuple()
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__,
+                               ", ".join("{}={!r}".format(f, getattr(self, f)) for f in self.__slots__))
+
+    def _astuple(self) -> tuple:
+        return tuple(getattr(self, f) for f in self.__slots__)
+
+    def _asdict(self) -> dict:
+        return {f: getattr(self, f) for f in self.__slots__}
+
+
+class Sentinel1ProductName(ProductName):
+    """
+    Fields extracted from a Sentinel-1 product name, see 'SENTINEL_FILENAME_PATTERN'
+    """
+    __slots__ = ("filename", "title", "mission_identifier", "mode_beam_identifier", "product_type",
+                 "resolution_class", "processing_level", "product_class", "polarisation", "start_date_time",
+                 "stop_date_time", "absolute_orbit_number", "mission_data_take_id", "product_unique_identifier",
+                 "product_format_extension")
+
+    @classmethod
+    def from_match(cls, match):
+        g = match.group
+        return cls(g(0), g(1), g(2), g(3), g(4), g(5), g(6), g(7), g(8), _datetime(g(9)), _datetime(g(10)),
+                   int(g(11)), g(12), g(13), g(14))
+
+
+class Sentinel2ProductName(ProductName):
+    """
+    Fields extracted from a Sentinel-2 product name, see 'SENTINEL_2_FILENAME_PATTERN'.  The processing baseline is
+    formatted as in the product metadata, i.e. "02.09", and 'tile_number' keeps its leading "T", i.e. "T30UXC".
+    """
+    __slots__ = ("filename", "title", "mission_identifier", "instrument", "processing_level", "start_date_time",
+                 "processing_baseline", "relative_orbit_number", "tile_number", "product_discriminator",
+                 "product_format_extension")
+
+    @classmethod
+    def from_match(cls, match):
+        g = match.group
+        return cls(g(0), g(1), g(2), g(3), g(4), _datetime(g(5)), "{}.{}".format(g(6)[0:2], g(6)[2:4]), int(g(7)),
+                   g(8), _datetime(g(9)), g(10))
+
+
+class Sentinel3ProductName(ProductName):
+    """
+    Fields extracted from a Sentinel-3 product name, see 'SENTINEL_3_FILENAME_PATTERN'
+    """
+    __slots__ = ("filename", "title", "mission_identifier", "data_source", "processing_level", "data_type",
+                 "start_date_time", "stop_date_time", "creation_date_time", "instance_id", "generating_centre",
+                 "platform", "timeliness", "collection", "product_format_extension")
+
+    @classmethod
+    def from_match(cls, match):
+        g = match.group
+        return cls(g(0), g(1), g(2), g(3), g(4), g(5), _datetime(g(6)), _datetime(g(7)), _datetime(g(8)), g(9),
+                   g(10), g(11), g(12), g(13), g(14))
+
+
+#   product name patterns used by 'parse_product_name'; group 1 is the title (the name without its extension), the
+#   extension is optional as titles returned by the hub don't include one
+#   https://sentinel.esa.int/web/sentinel/technical-guides/sentinel-1-sar/products-algorithms/level-1-product-formatting
+SENTINEL_1_FILENAME_PATTERN = \
+    r"((\w{3})_(\w{2})_(\w{3})(\w)_(\d)(\D)(\D{2})_(\d{8}T\d{6})_(\d{8}T\d{6})_(\d{6})_(\w{6})_(\w{4}))(?:\.(.*))?"
+#   https://sentinel.esa.int/web/sentinel/user-guides/sentinel-2-msi/naming-convention
+SENTINEL_2_FILENAME_PATTERN = \
+    r"((S2[A-D_])_(MSI)(\w{3,4})_(\d{8}T\d{6})_N(\d{4})_R(\d{3})_(T\w{5})_(\d{8}T\d{6}))(?:\.(.*))?"
+#   https://sentinel.esa.int/web/sentinel/user-guides/sentinel-3-olci/naming-convention
+SENTINEL_3_FILENAME_PATTERN = \
+    r"((S3[A-D_])_(\w{2})_(\w)_(\w{6})_(\d{8}T\d{6})_(\d{8}T\d{6})_(\d{8}T\d{6})_(\w{17})_(\w{3})_(\w)_(\w{2})_(\w{3}))" \
+    r"(?:\.(.*))?"
+
+#   mission prefix, i.e. "S2", mapped to the compiled pattern and the record class built from a match
+_PRODUCT_NAME_PARSERS = {}
+
+
+def register_product_name_parser(prefix: str, pattern: str, factory: Callable) -> None:
+    """
+    Registers the pattern used by 'parse_product_name' for product names starting with a mission prefix
+    :param prefix: the first two characters of the product names, i.e. "S2"
+    :param pattern: a regular expression matching the whole product name, with the extension optional
+    :param factory: called with the regular expression match object to build the returned record
+    """
+    _PRODUCT_NAME_PARSERS[prefix.upper()] = (re.compile(pattern + "$", re.IGNORECASE), factory)
+    _parse_product_name.cache_clear()
+
+
+@lru_cache(maxsize=65536)
+def _parse_product_name(name: str) -> ProductName:
+    parser = _PRODUCT_NAME_PARSERS.get(name[0:2].upper())
+    match = parser[0].match(name) if parser is not None else None
+    if match is None:
+        raise ValueError("'{}' does not appear to be a valid Sentinel product name.".format(name))
+    return parser[1](match)
+
+
+def parse_product_name(filename: str) -> ProductName:
+    """
+    Extracts typed details from a Sentinel-1, -2 or -3 product name or filename.  The mission specific pattern is
+    chosen from the name's prefix, and results are cached so repeated names are only parsed once.
+    :param filename: a product title or filename string that can include a full path
+    :type filename: str
+    :return: a Sentinel1ProductName, Sentinel2ProductName or Sentinel3ProductName record.  Date-times are returned as
+    datetime objects and orbit numbers as integers.
+    :rtype: ProductName
+    :raises ValueError: if the name doesn't match the pattern registered for its mission
+    """
+    return _parse_product_name(filename.replace("\\", "/").rsplit("/", 1)[-1])
+
+
+register_product_name_parser("S1", SENTINEL_1_FILENAME_PATTERN, Sentinel1ProductName.from_match)
+register_product_name_parser("S2", SENTINEL_2_FILENAME_PATTERN, Sentinel2ProductName.from_match)
+register_product_name_parser("S3", SENTINEL_3_FILENAME_PATTERN, Sentinel3ProductName.from_match)
+
@@ -0,0 +1,181 @@
+import os
+import json
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Union
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+from pixutils.bbox_utils import AoiIndex, as_geometries
+from pixutils.sentinel_filename import parse_product_name
+
+logger = logging.getLogger("tile_registry")
+
+#   column in the tiles csv holding the tile names, and the optional column holding each tile's geometry as WKT
+TILES_COLUMN = "Scenes"
+GEOMETRY_COLUMN = "WKT"
+
+#   feature properties recognised as the tile name in a tiling grid GeoJSON, i.e. one exported from the ESA
+#   Sentinel-2 tiling grid KML
+GRID_NAME_PROPERTIES = ("Name", "name", "tile_id", "TILE_ID")
+
+
+def _tile_key(tile_id: str) -> str:
+    """
+    Normalises an MGRS tile identifier so "T30UXC", "t30uxc" and "30UXC" compare equal
+    """
+    tile_id = tile_id.strip().upper()
+    return tile_id[1:] if tile_id.startswith("T") else tile_id
+
+
+def _tile_from_title(title: str) -> str:
+    """
+    Returns the tile identifier from a Sentinel-2 product title, i.e. "T30UXC", or an empty string
+    """
+    try:
+        return getattr(parse_product_name(title), "tile_number", "")
+    except ValueError:
+        return ""
+
+
+def _as_geometry(footprint: Union[str, BaseGeometry, Iterable]) -> BaseGeometry:
+    """
+    Accepts a WKT string, a shapely geometry or a collection of either and returns a single shapely geometry
+    """
+    if isinstance(footprint, BaseGeometry):
+        return footprint
+    return shapely.union_all(as_geometries(footprint))
+
+
+class TileRegistry:
+    """
+    Holds the MGRS tiles of interest.  Tile identifiers are held in a set for constant time membership tests, and,
+    when tile geometries are available, the geometries are held in an AoiIndex so a footprint can be resolved to the
+    tiles it intersects and search results can be filtered by geometry locally.
+    """
+
+    def __init__(self, tile_ids: Iterable[str], geometries: Dict[str, BaseGeometry] = None):
+        """
+        :param tile_ids: identifiers of the tiles of interest, with or without the leading "T"
+        :param geometries: optional, a dictionary of tile geometries (lon/lat) keyed by tile identifier.  Entries for
+        tiles that aren't of interest are ignored.
+        """
+        self.tile_ids = frozenset(tile_ids)
+        self._keys = frozenset(_tile_key(t) for t in self.tile_ids)
+
+        geometries = {_tile_key(k): v for k, v in (geometries or {}).items()}
+        self._geometries = {k: geometries[k] for k in sorted(self._keys) if k in geometries}
+        self._index = AoiIndex(list(self._geometries.values()), list(self._geometries)) if self._geometries else None
+        missing = len(self._keys) - len(self._geometries)
+        if geometries and missing:
+            logger.warning("No geometry found for {} of {} tiles.".format(missing, len(self._keys)))
+
+    def __contains__(self, tile_id: str) -> bool:
+        return _tile_key(tile_id) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def has_geometries(self) -> bool:
+        return self._index is not None
+
+    def tiles_for_footprint(self, footprint: Union[str, BaseGeometry, Iterable]) -> FrozenSet[str]:
+        """
+        Resolves a footprint to the tiles of interest that it intersects
+        :param footprint: a WKT string, a shapely geometry, or a collection of either
+        :return: a set of normalised tile identifiers (without the leading "T")
+        :raises RuntimeError: if the registry was created without tile geometries
+        """
+        if self._index is None:
+            raise RuntimeError("Tile geometries are required to resolve a footprint to tiles.")
+        return frozenset(self._index.query(_as_geometry(footprint)))
+
+    def query_footprint(self, footprint: Union[str, BaseGeometry, Iterable]) -> str:
+        """
+        Returns the part of a footprint that falls within the tiles of interest, for use in a remote search.  Passing
+        a collection of footprints (i.e. several AOIs) gives a single search area covering all of them.
+        :param footprint: a WKT string, a shapely geometry, or a collection of either
+        :return: a WKT string, or None if the footprint doesn't intersect any tile of interest.  If the registry has no
+        tile geometries the footprint is returned unchanged.
+        """
+        geometry = _as_geometry(footprint)
+        if self._index is None:
+            return footprint if isinstance(footprint, str) else geometry.wkt
+
+        tile_keys = self._index.query(geometry)
+        if not tile_keys:
+            return None
+        tiles = shapely.union_all([self._geometries[k] for k in tile_keys])
+        return shapely.intersection(geometry, tiles).wkt
+
+    def filter_products(self, products: Dict[str, dict],
+                        footprint: Union[str, BaseGeometry, AoiIndex] = None) -> OrderedDict:
+        """
+        Filters search results locally, keeping products on a tile of interest and, when a footprint is given,
+        products whose own footprint intersects it
+        :param products: a dictionary of product properties keyed by product id, as returned by 'SentinelAPI.query'
+        :param footprint: optional, a WKT string or shapely geometry that product footprints must intersect, or an
+        AoiIndex of areas of interest, of which product footprints must intersect at least one
+        :return: an ordered dictionary of the products that passed the filter
+        """
+        keys = [k for k, p in products.items() if _tile_from_title(p.get("title", "")) in self]
+        if footprint is not None and keys:
+            known = [k for k in keys if products[k].get("footprint")]
+            if len(known) < len(keys):
+                logger.warning("{} of {} products have no footprint, so they aren't filtered by footprint.".format(
+                    len(keys) - len(known), len(keys)))
+            aois = footprint if isinstance(footprint, AoiIndex) else AoiIndex([_as_geometry(footprint)])
+            matched = aois.match_products({k: products[k] for k in known})
+            known = set(known)
+            keys = [k for k in keys if k in matched or k not in known]
+
+        return OrderedDict((k, products[k]) for k in keys)
+
+
+def _read_grid(grid_filename: str) -> Dict[str, BaseGeometry]:
+    """
+    Reads tile geometries from a tiling grid GeoJSON file
+    """
+    with open(grid_filename, "r") as f:
+        features = json.load(f)["features"]
+
+    geometries = {}
+    for feature in features:
+        properties = feature.get("properties") or {}
+        name = next((properties[p] for p in GRID_NAME_PROPERTIES if p in properties), None)
+        if name is not None:
+            geometries[name] = shape(feature["geometry"])
+    return geometries
+
+
+@lru_cache(maxsize=16)
+def _load_tile_registry(tile_filename: str, tile_mtime_ns: int, grid_filename: str, grid_mtime_ns: int) -> TileRegistry:
+    s2_tiles = pd.read_csv(tile_filename)
+    tile_ids = [a.split("A")[1] for a in s2_tiles[TILES_COLUMN].values.tolist()]
+
+    if grid_filename is not None:
+        geometries = _read_grid(grid_filename)
+    elif GEOMETRY_COLUMN in s2_tiles.columns:
+        geometries = dict(zip(tile_ids, shapely.from_wkt(s2_tiles[GEOMETRY_COLUMN].values)))
+    else:
+        geometries = None
+
+    logger.debug("Loaded {} tiles from '{}'.".format(len(set(tile_ids)), tile_filename))
+    return TileRegistry(tile_ids, geometries)
+
+
+def load_tile_registry(tile_filename: str, grid_filename: str = None) -> TileRegistry:
+    """
+    Loads the tiles of interest from a tiles csv.  Registries are cached, so the csv is only re-read when it changes.
+    Tile geometries are read from a 'WKT' column in the csv, or from a tiling grid GeoJSON if one is given.
+    :param tile_filename: path to the tiles csv, tile names are read from the 'Scenes' column
+    :param grid_filename: optional, path to a GeoJSON of tile geometries with each tile's name in a 'Name' property
+    :return: a TileRegistry
+    """
+    tile_filename = os.path.abspath(tile_filename)
+    grid_filename = os.path.abspath(grid_filename) if grid_filename is not None else None
+    grid_mtime_ns = os.stat(grid_filename).st_mtime_ns if grid_filename is not None else None
+    return _load_tile_registry(tile_filename, os.stat(tile_filename).st_mtime_ns, grid_filename, grid_mtime_ns)
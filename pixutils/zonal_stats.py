@@ -0,0 +1,340 @@
+import os
+import json
+import hashlib
+import logging
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+from pixutils.instrumentation import timed
+
+#   GDAL is only needed to read raster files, and vector layers other than GeoJSON
+try:
+    from osgeo import gdal, ogr
+except ImportError:
+    gdal = ogr = None
+
+logger = logging.getLogger("zonal_stats")
+
+#   the label of pixels outside every zone; zones are labelled from 1 in the order they're read
+NO_ZONE = 0
+
+#   the type of label rasters, which limits the number of zones to 2^32 - 1
+LABEL_DTYPE = np.uint32
+
+#   the approximate number of bytes read from all rasters at once, which sets the number of rows in each block
+BLOCK_BYTES = 64 * 1024 * 1024
+
+#   the maximum number of pixel centres tested against a polygon at once when rasterising
+RASTERISE_BLOCK_PIXELS = 4 * 1024 * 1024
+
+#   vector files read as GeoJSON without GDAL
+GEOJSON_EXTENSIONS = (".geojson", ".json")
+
+GridDefinition = namedtuple("GridDefinition", ["width", "height", "geotransform", "projection"])
+GridDefinition.__doc__ = """
+The pixel grid of a raster.  Rasters are aligned if they have the same grid definition.
+:param width: the number of columns
+:param height: the number of rows
+:param geotransform: the GDAL geotransform (x origin, pixel width, 0, y origin, 0, pixel height) as a tuple
+:param projection: the projection as WKT, or an empty string if unknown
+"""
+
+Zones = namedtuple("Zones", ["labels", "ids", "grid"])
+Zones.__doc__ = """
+Zones rasterised on to a grid
+:param labels: a read-only (height, width) array labelling each pixel with its zone, from 1, or NO_ZONE
+:param ids: an array of the identifier of each zone, so the zone labelled 'n' has identifier 'ids[n - 1]'
+:param grid: the GridDefinition of the labels
+"""
+
+ZonalStats = namedtuple("ZonalStats", ["ids", "count", "mean", "min", "max", "std"])
+ZonalStats.__doc__ = """
+The statistics of the valid pixels of one raster in each zone, as arrays in the order of the zone identifiers.  Zones
+without valid pixels have a count of 0 and NaN statistics.
+:param ids: the zone identifiers
+:param count: the number of valid pixels
+:param mean: the mean value
+:param min: the minimum value
+:param max: the maximum value
+:param std: the population standard deviation
+"""
+
+
+def grid_of(path: str) -> GridDefinition:
+    """
+    Returns the grid definition of a raster file
+    :raises RuntimeError: if GDAL isn't available or can't open the file
+    """
+    if gdal is None:
+        raise RuntimeError("GDAL is required to read raster files.")
+    dataset = gdal.Open(path)
+    if dataset is None:
+        raise RuntimeError("GDAL is unable to open '{}'.".format(path))
+    grid = GridDefinition(dataset.RasterXSize, dataset.RasterYSize, tuple(dataset.GetGeoTransform()),
+                          dataset.GetProjection() or "")
+    dataset = None
+    return grid
+
+
+def read_zones(vector_path: str, id_field: str = None) -> Tuple[list, List[BaseGeometry]]:
+    """
+    Reads the features of a vector layer.  The layer must be in the coordinate system of the rasters it's used with.
+    :param vector_path: path to a GeoJSON file, or any vector file GDAL can open
+    :param id_field: optional, the property holding each feature's identifier; features are numbered from 0 if omitted
+    :return: a list of identifiers and a list of the matching shapely geometries
+    :raises ValueError: if a feature doesn't have the 'id_field' property
+    :raises RuntimeError: if the file isn't GeoJSON and GDAL isn't available or can't open it
+    """
+    ids, geometries = [], []
+    if vector_path.lower().endswith(GEOJSON_EXTENSIONS):
+        with open(vector_path, "r") as f:
+            features = json.load(f)["features"]
+        for i, feature in enumerate(features):
+            properties = feature.get("properties") or {}
+            if id_field is not None and id_field not in properties:
+                raise ValueError("Feature {} of '{}' has no '{}' property.".format(i, vector_path, id_field))
+            ids.append(properties[id_field] if id_field is not None else i)
+            geometries.append(shape(feature["geometry"]) if feature.get("geometry") else None)
+        return ids, geometries
+
+    if ogr is None:
+        raise RuntimeError("GDAL is required to read '{}'; GeoJSON files can be read without it.".format(vector_path))
+    dataset = ogr.Open(vector_path)
+    if dataset is None:
+        raise RuntimeError("GDAL is unable to open '{}'.".format(vector_path))
+    layer = dataset.GetLayer()
+    for i, feature in enumerate(layer):
+        if id_field is not None and feature.GetFieldIndex(id_field) < 0:
+            raise ValueError("Feature {} of '{}' has no '{}' field.".format(i, vector_path, id_field))
+        ids.append(feature.GetField(id_field) if id_field is not None else i)
+        geometry = feature.GetGeometryRef()
+        geometries.append(shapely.from_wkb(bytes(geometry.ExportToWkb())) if geometry is not None else None)
+    dataset = None
+    return ids, geometries
+
+
+@timed("raster", operation="rasterise_zones")
+def rasterise(geometries: Sequence[BaseGeometry], grid: GridDefinition) -> np.ndarray:
+    """
+    Labels each pixel of a grid with the geometry containing its centre, counting from 1.  Each pixel has one label, so
+    where geometries overlap the later one wins, and a warning is logged naming the overlapping geometries.  Only the
+    pixels within each geometry's bounds are tested.
+    :param geometries: shapely geometries in the grid's coordinate system; None or empty geometries label no pixels
+    :param grid: the grid to rasterise on to, which must be north-up (unrotated)
+    :return: a (height, width) array of labels, NO_ZONE outside every geometry
+    :raises ValueError: if the grid is rotated
+    """
+    x0, dx, rx, y0, ry, dy = grid.geotransform
+    if rx != 0 or ry != 0:
+        raise ValueError("Rotated grids aren't supported.")
+
+    labels = np.full((grid.height, grid.width), NO_ZONE, dtype=LABEL_DTYPE)
+    #   the number of pixels relabelled, and the (earlier, later) label pairs of the geometries overlapping there
+    overlap_pixels, overlaps = 0, set()
+    for label, geometry in enumerate(geometries, start=1):
+        if geometry is None or geometry.is_empty:
+            continue
+        minx, miny, maxx, maxy = geometry.bounds
+        c_first, c_last = sorted(((minx - x0) / dx, (maxx - x0) / dx))
+        r_first, r_last = sorted(((miny - y0) / dy, (maxy - y0) / dy))
+        c0, c1 = max(0, int(np.floor(c_first))), min(grid.width, int(np.ceil(c_last)))
+        r0, r1 = max(0, int(np.floor(r_first))), min(grid.height, int(np.ceil(r_last)))
+        if c0 >= c1 or r0 >= r1:
+            continue
+
+        shapely.prepare(geometry)
+        x = x0 + (np.arange(c0, c1) + 0.5) * dx
+        step = max(1, RASTERISE_BLOCK_PIXELS // (c1 - c0))
+        for r in range(r0, r1, step):
+            y = y0 + (np.arange(r, min(r + step, r1)) + 0.5) * dy
+            inside = shapely.intersects_xy(geometry, x[np.newaxis, :], y[:, np.newaxis])
+            window = labels[r:r + len(y), c0:c1]
+            earlier = window[inside]
+            earlier = earlier[earlier != NO_ZONE]
+            if len(earlier):
+                overlap_pixels += len(earlier)
+                overlaps.update((int(e), label) for e in np.unique(earlier))
+            window[inside] = label
+
+    if overlap_pixels:
+        pairs = ["{} and {}".format(a - 1, b - 1) for a, b in sorted(overlaps)]
+        if len(pairs) > 5:
+            pairs = pairs[:5] + ["{} more pairs".format(len(pairs) - 5)]
+        logger.warning("{} pixels are in more than one zone, and are only counted in the last: geometries {} overlap "
+                       "(numbered from 0).".format(overlap_pixels, ", ".join(pairs)))
+    return labels
+
+
+def _cache_path(cache_folder: str, key: tuple) -> str:
+    return os.path.join(cache_folder, "zones_{}.npz".format(hashlib.sha1(repr(key).encode("utf-8")).hexdigest()))
+
+
+@lru_cache(maxsize=8)
+def _load_zones(vector_path: str, vector_mtime_ns: int, id_field: str, grid: GridDefinition,
+                cache_folder: str) -> Zones:
+    key = (vector_path, vector_mtime_ns, id_field, grid)
+    path = _cache_path(cache_folder, key) if cache_folder is not None else None
+    if path is not None and os.path.isfile(path):
+        with np.load(path) as cached:
+            labels, ids = cached["labels"], cached["ids"]
+        logger.debug("Read zones of '{}' from '{}'.".format(vector_path, path))
+    else:
+        ids, geometries = read_zones(vector_path, id_field)
+        labels = rasterise(geometries, grid)
+        ids = np.asarray(ids)
+        if ids.dtype == object:
+            ids = ids.astype(str)
+        logger.debug("Rasterised {} zones of '{}'.".format(len(ids), vector_path))
+        if path is not None:
+            os.makedirs(cache_folder, exist_ok=True)
+            #   written aside and moved in to place, so concurrent callers never read a partial file
+            temporary_path = path + ".{}.tmp.npz".format(os.getpid())
+            np.savez_compressed(temporary_path, labels=labels, ids=ids)
+            os.replace(temporary_path, path)
+
+    labels.flags.writeable = False
+    return Zones(labels, ids, grid)
+
+
+def load_zones(vector_path: str, grid: Union[GridDefinition, str], id_field: str = None,
+               cache_folder: str = None) -> Zones:
+    """
+    Returns the zones of a vector layer rasterised on to a grid.  The label raster is made once for each layer and grid,
+    and cached in memory; with a 'cache_folder' it's also kept on disk for other processes and later runs.  The cache
+    is refreshed when the layer changes.
+
+    Each pixel belongs to at most one zone: where features overlap, i.e. nested catchments, the shared pixels are
+    counted in the later feature only and a warning is logged.  Layers of overlapping features should be split in to
+    layers without overlaps, and each loaded separately.
+    :param vector_path: path to a GeoJSON file, or any vector file GDAL can open, in the grid's coordinate system
+    :param grid: a GridDefinition, or the path of a raster on the grid
+    :param id_field: optional, the property holding each feature's identifier; features are numbered from 0 if omitted
+    :param cache_folder: optional, a folder to keep label rasters in
+    :return: Zones
+    """
+    if not isinstance(grid, GridDefinition):
+        grid = grid_of(grid)
+    grid = GridDefinition(grid.width, grid.height, tuple(grid.geotransform), grid.projection)
+    vector_path = os.path.abspath(vector_path)
+    cache_folder = os.path.abspath(cache_folder) if cache_folder is not None else None
+    return _load_zones(vector_path, os.stat(vector_path).st_mtime_ns, id_field, grid, cache_folder)
+
+
+class _Accumulator:
+    """
+    Accumulates per-zone statistics over blocks of pixels.  Each block's count, mean and sum of squared deviations are
+    found with 'np.bincount' and merged with the running totals (Chan et al.), which stays accurate for large values.
+    """
+
+    def __init__(self, zones: int):
+        size = zones + 1
+        self.count = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def update(self, labels: np.ndarray, values: np.ndarray) -> None:
+        size = len(self.count)
+        count = np.bincount(labels, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, np.bincount(labels, weights=values, minlength=size) / count, 0.0)
+            m2 = np.bincount(labels, weights=(values - mean[labels]) ** 2, minlength=size)
+
+            combined = self.count + count
+            delta = mean - self.mean
+            self.mean += np.where(combined > 0, delta * count / combined, 0.0)
+            self.m2 += m2 + np.where(combined > 0, delta ** 2 * self.count * count / combined, 0.0)
+        self.count = combined
+        np.minimum.at(self.min, labels, values)
+        np.maximum.at(self.max, labels, values)
+
+    def result(self, ids: np.ndarray) -> ZonalStats:
+        count = self.count[1:]
+        empty = count == 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2[1:] / count)
+        return ZonalStats(ids, count, *(np.where(empty, np.nan, s) for s in (self.mean[1:], self.min[1:],
+                                                                             self.max[1:], std)))
+
+
+def _open_source(source: Union[str, np.ndarray], band: int, grid: GridDefinition):
+    """
+    Returns a function reading rows [r0, r1) of a raster file or array, and its no data value
+    """
+    shape_of_grid = (grid.height, grid.width)
+    if isinstance(source, np.ndarray):
+        if source.shape != shape_of_grid:
+            raise ValueError("An array of shape {} isn't aligned with zones of shape {}.".format(source.shape,
+                                                                                               shape_of_grid))
+        return lambda r0, r1: source[r0:r1], None
+
+    if gdal is None:
+        raise RuntimeError("GDAL is required to read raster files.")
+    dataset = gdal.Open(source)
+    if dataset is None:
+        raise RuntimeError("GDAL is unable to open '{}'.".format(source))
+    if (dataset.RasterYSize, dataset.RasterXSize) != shape_of_grid or \
+            not np.allclose(dataset.GetGeoTransform(), grid.geotransform):
+        raise ValueError("'{}' isn't aligned with the zones' grid.".format(source))
+    raster_band = dataset.GetRasterBand(band)
+    #   the dataset is held by the closure, so it stays open while it's read
+    return lambda r0, r1: raster_band.ReadAsArray(0, r0, dataset.RasterXSize, r1 - r0), raster_band.GetNoDataValue()
+
+
+@timed("raster", operation="zonal_statistics")
+def zonal_statistics(sources: Union[str, np.ndarray, Iterable[Union[str, np.ndarray]]], zones: Zones, band: int = 1,
+                     nodata: float = None) -> List[ZonalStats]:
+    """
+    Computes the count, mean, min, max and standard deviation of the valid pixels of each zone, for any number of
+    rasters aligned with the zones.  The rasters are read together in blocks of rows, in one pass; blocks without any
+    zone pixels aren't read.  The cost grows with the number of pixels, not with the number of zones.
+    :param sources: raster file paths, or (height, width) arrays, or one of either
+    :param zones: the zones, from 'load_zones'
+    :param band: the (1-based) band read from raster files
+    :param nodata: optional, a value marking invalid pixels.  Each file's own no data value, and NaN, are also invalid.
+    :return: a ZonalStats for each source, in order
+    :raises ValueError: if a source isn't aligned with the zones
+    :raises RuntimeError: if a source is a file and GDAL isn't available or can't open it
+    """
+    sources = [sources] if isinstance(sources, (str, np.ndarray)) else list(sources)
+    readers = [_open_source(s, band, zones.grid) for s in sources]
+    accumulators = [_Accumulator(len(zones.ids)) for _ in sources]
+
+    rows, columns = zones.labels.shape
+    block_rows = max(1, BLOCK_BYTES // (columns * 8 * (len(sources) + 1)))
+    for r0 in range(0, rows, block_rows):
+        r1 = min(rows, r0 + block_rows)
+        labels = zones.labels[r0:r1].ravel()
+        in_zone = labels != NO_ZONE
+        if not in_zone.any():
+            continue
+        labels = labels[in_zone].astype(np.intp)
+
+        for (read, source_nodata), accumulator in zip(readers, accumulators):
+            values = read(r0, r1).ravel()[in_zone].astype(np.float64)
+            valid = np.isfinite(values)
+            for value in (nodata, source_nodata):
+                if value is not None:
+                    valid &= values != value
+            accumulator.update(labels[valid], values[valid])
+
+    return [accumulator.result(zones.ids) for accumulator in accumulators]
+
+
+def to_dataframe(stats: Sequence[ZonalStats], names: Sequence[str] = None) -> pd.DataFrame:
+    """
+    Converts zonal statistics to a long DataFrame with one row per source and zone
+    :param stats: the results of 'zonal_statistics'
+    :param names: optional, a name for each source, i.e. its date or path; sources are numbered from 0 if omitted
+    :return: a DataFrame with columns 'source', 'zone', 'count', 'mean', 'min', 'max' and 'std'
+    """
+    names = range(len(stats)) if names is None else names
+    return pd.concat([pd.DataFrame({"source": name, "zone": s.ids, "count": s.count, "mean": s.mean, "min": s.min,
+                                    "max": s.max, "std": s.std}) for name, s in zip(names, stats)],
+                     ignore_index=True)
@@ -0,0 +1,65 @@
+"""
+Benchmarks the vectorised day of year conversions against the scalar functions called in a Python loop, and
+vectorised date range generation against building the strings from a pandas date range.
+
+    python -m testing.benchmarks.bench_date_conversion --elements 10000000
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pixutils import date_conversion
+from pixutils.date_utils import date_range_strings
+
+#   the scalar functions are timed on a sample and the rate extrapolated, as a loop over 10^7 elements takes minutes
+SCALAR_SAMPLE = 100000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, default=10 ** 7, help="Number of array elements")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    years = rng.integers(1950, 2050, args.elements)
+    doys = rng.integers(1, 366, args.elements)
+    _, months, days = date_conversion.ymd_array(years, doys)
+    dates = date_conversion.doy_to_datetime64(years, doys)
+    sample = slice(0, min(SCALAR_SAMPLE, args.elements))
+
+    benchmarks = [
+        ("ymd", lambda: date_conversion.ymd_array(years, doys),
+         lambda: [date_conversion.ymd(y, n) for y, n in zip(years[sample].tolist(), doys[sample].tolist())]),
+        ("doy", lambda: date_conversion.doy_array(years, months, days),
+         lambda: [date_conversion.doy(y, m, d) for y, m, d in
+                  zip(years[sample].tolist(), months[sample].tolist(), days[sample].tolist())]),
+        ("doy_to_datetime64", lambda: date_conversion.doy_to_datetime64(years, doys), None),
+        ("datetime64_to_doy", lambda: date_conversion.datetime64_to_doy(dates), None),
+    ]
+
+    for label, vectorised, scalar in benchmarks:
+        start = time.perf_counter()
+        vectorised()
+        elapsed = time.perf_counter() - start
+        line = "{:<20} vectorised {:>8.3f}s  {:>14.0f} elements/s".format(label, elapsed, args.elements / elapsed)
+
+        if scalar is not None:
+            start = time.perf_counter()
+            scalar()
+            rate = (sample.stop - sample.start) / (time.perf_counter() - start)
+            line += "   scalar loop {:>12.0f} elements/s ({:.0f}x)".format(rate, args.elements / elapsed / rate)
+        print(line)
+
+    #   the string round trip previously used by 'eo_utilities.daterange'
+    def pandas_range():
+        return [str(t)[0:4] + str(t)[5:7] + str(t)[8:10] for t in pd.date_range(start="19000101", end="21001231")]
+
+    for label, function in [("pandas range", pandas_range),
+                            ("numpy range", lambda: date_range_strings("19000101", "21001231"))]:
+        start = time.perf_counter()
+        function()
+        print("{:<20} {:>8.4f}s for 200 years of YYYYMMDD strings".format(label, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
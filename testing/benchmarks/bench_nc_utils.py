@@ -0,0 +1,43 @@
+"""
+Benchmarks 'plotxyz' in scatter and binned modes, and 'bin_xyz' on its own, for a large number of points.
+
+    python -m testing.benchmarks.bench_nc_utils --points 1000000
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+from pixutils.nc_utils import bin_xyz, plotxyz
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=10 ** 6, help="Number of points")
+    parser.add_argument("--skip-scatter", action="store_true", help="Only time the binned mode")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    lons = rng.uniform(0, 360, args.points)
+    lats = rng.uniform(-90, 90, args.points)
+    values = np.sin(np.radians(lats)) + rng.normal(scale=0.1, size=args.points)
+
+    for statistic in ("mean", "max", "count"):
+        start = time.perf_counter()
+        bin_xyz(lons, lats, values, (720, 1440), (0, 360, -90, 90), statistic)
+        print("bin_xyz {:<6} {:>8.3f}s".format(statistic, time.perf_counter() - start))
+
+    modes = ["binned"] if args.skip_scatter else ["binned", "scatter"]
+    with tempfile.TemporaryDirectory() as folder:
+        for mode in modes:
+            pngfile = os.path.join(folder, "{}.png".format(mode))
+            start = time.perf_counter()
+            plotxyz(lons, lats, values, "Benchmark", "Value", pngfile, mode=mode)
+            print("plotxyz {:<7} {:>8.3f}s  {:>10} bytes".format(mode, time.perf_counter() - start,
+                                                                 os.path.getsize(pngfile)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Benchmarks making a quicklook of a large array by block-strided decimation against plotting the full array with
+matplotlib, as 'eo_utilities.show_img' did.
+
+    python -m testing.benchmarks.bench_quicklook --rows 10000 --columns 10000
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from pixutils.quicklook import decimate, quicklook
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=10000)
+    parser.add_argument("--size", type=int, default=512, help="Longest side of the quicklook")
+    args = parser.parse_args()
+
+    array = np.random.default_rng(0).random((args.rows, args.columns), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        decimate(array, args.size)
+        print("decimate          {:>8.3f}s".format(time.perf_counter() - start))
+
+        start = time.perf_counter()
+        quicklook(array, os.path.join(folder, "quicklook.png"), args.size)
+        print("quicklook         {:>8.3f}s".format(time.perf_counter() - start))
+
+        start = time.perf_counter()
+        fig = plt.figure()
+        ax = fig.add_axes([0, 0, 1, 1], frameon=False)
+        ax.imshow(array, cmap='Blues', origin='lower')
+        plt.savefig(os.path.join(folder, "full.png"))
+        plt.close(fig)
+        print("full array plot   {:>8.3f}s".format(time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
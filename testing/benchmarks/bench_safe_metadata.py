@@ -0,0 +1,46 @@
+"""
+Benchmarks harvesting product metadata from a directory of synthetic SAFE stubs, in a single process and across a
+process pool.
+
+    python -m testing.benchmarks.bench_safe_metadata --products 2000 --workers 4
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from pixutils.safe_metadata import MetadataStore, find_products
+from testing.unit_testing.fixtures import make_safe_stubs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000, help="Number of synthetic products")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: processor count)")
+    parser.add_argument("--zipped", action="store_true", help="Write zipped products rather than SAFE folders")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    try:
+        make_safe_stubs(folder, args.products, args.zipped)
+        paths = find_products(folder)
+
+        for label, workers in [("single process", 1), ("process pool", args.workers)]:
+            db_path = os.path.join(folder, "metadata_{}.sqlite".format(workers))
+            with MetadataStore(db_path) as store:
+                start = time.perf_counter()
+                store.harvest(paths, max_workers=workers)
+                elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                matches = store.query(max_cloud_cover=20)
+                query_elapsed = time.perf_counter() - start
+
+            print("{:<15} {:>8.3f}s  {:>10.0f} products/s  (query: {} rows in {:.4f}s)".format(
+                label, elapsed, len(paths) / elapsed, len(matches), query_elapsed))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
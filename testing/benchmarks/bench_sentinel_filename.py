@@ -0,0 +1,53 @@
+"""
+Benchmarks bulk Sentinel filename parsing into columns against a loop over the single filename parser.
+
+    python -m testing.benchmarks.bench_sentinel_filename --names 1000000
+"""
+import time
+import argparse
+import numpy as np
+from pixutils.sentinel_filename import parse_sentinel_filename, parse_sentinel_filenames
+
+
+def make_filenames(count: int, invalid_fraction: float = 0.01, seed: int = 0) -> list:
+    """
+    Generates 'count' synthetic Sentinel-1 filenames with random dates and orbits, a fraction of which are invalid
+    """
+    rng = np.random.default_rng(seed)
+    starts = np.datetime64("2015-01-01T00:00:00") + rng.integers(0, 8 * 365 * 86400, count).astype("timedelta64[s]")
+    orbits = rng.integers(1, 60000, count)
+    names = []
+    for start, orbit in zip(starts.astype(object), orbits):
+        stop = start.replace(second=(start.second + 25) % 60)
+        names.append("S1A_IW_GRDH_1SDV_{:%Y%m%dT%H%M%S}_{:%Y%m%dT%H%M%S}_{:06}_03BA21_8760.SAFE.zip"
+                     .format(start, stop, orbit))
+    for i in rng.choice(count, int(count * invalid_fraction), replace=False):
+        names[i] = "LC08_L1TP_200023_20180505_20180517_01_T1.tar"
+    return names
+
+
+def per_name_loop(names: list) -> list:
+    results = []
+    for name in names:
+        try:
+            results.append(parse_sentinel_filename(name))
+        except ValueError:
+            results.append(None)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=200000, help="Number of synthetic filenames")
+    args = parser.parse_args()
+
+    names = make_filenames(args.names)
+    for label, function in [("per-name loop", per_name_loop), ("bulk columns", parse_sentinel_filenames)]:
+        start = time.perf_counter()
+        function(names)
+        elapsed = time.perf_counter() - start
+        print("{:<15} {:>8.3f}s  {:>12.0f} names/s".format(label, elapsed, len(names) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
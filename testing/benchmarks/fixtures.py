@@ -0,0 +1,128 @@
+"""
+Synthetic data and local stand-ins for remote services, used by 'run_benchmarks'.
+
+ * 'make_era5_netcdf' and 'make_geotiff' write synthetic grids of any size.
+ * 'CeresServer' is a local HTTP server standing in for the CERES archive; pass its 'url' as the 'server' of
+   'ceres_download.download_ceres_netflux'.
+ * 'FakeCdsClient' stands in for 'cdsapi.Client', writing synthetic netCDF files instead of downloading them.
+ * 'fake_sentinelsat' (from the unit test fixtures) returns a stand-in for the 'sentinelsat' module whose
+   'SentinelAPI' serves synthetic products.
+"""
+import os
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from testing.unit_testing.fixtures import fake_sentinelsat, import_s2_retrieval, write_era5_netcdf
+
+#   GDAL is only needed to write synthetic GeoTIFFs
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+#   the short names written by 'FakeCdsClient' for the variables requested from it
+CDS_SHORT_NAMES = {
+    "10m_u_component_of_wind": "u10",
+    "10m_v_component_of_wind": "v10",
+    "2m_temperature": "t2m",
+    "skin_temperature": "skt",
+    "total_precipitation": "tp",
+}
+
+
+def make_era5_netcdf(path: str, shape=(24, 181, 360), variables=("t2m",), lat_name: str = "latitude",
+                     lon_name: str = "longitude", chunk_steps: int = 24, seed: int = 0) -> str:
+    """
+    Writes a synthetic ERA5-like netCDF file of hourly global fields
+    :param shape: the (time, latitude, longitude) shape of each variable
+    :param variables: the short names of the variables
+    :param chunk_steps: the number of time steps in a chunk; chunks span the whole grid
+    :return: the path
+    """
+    rng = np.random.default_rng(seed)
+    steps, rows, columns = shape
+    return write_era5_netcdf(path, variables, lats=np.linspace(90, -90, rows),
+                             lons=np.linspace(0, 360, columns, endpoint=False), times=np.arange(steps),
+                             values=lambda name, start, stop: (280 + rng.standard_normal((stop - start, rows, columns))
+                                                               ).astype(np.float32),
+                             lat_name=lat_name, lon_name=lon_name, chunksizes=(min(chunk_steps, steps), rows, columns),
+                             zlib=True, complevel=1, units="K")
+
+
+def make_geotiff(path: str, size: int = 1024, bands: int = 1, seed: int = 0) -> str:
+    """
+    Writes a synthetic float32 GeoTIFF of size x size pixels on a global geographic grid
+    :raises RuntimeError: if GDAL isn't available
+    """
+    if gdal is None:
+        raise RuntimeError("GDAL is required to write GeoTIFFs.")
+    rng = np.random.default_rng(seed)
+    dataset = gdal.GetDriverByName("GTiff").Create(path, size, size, bands, gdal.GDT_Float32, ["TILED=YES"])
+    dataset.SetGeoTransform((-180, 360 / size, 0, 90, 0, -180 / size))
+    for b in range(bands):
+        dataset.GetRasterBand(b + 1).WriteArray(rng.uniform(-10, 10, (size, size)).astype(np.float32))
+    dataset = None
+    return path
+
+
+class CeresServer:
+    """
+    A local HTTP server standing in for the CERES archive.  Every GET returns the same synthetic payload.
+    """
+
+    def __init__(self, payload_bytes: int = 1024 * 1024):
+        payload = np.random.default_rng(0).integers(0, 256, payload_bytes, dtype=np.uint8).tobytes()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "image/tiff")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self.url = "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    def __enter__(self) -> "CeresServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeCdsClient:
+    """
+    Stands in for 'cdsapi.Client'.  'retrieve' writes a synthetic file for the request; 'service' and 'download'
+    emulate the daily statistics workflow used by 'download_era5_reanalysis_data', writing to the working directory.
+    """
+    #   the (time, latitude, longitude) shape of retrieved files; set before use
+    shape = (24, 181, 360)
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def _short_names(self, variables):
+        variables = [variables] if isinstance(variables, str) else list(variables or ["2m_temperature"])
+        return [CDS_SHORT_NAMES.get(v, v) for v in variables]
+
+    def retrieve(self, name, request, target):
+        make_era5_netcdf(target, self.shape, self._short_names(request.get("variable")))
+
+    def service(self, name, params):
+        variables = self._short_names(params["kwargs"]["variable"])
+        #   the daily workflow renames the last 39 characters of the location to its output file
+        return [{"location": "https://cds.example/era_{}.nc".format(uuid.uuid4().hex),
+                 "variables": variables}]
+
+    def download(self, result):
+        steps = 28
+        make_era5_netcdf(result[0]["location"][-39:], (steps,) + tuple(self.shape[1:]), result[0]["variables"],
+                         lat_name="lat", lon_name="lon", chunk_steps=steps)
@@ -0,0 +1,408 @@
+"""
+Runs the benchmark suite: the downloaders (against local stand-ins), ERA5 merge and derived variables, raster
+operations, zonal statistics, point extraction, filename parsing and date conversion, each at several sizes of
+synthetic data.  Each case runs in a fresh process so its peak RSS is its own.  Results are written as JSON, and
+compared with an earlier run to find regressions.
+
+    python -m testing.benchmarks.run_benchmarks
+    python -m testing.benchmarks.run_benchmarks --sizes small --filter ceres --repeat 3
+    python -m testing.benchmarks.run_benchmarks --compare latest --threshold 1.2
+"""
+import os
+import re
+import sys
+import glob
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+import importlib.util
+import multiprocessing
+from collections import namedtuple
+from datetime import datetime, date, time as dt_time
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+from testing.benchmarks import fixtures
+
+#   the folder results are written to by default
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+#   the sizes each case can be run at
+SIZES = ("small", "medium", "large")
+
+#   a benchmark case.  'setup(folder, size)' prepares the data in a temporary folder and returns (state, items), where
+#   items is the number of units (i.e. bytes or rows) processed by each call of 'run(state)'.  The case is skipped if
+#   any module in 'requires' can't be imported.  'teardown(state)', if given, releases what setup started (i.e. a
+#   server) once the case has run.
+Case = namedtuple("Case", ["name", "unit", "sizes", "setup", "run", "requires", "teardown"], defaults=(None,))
+
+
+def _available(module: str) -> bool:
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+#   ----------------------------------------------------------------------------------------------------------------
+#   date conversion and filename parsing
+
+def _setup_date_conversion(folder: str, size: int):
+    rng = np.random.default_rng(0)
+    return (rng.integers(1950, 2050, size), rng.integers(1, 366, size)), size
+
+
+def _run_date_conversion(state):
+    from pixutils import date_conversion
+    years, doys = state
+    _, months, days = date_conversion.ymd_array(years, doys)
+    date_conversion.doy_array(years, months, days)
+
+
+def _setup_filename_parsing(folder: str, size: int):
+    from testing.benchmarks.bench_sentinel_filename import make_filenames
+    return make_filenames(size), size
+
+
+def _run_filename_parsing(names):
+    from pixutils.sentinel_filename import parse_sentinel_filenames
+    parse_sentinel_filenames(names)
+
+
+#   ----------------------------------------------------------------------------------------------------------------
+#   downloaders
+
+def _setup_ceres(folder: str, size: int):
+    server = fixtures.CeresServer(size).__enter__()
+    return {"folder": folder, "server": server, "calls": 0}, size
+
+
+def _teardown_ceres(state):
+    state["server"].__exit__(None, None, None)
+
+
+def _run_ceres(state):
+    from pixutils.ceres_download import download_ceres_netflux
+    state["calls"] += 1
+    output = os.path.join(state["folder"], str(state["calls"]))
+    os.makedirs(output)
+    download_ceres_netflux(output, 2020, 1, 1, server=state["server"].url)
+
+
+def _setup_era5(folder: str, shape):
+    from pixutils import era_download
+    fixtures.FakeCdsClient.shape = shape
+    era_download.cdsapi.Client = fixtures.FakeCdsClient
+    return {"folder": folder, "calls": 0}, int(np.prod(shape))
+
+
+def _run_era5_hourly(state):
+    from pixutils.era_download import download_era5_reanalysis_data
+    state["calls"] += 1
+    download_era5_reanalysis_data(["2m_temperature"], [date(2020, 1, 1)], [dt_time(h) for h in range(24)],
+                                  "[0, 0, 0, 0]", "hourly",
+                                  os.path.join(state["folder"], "era5_{}.nc".format(state["calls"])))
+
+
+def _run_era5_daily_merge(state):
+    from pixutils.era_download import download_era5_reanalysis_data
+    state["calls"] += 1
+    os.chdir(state["folder"])
+    download_era5_reanalysis_data(["2m_temperature", "skin_temperature"], [date(2020, 1, 1)], [dt_time(12)],
+                                  "[60, -10, 40, 10]", "daily",
+                                  os.path.join(state["folder"], "era5_{}.nc".format(state["calls"])))
+
+
+def _setup_s2(folder: str, products: int):
+    sentinelsat = fixtures.fake_sentinelsat(products, payload_bytes=256 * 1024)
+    s2_retrieval = fixtures.import_s2_retrieval(sentinelsat)
+    auth_path, tiles_path, geo_path = (os.path.join(folder, n) for n in ("auth.txt", "tiles.csv", "aoi.geojson"))
+    for path, text in [(auth_path, "user,password\n"), (tiles_path, "Scenes\nS2A31UCS\n"), (geo_path, "{}")]:
+        with open(path, "w") as f:
+            f.write(text)
+    return {"folder": folder, "module": s2_retrieval, "paths": (auth_path, tiles_path, geo_path), "calls": 0}, products
+
+
+def _run_s2(state):
+    state["calls"] += 1
+    run_folder = os.path.join(state["folder"], str(state["calls"]))
+    os.makedirs(run_folder)
+    auth_path, tiles_path, geo_path = state["paths"]
+    state["module"].s2_download("20200601", "20200831", os.path.join(run_folder, "zip"),
+                                os.path.join(run_folder, "safe"), (0, 100), auth_path, tiles_path, geo_path,
+                                "S2MSI2A", logging.getLogger("s2_benchmark"))
+
+
+#   ----------------------------------------------------------------------------------------------------------------
+#   gridded data
+
+def _setup_netcdf(folder: str, shape):
+    path = fixtures.make_era5_netcdf(os.path.join(folder, "era5.nc"), shape, ("u10", "v10", "t2m"))
+    return {"path": path}, int(np.prod(shape))
+
+
+def _run_derive(state):
+    from pixutils.era_download import derive_variables
+    derive_variables(state["path"], ["wind_speed_10m", "temperature_2m_celsius"])
+
+
+def _run_point_extraction(state):
+    import netCDF4
+    from pixutils.point_extraction import extract_netcdf
+    rng = np.random.default_rng(0)
+    with netCDF4.Dataset(state["path"]) as nc:
+        extract_netcdf(nc, "t2m", rng.uniform(-90, 90, 10000), rng.uniform(-180, 180, 10000), "bilinear")
+
+
+def _run_read_subset(state):
+    import netCDF4
+    from pixutils.nc_utils import read_subset
+    with netCDF4.Dataset(state["path"]) as nc:
+        read_subset(nc, "t2m", bbox=(-10, 40, 30, 60))
+
+
+def _setup_geotiff(folder: str, size: int):
+    path = fixtures.make_geotiff(os.path.join(folder, "input.tif"), size)
+    return {"folder": folder, "path": path, "calls": 0}, size * size
+
+
+def _run_compress_geotiff(state):
+    from pixutils.raster_operations import compress_geotiff
+    state["calls"] += 1
+    compress_geotiff(state["path"], os.path.join(state["folder"], "compressed_{}.tif".format(state["calls"])))
+
+
+def _run_clamp_raster(state):
+    from pixutils.raster_operations import clamp_raster, ValueRange
+    state["calls"] += 1
+    clamp_raster(state["path"], os.path.join(state["folder"], "clamped_{}.tif".format(state["calls"])),
+                 ValueRange(-5, 5))
+
+
+def _run_quicklook(state):
+    from pixutils.quicklook import quicklook
+    quicklook(state["path"], os.path.join(state["folder"], "quicklook.png"))
+
+
+def _setup_zonal_statistics(folder: str, size: int):
+    from shapely.geometry import box
+    from pixutils.zonal_stats import GridDefinition, Zones, rasterise
+    rng = np.random.default_rng(0)
+    grid = GridDefinition(size, size, (0.0, 1.0, 0.0, float(size), 0.0, -1.0), "")
+    corners = rng.uniform(0, size, (1000, 2))
+    sides = rng.uniform(size / 100, size / 20, (1000, 2))
+    labels = rasterise([box(x, y, x + w, y + h) for (x, y), (w, h) in zip(corners, sides)], grid)
+    rasters = [rng.standard_normal((size, size)).astype(np.float32) for _ in range(4)]
+    return (Zones(labels, np.arange(1000), grid), rasters), size * size * len(rasters)
+
+
+def _run_zonal_statistics(state):
+    from pixutils.zonal_stats import zonal_statistics
+    zones, rasters = state
+    zonal_statistics(rasters, zones)
+
+
+NETCDF_SIZES = {"small": (24, 181, 360), "medium": (24, 721, 1440), "large": (168, 721, 1440)}
+GEOTIFF_SIZES = {"small": 1024, "medium": 4096, "large": 10240}
+
+CASES = [
+    Case("date_conversion", "dates", {"small": 10 ** 5, "medium": 10 ** 6, "large": 10 ** 7},
+         _setup_date_conversion, _run_date_conversion, ()),
+    Case("filename_parsing", "names", {"small": 10 ** 4, "medium": 10 ** 5, "large": 10 ** 6},
+         _setup_filename_parsing, _run_filename_parsing, ()),
+    Case("ceres_download", "bytes", {"small": 2 ** 20, "medium": 2 ** 24, "large": 2 ** 27},
+         _setup_ceres, _run_ceres, (), _teardown_ceres),
+    Case("era5_download", "cells", NETCDF_SIZES, _setup_era5, _run_era5_hourly, ("cdsapi",)),
+    Case("era5_daily_merge", "cells", {"small": (28, 91, 181), "medium": (28, 181, 360), "large": (28, 721, 1440)},
+         _setup_era5, _run_era5_daily_merge, ("cdsapi",)),
+    Case("s2_download", "products", {"small": 10, "medium": 50, "large": 200}, _setup_s2, _run_s2, ()),
+    Case("derive_variables", "cells", NETCDF_SIZES, _setup_netcdf, _run_derive, ()),
+    Case("point_extraction", "cells", NETCDF_SIZES, _setup_netcdf, _run_point_extraction, ()),
+    Case("read_subset", "cells", NETCDF_SIZES, _setup_netcdf, _run_read_subset, ()),
+    Case("zonal_statistics", "pixels", {"small": 1024, "medium": 4096, "large": 8192},
+         _setup_zonal_statistics, _run_zonal_statistics, ()),
+    Case("compress_geotiff", "pixels", GEOTIFF_SIZES, _setup_geotiff, _run_compress_geotiff, ("osgeo", "rsgislib")),
+    Case("clamp_raster", "pixels", GEOTIFF_SIZES, _setup_geotiff, _run_clamp_raster, ("osgeo", "rsgislib")),
+    Case("quicklook", "pixels", GEOTIFF_SIZES, _setup_geotiff, _run_quicklook, ("osgeo",)),
+]
+
+
+#   ----------------------------------------------------------------------------------------------------------------
+#   running and recording
+
+def _peak_rss_mb() -> float:
+    #   ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_case(name: str, size: str, repeat: int, warmup: int = 1) -> dict:
+    """
+    Runs one case at one size, in the current process
+    :param warmup: the number of untimed calls made first, so the timings don't include importing the modules under
+    test or other one-off costs
+    :return: the timings of each call, the number of items processed per call and the peak RSS
+    """
+    case = next(c for c in CASES if c.name == name)
+    #   several modules log each file they handle, which would swamp the results and be timed with them
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    folder = tempfile.mkdtemp(prefix="pixutils_benchmark_")
+    try:
+        state, items = case.setup(folder, case.sizes[size])
+        try:
+            baseline_rss = _peak_rss_mb()
+            for _ in range(warmup):
+                case.run(state)
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                case.run(state)
+                times.append(time.perf_counter() - start)
+        finally:
+            if case.teardown is not None:
+                case.teardown(state)
+        return {"times": times, "items": items, "peak_rss_mb": _peak_rss_mb(), "setup_rss_mb": baseline_rss}
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_case(case: Case, size: str, repeat: int, warmup: int = 1) -> dict:
+    """
+    Runs one case at one size in a fresh process, so the peak RSS measured is the case's own
+    :param warmup: the number of untimed calls made before the timed ones
+    :return: a result record
+    """
+    record = {"name": case.name, "size": size, "unit": case.unit, "repeat": repeat, "warmup": warmup}
+    missing = [m for m in case.requires if not _available(m)]
+    if missing:
+        record["skipped"] = "requires {}".format(", ".join(missing))
+        return record
+
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        try:
+            measured = pool.apply(_run_case, (case.name, size, repeat, warmup))
+        except Exception as e:
+            record["error"] = "{}: {}".format(type(e).__name__, e)
+            return record
+
+    times = np.array(measured["times"])
+    record.update(median=float(np.median(times)), min=float(times.min()),
+                  p95=float(np.percentile(times, 95)), throughput=measured["items"] / float(np.median(times)),
+                  items=measured["items"], peak_rss_mb=measured["peak_rss_mb"],
+                  setup_rss_mb=measured["setup_rss_mb"])
+    return record
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def machine_info() -> dict:
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "processor": platform.processor(), "cpus": os.cpu_count(), "commit": _git_commit()}
+
+
+def save_results(results: List[dict], folder: str = RESULTS_FOLDER) -> str:
+    """
+    Writes a run's results to '<folder>/<timestamp>.json'
+    :return: the path of the results file
+    """
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "{:%Y%m%dT%H%M%S}.json".format(datetime.now()))
+    with open(path, "w") as f:
+        json.dump({"created": datetime.now().isoformat(timespec="seconds"), "machine": machine_info(),
+                   "results": results}, f, indent=1)
+    return path
+
+
+def load_results(path: str) -> List[dict]:
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def latest_results(folder: str = RESULTS_FOLDER, exclude: str = None) -> str:
+    """
+    Returns the most recent results file in a folder, other than 'exclude', or None
+    """
+    paths = sorted(p for p in glob.glob(os.path.join(folder, "*.json")) if p != exclude)
+    return paths[-1] if paths else None
+
+
+def compare_results(current: List[dict], previous: List[dict], threshold: float = 1.2) -> List[Tuple[dict, float]]:
+    """
+    Compares the median times of two runs
+    :param threshold: the ratio of current to previous median time above which a case has regressed
+    :return: a list of (record, ratio) for the cases measured in both runs, with ratio > threshold a regression
+    """
+    earlier = {(r["name"], r["size"]): r for r in previous if "median" in r}
+    return [(r, r["median"] / earlier[(r["name"], r["size"])]["median"]) for r in current
+            if "median" in r and (r["name"], r["size"]) in earlier]
+
+
+def format_record(record: dict) -> str:
+    label = "{:<18} {:<7}".format(record["name"], record["size"])
+    if "skipped" in record:
+        return "{} skipped ({})".format(label, record["skipped"])
+    if "error" in record:
+        return "{} failed ({})".format(label, record["error"])
+    return "{} median {:>9.4f}s  p95 {:>9.4f}s  {:>14.5g} {}/s  peak RSS {:>8.1f} MB".format(
+        label, record["median"], record["p95"], record["throughput"], record["unit"], record["peak_rss_mb"])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Runs the pixutils benchmark suite.")
+    parser.add_argument("--sizes", nargs="+", choices=SIZES, default=["small", "medium"], help="Data sizes to run")
+    parser.add_argument("--filter", default=None, help="Only run cases whose name matches this regular expression")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed calls per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Number of untimed calls made before the timed ones")
+    parser.add_argument("--output", default=RESULTS_FOLDER, help="Folder results are written to")
+    parser.add_argument("--compare", default=None,
+                        help="A results file to compare with, or 'latest' for the previous run in the output folder")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="Ratio of median times above which a case is reported as a regression")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args()
+
+    cases = [c for c in CASES if args.filter is None or re.search(args.filter, c.name)]
+    if args.list:
+        for case in cases:
+            print("{:<18} {}".format(case.name, ", ".join("{}={}".format(k, v) for k, v in case.sizes.items())))
+        return 0
+
+    logging.basicConfig(level=logging.WARNING)
+    results = []
+    for case in cases:
+        for size in args.sizes:
+            record = run_case(case, size, args.repeat, args.warmup)
+            print(format_record(record), flush=True)
+            results.append(record)
+
+    path = save_results(results, args.output)
+    print("Results were saved to '{}'.".format(path))
+
+    previous = latest_results(args.output, exclude=path) if args.compare == "latest" else args.compare
+    if previous is None:
+        return 0
+    regressions = 0
+    print("Compared with '{}':".format(previous))
+    for record, ratio in compare_results(results, load_results(previous), args.threshold):
+        regressed = ratio > args.threshold
+        regressions += regressed
+        print("{:<18} {:<7} {:>6.2f}x{}".format(record["name"], record["size"], ratio,
+                                                "  REGRESSION" if regressed else ""))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Test data shared by the unit tests and the benchmarks.
+"""
+import os
+import sys
+import uuid
+import types
+import zipfile
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+import netCDF4
+
+MTD_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<n1:Level-1C_User_Product xmlns:n1="https://psd-14.sentinel2.eo.esa.int/PSD/User_Product_Level-1C.xsd">
+<n1:General_Info>
+<Product_Info>
+<PRODUCT_START_TIME>{sensing_time}</PRODUCT_START_TIME>
+<PRODUCT_URI>{title}.SAFE</PRODUCT_URI>
+<PROCESSING_LEVEL>Level-1C</PROCESSING_LEVEL>
+<PRODUCT_TYPE>S2MSI1C</PRODUCT_TYPE>
+<PROCESSING_BASELINE>02.09</PROCESSING_BASELINE>
+<GENERATION_TIME>2020-06-17T12:56:33.000Z</GENERATION_TIME>
+<Datatake datatakeIdentifier="GS2A_20200617T105031_026000_N02.09">
+<SPACECRAFT_NAME>Sentinel-2A</SPACECRAFT_NAME>
+<SENSING_ORBIT_NUMBER>51</SENSING_ORBIT_NUMBER>
+</Datatake>
+</Product_Info>
+<Product_Image_Characteristics>
+{padding}
+</Product_Image_Characteristics>
+</n1:General_Info>
+<n1:Quality_Indicators_Info>
+<Cloud_Coverage_Assessment>{cloud_cover}</Cloud_Coverage_Assessment>
+</n1:Quality_Indicators_Info>
+</n1:Level-1C_User_Product>
+"""
+
+#   real metadata files hold a few hundred lines of band and geometry information before the cloud cover
+#   the time coordinate units of ERA5-like files
+ERA5_TIME_UNITS = "hours since 2020-06-01 00:00:00"
+
+PADDING = "\n".join('<Spectral_Information bandId="{0}"><RESOLUTION>10</RESOLUTION></Spectral_Information>'.format(i)
+                    for i in range(200))
+
+
+def make_safe_stubs(folder: str, count: int, zipped: bool = False) -> None:
+    """
+    Writes 'count' synthetic SAFE folders (or zipped SAFE folders) containing only a product metadata file
+    """
+    for i in range(count):
+        title = "S2A_MSIL1C_20200617T{:06}_N0209_R051_T30UXC_20200617T125633".format(i)
+        mtd = MTD_TEMPLATE.format(title=title, sensing_time="2020-06-17T10:50:31.024Z", cloud_cover=i % 100,
+                                  padding=PADDING)
+        if zipped:
+            with zipfile.ZipFile(os.path.join(folder, title + ".zip"), "w") as zip_ref:
+                zip_ref.writestr(title + ".SAFE/MTD_MSIL1C.xml", mtd)
+        else:
+            os.mkdir(os.path.join(folder, title + ".SAFE"))
+            with open(os.path.join(folder, title + ".SAFE", "MTD_MSIL1C.xml"), "w") as f:
+                f.write(mtd)
+
+
+def write_era5_netcdf(path: str, variables=("t2m",), lats=np.linspace(55.0, 50.0, 6), lons=np.linspace(-5.0, 2.0, 8),
+                      times=np.arange(24), values: Callable[[str, int, int], np.ndarray] = None,
+                      lat_name: str = "latitude", lon_name: str = "longitude", dtype: str = "f4",
+                      chunksizes=None, contiguous: bool = False, zlib: bool = False, complevel: int = 4,
+                      scale_factor: float = None, add_offset: float = None, units: str = None,
+                      attributes: dict = None) -> str:
+    """
+    Writes an ERA5-like netCDF file of (time, latitude, longitude) fields on a regular grid
+    :param lats: the latitudes, descending as in ERA5 files
+    :param times: the time steps, in ERA5_TIME_UNITS
+    :param values: optional, 'values(name, start, stop)' returns the field of a variable for time steps start to stop.
+    Fields are written a chunk of time steps at a time, so large files needn't fit in memory.  Zeros if omitted.
+    :param dtype: the type the fields are stored as
+    :param chunksizes: optional, the (time, latitude, longitude) chunk sizes
+    :param contiguous: store the fields contiguously; the time dimension is then fixed rather than unlimited
+    :param scale_factor: optional, the scale factor of packed fields
+    :param add_offset: optional, the offset of packed fields
+    :param units: optional, the units of the fields
+    :param attributes: optional, global attributes
+    :return: the path
+    """
+    lats, lons, times = np.asarray(lats), np.asarray(lons), np.asarray(times)
+    with netCDF4.Dataset(path, "w") as nc:
+        nc.setncatts(attributes or {})
+        nc.createDimension("time", times.size if contiguous else None)
+        nc.createDimension(lat_name, lats.size)
+        nc.createDimension(lon_name, lons.size)
+
+        t = nc.createVariable("time", "i4", ("time",))
+        t.units = ERA5_TIME_UNITS
+        t.calendar = "gregorian"
+        t[:] = times
+
+        lat = nc.createVariable(lat_name, "f4", (lat_name,))
+        lat.units = "degrees_north"
+        lat[:] = lats
+
+        lon = nc.createVariable(lon_name, "f4", (lon_name,))
+        lon.units = "degrees_east"
+        lon[:] = lons
+
+        step = chunksizes[0] if chunksizes else max(1, times.size)
+        for name in variables:
+            v = nc.createVariable(name, dtype, ("time", lat_name, lon_name), chunksizes=chunksizes,
+                                  contiguous=contiguous, zlib=zlib, complevel=complevel)
+            for attribute, value in [("units", units), ("scale_factor", scale_factor), ("add_offset", add_offset)]:
+                if value is not None:
+                    v.setncattr(attribute, value)
+            for start in range(0, times.size, step):
+                stop = min(start + step, times.size)
+                v[start:stop] = values(name, start, stop) if values is not None else \
+                    np.zeros((stop - start, lats.size, lons.size))
+    return path
+
+
+def fake_sentinelsat(products: int = 20, payload_bytes: int = 1024 * 1024, tile: str = "31UCS",
+                     start: str = "20200601") -> types.ModuleType:
+    """
+    Creates a stand-in for the 'sentinelsat' module, whose SentinelAPI finds 'products' Sentinel-2 products on one
+    tile, a day apart from 'start', and downloads each as a zip holding a .SAFE folder with a 'payload_bytes' file
+    """
+    first = np.datetime64("{}-{}-{}".format(start[:4], start[4:6], start[6:]))
+    catalogue = OrderedDict()
+    for i in range(products):
+        day = str(first + np.timedelta64(i, "D")).replace("-", "")
+        title = "S2A_MSIL2A_{d}T103031_N0214_R108_T{t}_{d}T134224".format(d=day, t=tile)
+        catalogue[uuid.UUID(int=i).hex] = {"title": title, "size": payload_bytes}
+    payload = np.random.default_rng(0).integers(0, 256, payload_bytes, dtype=np.uint8).tobytes()
+
+    class SentinelAPI:
+        def __init__(self, user, password, api_url=None, **kwargs):
+            pass
+
+        def query(self, area=None, date=None, **kwargs):
+            return OrderedDict((k, dict(v)) for k, v in catalogue.items())
+
+        def get_product_odata(self, key):
+            return dict(catalogue[key], id=key)
+
+        def download(self, key, directory_path="."):
+            title = catalogue[key]["title"]
+            path = os.path.join(directory_path, title + ".zip")
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as z:
+                z.writestr("{}.SAFE/GRANULE/IMG_DATA/B04.jp2".format(title), payload)
+            return dict(catalogue[key], id=key, path=path)
+
+    module = types.ModuleType("sentinelsat")
+    module.SentinelAPI = SentinelAPI
+    module.read_geojson = lambda path: {"type": "Polygon", "coordinates": [[[0, 49], [3, 49], [3, 51], [0, 51],
+                                                                             [0, 49]]]}
+    module.geojson_to_wkt = lambda geojson: "POLYGON ((0 49, 3 49, 3 51, 0 51, 0 49))"
+    return module
+
+
+def import_s2_retrieval(sentinelsat: types.ModuleType):
+    """
+    Imports 's2_retrieval' with its 'sentinelsat' module replaced by a stand-in, i.e. from 'fake_sentinelsat'.  The
+    stand-in is only registered as 'sentinelsat' when the real package isn't installed.
+    """
+    try:
+        import sentinelsat as _
+    except ImportError:
+        sys.modules["sentinelsat"] = sentinelsat
+    from pixutils import s2_retrieval
+    s2_retrieval.sla = sentinelsat
+    return s2_retrieval
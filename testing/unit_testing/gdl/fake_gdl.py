@@ -0,0 +1,83 @@
+"""
+A stand-in for the GDL interpreter, reading statements from stdin.  Only the statements used by the tests are
+understood:
+
+    .compile <file>     compiles the 'pro' blocks in a file
+    .reset_session      forgets variables and compiled procedures
+    cd, '<dir>'         changes directory
+    print, <value>      prints a quoted string or a variable to stdout
+    printf, -2, <value> prints a quoted string or a variable to stderr
+    flush, ...          flushes stdout and stderr
+    sleep, <seconds>    waits
+    crash, <code>       exits immediately with the given code
+    <name> = <value>    assigns a quoted string or an integer to a variable
+    <name>              calls a compiled procedure
+    exit[, status=<n>]  exits with the given code, or 0
+"""
+import os
+import re
+import sys
+import time
+
+variables = {}
+procedures = {}
+
+
+def value_of(token: str) -> str:
+    token = token.strip()
+    if token[:1] in ("'", '"'):
+        return token[1:-1]
+    if token.lower() in variables:
+        return variables[token.lower()]
+    return token
+
+
+def compile_file(filename: str) -> None:
+    with open(filename, "r") as f:
+        source = f.read()
+    for name, body in re.findall(r"^\s*pro\s+(\w+)(.*?)^\s*end", source, re.MULTILINE | re.DOTALL | re.IGNORECASE):
+        procedures[name.lower()] = [line.strip() for line in body.splitlines() if line.strip()]
+        print("% Compiled module: {}.".format(name.upper()))
+
+
+def execute(statement: str) -> None:
+    command, _, args = statement.partition(",")
+    command = command.strip().lower()
+    args = [a.strip() for a in args.split(",")] if args else []
+
+    if statement.lower().startswith(".compile"):
+        compile_file(statement.split(None, 1)[1])
+    elif statement.lower() == ".reset_session":
+        variables.clear()
+        procedures.clear()
+    elif command == "cd":
+        os.chdir(value_of(args[0]))
+    elif command == "print":
+        print(value_of(args[0]))
+    elif command == "printf" and args[0] == "-2":
+        print(value_of(args[1]), file=sys.stderr)
+    elif command == "flush":
+        sys.stdout.flush()
+        sys.stderr.flush()
+    elif command == "sleep":
+        time.sleep(float(args[0]))
+    elif command == "crash":
+        sys.stdout.flush()
+        os._exit(int(args[0]))
+    elif command == "exit":
+        status = [a.split("=", 1)[1] for a in args if a.lower().startswith("status=")]
+        sys.stdout.flush()
+        sys.exit(int(status[0]) if status else 0)
+    elif "=" in statement:
+        name, value = statement.split("=", 1)
+        variables[name.strip().lower()] = value_of(value)
+    elif command in procedures:
+        for line in procedures[command]:
+            execute(line)
+    else:
+        print("% Attempt to call undefined procedure: '{}'.".format(command.upper()), file=sys.stderr)
+
+
+for line in sys.stdin:
+    if line.strip():
+        execute(line.strip())
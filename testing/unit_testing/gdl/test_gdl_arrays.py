@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from pixutils.gdl.gdl_arrays import *
+
+
+class TestExchangeFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "a.raw")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_round_trip(self):
+        """
+        Tests that arrays are written after a fixed size header and mapped back unchanged
+        """
+        for dtype in [np.uint8, np.int16, np.uint16, np.int32, np.float32, np.float64, np.int64, np.complex64]:
+            array = (np.arange(24).reshape(2, 3, 4) % 7).astype(dtype)
+            write_array(self.path, array)
+
+            self.assertEqual(HEADER_SIZE + array.nbytes, os.path.getsize(self.path))
+            self.assertEqual(ArrayHeader(np.dtype(dtype), (2, 3, 4)), read_header(self.path))
+            mapped = open_array(self.path)
+            self.assertIsInstance(mapped, np.memmap)
+            np.testing.assert_array_equal(array, mapped)
+
+    def test_big_endian_and_fortran_order(self):
+        """
+        Tests that big endian and non-contiguous arrays are stored little endian in C order
+        """
+        array = np.arange(12, dtype=">i4").reshape(3, 4).T
+        write_array(self.path, array)
+
+        self.assertEqual(np.dtype("<i4"), read_header(self.path).dtype)
+        with open(self.path, "rb") as f:
+            f.seek(HEADER_SIZE)
+            raw = np.frombuffer(f.read(), dtype="<i4")
+        np.testing.assert_array_equal(array.ravel(), raw)
+
+    def test_create_array(self):
+        """
+        Tests that preallocated files are zero filled and writes through the map reach the file
+        """
+        mapped = create_array(self.path, (3, 5), np.float32)
+        np.testing.assert_array_equal(np.zeros((3, 5), np.float32), mapped)
+        mapped[1, 2] = 7.5
+        mapped.flush()
+        del mapped
+
+        self.assertEqual(7.5, open_array(self.path)[1, 2])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            write_array(self.path, np.zeros(3, dtype=np.int8))
+        with self.assertRaises(ValueError):
+            write_array(self.path, np.zeros((1,) * 9))
+
+        with open(self.path, "wb") as f:
+            f.write(b"not an exchange file")
+        with self.assertRaises(ValueError):
+            read_header(self.path)
+
+        create_array(self.path, (10,), np.float64)
+        with open(self.path, "r+b") as f:
+            f.truncate(HEADER_SIZE + 8)
+        with self.assertRaises(ValueError):
+            open_array(self.path)
+
+
+class TestGdlStatements(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "image.raw")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_types_and_dims(self):
+        self.assertEqual(4, gdl_type(np.float32))
+        self.assertEqual(4, gdl_type(">f4"))
+        self.assertEqual(12, gdl_type(np.uint16))
+        self.assertEqual([4, 3, 2], gdl_dims((2, 3, 4)))
+        self.assertEqual([1], gdl_dims(()))
+
+    def test_read_binary(self):
+        """
+        Tests that READ_BINARY skips the header and uses the reversed (column major) dimensions
+        """
+        write_array(self.path, np.zeros((100, 200), np.int16))
+
+        self.assertEqual(["image = READ_BINARY('{}', DATA_START=128, DATA_TYPE=2, DATA_DIMS=[200, 100], "
+                          "ENDIAN='little')".format(self.path)],
+                         gdl_read_statements("image", self.path))
+
+    def test_assoc(self):
+        """
+        Tests that ASSOC records are the sub-arrays along the first NumPy axis
+        """
+        write_array(self.path, np.zeros((5, 100, 200), np.float64))
+
+        self.assertEqual(["OPENR, image_lun, '{}', /GET_LUN, /SWAP_IF_BIG_ENDIAN".format(self.path),
+                          "image = ASSOC(image_lun, MAKE_ARRAY(200, 100, TYPE=5, /NOZERO), 128)"],
+                         gdl_read_statements("image", self.path, use_assoc=True))
+
+    def test_write(self):
+        create_array(self.path, (100, 200), np.uint8)
+
+        self.assertEqual(["OPENU, image_lun, '{}', /GET_LUN, /SWAP_IF_BIG_ENDIAN".format(self.path),
+                          "POINT_LUN, image_lun, 128",
+                          "WRITEU, image_lun, FIX(image, TYPE=1)",
+                          "FREE_LUN, image_lun"],
+                         gdl_write_statements("image", self.path))
+
+    def test_array_exchange(self):
+        """
+        Tests that the exchange folder holds the files for each variable and is removed on close
+        """
+        array = np.arange(6, dtype=np.float32).reshape(2, 3)
+        with ArrayExchange() as exchange:
+            statements = exchange.put("a", array) + exchange.allocate("b", (2, 3), np.float32)
+            self.assertEqual(5, len(statements))
+
+            #   stands in for GDL writing the result
+            exchange.get("b", mode="r+")[:] = array * 2
+            np.testing.assert_array_equal(array * 2, exchange.get("b"))
+            folder = exchange.folder
+
+        self.assertFalse(os.path.exists(folder))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import asyncio
+import unittest
+from unittest import mock
+from pixutils.gdl.gdl_pool import GdlInterpreter, GdlPool
+from pixutils.gdl.gdl_async import *
+
+#   the tests run against a stand-in interpreter, so they don't require GDL to be installed
+FAKE_GDL = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gdl.py")]
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ENV = dict(os.environ)
+
+
+class TestExecGdlAsync(unittest.TestCase):
+
+    def test_exec(self):
+        """
+        Tests that a job's exit code and output are returned
+        """
+        result = asyncio.run(exec_gdl_async([".compile hello_world.pro", "hello", "printf, -2, 'err'", "exit"],
+                                            TEST_DIR, executable=FAKE_GDL, env=ENV))
+
+        self.assertEqual(0, result.returncode)
+        self.assertEqual("% Compiled module: HELLO.\nHello world!\n", result.stdout)
+        self.assertEqual("err\n", result.stderr)
+        self.assertFalse(result.timed_out)
+        self.assertGreater(result.elapsed, 0)
+
+    def test_streaming(self):
+        """
+        Tests that lines are passed to the callbacks as they are written, without their newlines
+        """
+        stdout, stderr = [], []
+        asyncio.run(exec_gdl_async(["print, 'a'", "printf, -2, 'b'", "print, 'c'"], executable=FAKE_GDL, env=ENV,
+                                   on_stdout=stdout.append, on_stderr=stderr.append))
+
+        self.assertEqual(["a", "c"], stdout)
+        self.assertEqual(["b"], stderr)
+
+    def test_returncode(self):
+        """
+        Tests that the exit code of an interpreter that exits early is returned
+        """
+        result = asyncio.run(exec_gdl_async(["print, 'before'", "crash, 5"], executable=FAKE_GDL, env=ENV))
+
+        self.assertEqual(5, result.returncode)
+        self.assertEqual("before\n", result.stdout)
+
+    def test_timeout(self):
+        """
+        Tests that a job that runs past its timeout is killed and flagged
+        """
+        result = asyncio.run(exec_gdl_async(["sleep, 10"], timeout=0.5, executable=FAKE_GDL, env=ENV))
+
+        self.assertTrue(result.timed_out)
+        self.assertIsNone(result.returncode)
+        self.assertLess(result.elapsed, 5)
+
+
+class TestGdlBatch(unittest.TestCase):
+
+    def test_batch(self):
+        """
+        Tests that results are returned in job order with aggregated counts
+        """
+        jobs = [["print, 'job 0'"],
+                ["crash, 2"],
+                GdlJob([".compile hello_world.pro", "hello"], TEST_DIR),
+                ["sleep, 10"]]
+        batch = exec_gdl_batch(jobs, max_concurrency=2, timeout=1, executable=FAKE_GDL, env=ENV)
+
+        self.assertEqual([0, 2, 0, None], batch.returncodes)
+        self.assertEqual("job 0\n", batch.results[0].stdout)
+        self.assertEqual("% Compiled module: HELLO.\nHello world!\n", batch.results[2].stdout)
+        self.assertEqual((2, 1, 1), (batch.succeeded, batch.failed, batch.timed_out))
+        self.assertAlmostEqual(sum(r.elapsed for r in batch.results), batch.total_elapsed)
+
+    def test_concurrency_limit(self):
+        """
+        Tests that no more than 'max_concurrency' jobs run at once, and that jobs do overlap
+        """
+        active, peak = set(), []
+
+        def on_stdout(index, line):
+            if line == "start":
+                active.add(index)
+                peak.append(len(active))
+            elif line == "end":
+                active.discard(index)
+
+        jobs = [["print, 'start'", "flush", "sleep, 0.3", "print, 'end'"] for _ in range(6)]
+        batch = exec_gdl_batch(jobs, max_concurrency=2, on_stdout=on_stdout, executable=FAKE_GDL, env=ENV)
+
+        self.assertEqual([0] * 6, batch.returncodes)
+        self.assertEqual(2, max(peak))
+        self.assertLess(batch.wall_time, batch.total_elapsed)
+
+    def test_interpreters_are_reused(self):
+        """
+        Tests that a batch starts no more interpreters than its concurrency, and that a given pool is used
+        """
+        jobs = [["x = '{}'".format(i), "print, x"] for i in range(6)]
+        with mock.patch.object(GdlInterpreter, "_start", autospec=True, side_effect=GdlInterpreter._start) as start:
+            batch = exec_gdl_batch(jobs, max_concurrency=2, executable=FAKE_GDL, env=ENV)
+            self.assertLessEqual(start.call_count, 2)
+            self.assertEqual(["{}\n".format(i) for i in range(6)], [r.stdout for r in batch.results])
+
+            start.reset_mock()
+            with GdlPool(1, FAKE_GDL, env=ENV) as pool:
+                exec_gdl_batch(jobs, max_concurrency=2, pool=pool)
+                result = asyncio.run(exec_gdl_async(["print, 'single'"], pool=pool))
+            self.assertEqual(1, start.call_count)
+            self.assertEqual("single\n", result.stdout)
+
+    def test_invalid_concurrency(self):
+        with self.assertRaises(ValueError):
+            exec_gdl_batch([["print, 'x'"]], max_concurrency=0, executable=FAKE_GDL, env=ENV)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+import threading
+from unittest import mock
+from pixutils.gdl.gdl_pool import *
+
+#   the tests run against a stand-in interpreter, so they don't require GDL to be installed
+FAKE_GDL = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gdl.py")]
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class TestGdlInterpreter(unittest.TestCase):
+
+    def setUp(self):
+        self.interpreter = GdlInterpreter(FAKE_GDL, env=dict(os.environ))
+
+    def tearDown(self):
+        self.interpreter.close()
+
+    def test_run(self):
+        """
+        Tests that a job's output is framed correctly and that "exit" statements don't end the interpreter
+        """
+        result, stdout, stderr = self.interpreter.run([".compile hello_world.pro", "hello", "exit"], TEST_DIR)
+
+        self.assertEqual(0, result)
+        self.assertEqual("% Compiled module: HELLO.\nHello world!\n", stdout)
+        self.assertEqual("", stderr)
+        self.assertTrue(self.interpreter.is_running)
+
+    def test_process_is_reused(self):
+        """
+        Tests that consecutive jobs run in the same process
+        """
+        self.interpreter.run(["print, 'first'"])
+        pid = self.interpreter._process.pid
+        result, stdout, _ = self.interpreter.run(["print, 'second'"])
+
+        self.assertEqual(pid, self.interpreter._process.pid)
+        self.assertEqual("second\n", stdout)
+
+    def test_stderr(self):
+        """
+        Tests that output written to stderr is returned separately
+        """
+        result, stdout, stderr = self.interpreter.run(["print, 'out'", "printf, -2, 'err'", "undefined_procedure"])
+
+        self.assertEqual("out\n", stdout)
+        self.assertEqual("err\n% Attempt to call undefined procedure: 'UNDEFINED_PROCEDURE'.\n", stderr)
+
+    def test_reset_between_jobs(self):
+        """
+        Tests that variables and compiled procedures don't leak from one job to the next
+        """
+        self.interpreter.run(["x = 'leaked'", ".compile hello_world.pro"], TEST_DIR)
+        _, stdout, stderr = self.interpreter.run(["print, x", "hello"])
+
+        self.assertEqual("x\n", stdout)
+        self.assertIn("undefined procedure: 'HELLO'", stderr)
+
+    def test_no_reset(self):
+        """
+        Tests that state is kept between jobs when the reset command is disabled
+        """
+        interpreter = GdlInterpreter(FAKE_GDL, env=dict(os.environ), reset_command=None)
+        try:
+            interpreter.run(["x = 'kept'"])
+            _, stdout, _ = interpreter.run(["print, x"])
+        finally:
+            interpreter.close()
+
+        self.assertEqual("kept\n", stdout)
+
+    def test_working_dir(self):
+        """
+        Tests that each job runs in its own working directory
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "other.pro"), "w") as f:
+                f.write("pro other\n  print, 'other'\nend\n")
+
+            _, stdout, _ = self.interpreter.run([".compile other.pro", "other"], folder)
+            self.assertEqual("% Compiled module: OTHER.\nother\n", stdout)
+
+        _, stdout, _ = self.interpreter.run([".compile hello_world.pro", "hello"], TEST_DIR)
+        self.assertEqual("% Compiled module: HELLO.\nHello world!\n", stdout)
+
+    def test_crash_restarts(self):
+        """
+        Tests that an interpreter that exits during a job returns its exit code and is restarted for the next job
+        """
+        result, stdout, _ = self.interpreter.run(["print, 'before'", "crash, 3", "print, 'after'"])
+
+        self.assertEqual(3, result)
+        self.assertEqual("before\n", stdout)
+        self.assertFalse(self.interpreter.is_running)
+
+        result, stdout, _ = self.interpreter.run(["print, 'restarted'"])
+        self.assertEqual(0, result)
+        self.assertEqual("restarted\n", stdout)
+
+    def test_exit_status(self):
+        """
+        Tests that an exit statement ends the job with its status, as it would a gdl process, and the interpreter is
+        restarted for the next job
+        """
+        result, stdout, _ = self.interpreter.run(["print, 'before'", "exit, status=1", "print, 'after'"])
+        self.assertEqual((1, "before\n"), (result, stdout))
+        self.assertFalse(self.interpreter.is_running)
+
+        result, stdout, _ = self.interpreter.run(["exit", "print, 'after'"])
+        self.assertEqual((0, ""), (result, stdout))
+
+        result, stdout, _ = self.interpreter.run(["print, 'restarted'", "exit"])
+        self.assertEqual((0, "restarted\n"), (result, stdout))
+        self.assertTrue(self.interpreter.is_running)
+
+    def test_timeout(self):
+        """
+        Tests that a job that runs past its timeout raises TimeoutExpired and the interpreter is replaced
+        """
+        with self.assertRaises(subprocess.TimeoutExpired):
+            self.interpreter.run(["sleep, 10"], timeout=0.5)
+        self.assertFalse(self.interpreter.is_running)
+
+        result, stdout, _ = self.interpreter.run(["print, 'recovered'"], timeout=10)
+        self.assertEqual(0, result)
+        self.assertEqual("recovered\n", stdout)
+
+    def test_reset_timeout(self):
+        """
+        Tests that an interpreter stuck in the reset after a job is replaced, and the job's output is still returned
+        """
+        interpreter = GdlInterpreter(FAKE_GDL, env=dict(os.environ), reset_command="sleep, 10")
+        try:
+            result, stdout, _ = interpreter.run(["print, 'done'"], timeout=0.5)
+            self.assertEqual((0, "done\n"), (result, stdout))
+            self.assertFalse(interpreter.is_running)
+        finally:
+            interpreter.close()
+
+
+class TestGdlPool(unittest.TestCase):
+
+    def test_concurrent_jobs(self):
+        """
+        Tests that jobs run from several threads each get their own output, and no more interpreters than the pool
+        size are started
+        """
+        results = {}
+
+        with GdlPool(2, FAKE_GDL, env=dict(os.environ)) as pool:
+            def job(i):
+                results[i] = pool.run(["n = '{}'".format(i), "sleep, 0.05", "print, n"])
+
+            threads = [threading.Thread(target=job, args=(i,)) for i in range(6)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            self.assertLessEqual(len(pool._interpreters), 2)
+
+        self.assertEqual({i: (0, "{}\n".format(i), "") for i in range(6)}, results)
+
+    def test_close(self):
+        """
+        Tests that closing the pool stops its interpreters
+        """
+        pool = GdlPool(1, FAKE_GDL, env=dict(os.environ))
+        pool.run(["print, 'x'"])
+        interpreter = pool._interpreters[0]
+        pool.close()
+
+        self.assertFalse(interpreter.is_running)
+
+    def test_interpreter_is_reused(self):
+        """
+        Tests that jobs after the first don't pay the interpreter start-up cost
+        """
+        with mock.patch.object(GdlInterpreter, "_start", autospec=True, side_effect=GdlInterpreter._start) as start:
+            with GdlPool(1, FAKE_GDL, env=dict(os.environ)) as pool:
+                for _ in range(6):
+                    self.assertEqual((0, "x\n", ""), pool.run(["print, 'x'"]))
+
+        self.assertEqual(1, start.call_count)
+
+
+if __name__ == '__main__':
+    unittest.main()
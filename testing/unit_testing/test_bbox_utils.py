@@ -0,0 +1,83 @@
+import unittest
+import numpy as np
+import shapely
+from pixutils.bbox_utils import *
+
+
+class TestBboxGeometries(unittest.TestCase):
+
+    def test_ring_order(self):
+        """
+        Tests that rings run in the same order as 'eo_utilities.create_wkt_points'
+        """
+        self.assertEqual("POLYGON ((-5 50, -5 55, 2 55, 2 50, -5 50))", bbox_wkt(50, -5, 55, 2))
+
+    def test_arrays(self):
+        swlat = np.array([50.0, -10.0, 0.5])
+        swlon = np.array([-5.0, 100.0, 0.25])
+        nelat = swlat + 1
+        nelon = swlon + 2
+
+        geometries = bbox_geometries(swlat, swlon, nelat, nelon)
+        self.assertEqual((3,), geometries.shape)
+        np.testing.assert_array_equal(np.stack([swlon, swlat, nelon, nelat], axis=1), shapely.bounds(geometries))
+
+        wkt = bbox_wkt(swlat, swlon, nelat, nelon)
+        self.assertEqual("POLYGON ((0.25 0.5, 0.25 1.5, 2.25 1.5, 2.25 0.5, 0.25 0.5))", wkt[2])
+
+        wkb = bbox_wkb(swlat, swlon, nelat, nelon)
+        self.assertTrue(shapely.equals(geometries, shapely.from_wkb(wkb)).all())
+
+    def test_as_geometries(self):
+        box = shapely.box(0, 0, 1, 1)
+        geometries = as_geometries([box.wkt, box.wkb, box])
+        self.assertTrue(all(g.equals(box) for g in geometries))
+
+
+class TestAoiIndex(unittest.TestCase):
+
+    def setUp(self):
+        #   a row of 1 degree AOIs from 0 to 10 degrees east
+        lons = np.arange(10.0)
+        self.index = AoiIndex.from_bboxes(np.zeros(10), lons, np.ones(10), lons + 1,
+                                          ids=["aoi_{}".format(i) for i in range(10)])
+
+    def test_query(self):
+        self.assertEqual(10, len(self.index))
+        self.assertEqual(["aoi_2", "aoi_3", "aoi_4"], self.index.query("POLYGON ((2.5 0.2, 4.5 0.2, 4.5 0.8, "
+                                                                       "2.5 0.8, 2.5 0.2))"))
+        self.assertEqual([], self.index.query(shapely.box(20, 20, 21, 21)))
+
+    def test_query_many_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        x, y = rng.uniform(-1, 11, 200), rng.uniform(-1, 2, 200)
+        footprints = bbox_geometries(y, x, y + 0.3, x + rng.uniform(0, 3, 200))
+
+        matches = self.index.query_many(footprints)
+        for footprint, match in zip(footprints, matches):
+            expected = [i for i, g in zip(self.index.ids, self.index.geometries) if g.intersects(footprint)]
+            self.assertEqual(expected, match)
+
+    def test_match_products(self):
+        products = {
+            "p1": {"footprint": "POLYGON ((0.5 0.5, 1.5 0.5, 1.5 0.6, 0.5 0.6, 0.5 0.5))"},
+            "p2": {"footprint": "POLYGON ((50 50, 51 50, 51 51, 50 51, 50 50))"},
+            "p3": {"title": "no footprint"},
+        }
+        self.assertEqual({"p1": ["aoi_0", "aoi_1"]}, self.index.match_products(products))
+
+    def test_from_geojson(self):
+        features = [{"type": "Feature", "properties": {"name": n},
+                     "geometry": shapely.box(x, 0, x + 1, 1).__geo_interface__} for n, x in [("west", 0), ("east", 5)]]
+        index = AoiIndex.from_geojson({"type": "FeatureCollection", "features": features}, id_property="name")
+        self.assertEqual(["east"], index.query(shapely.box(5.5, 0.5, 6, 0.6)))
+        self.assertEqual([0], AoiIndex.from_geojson(features[1]).query(shapely.box(5.5, 0.5, 6, 0.6)))
+        self.assertEqual(1, len(AoiIndex.from_geojson(features[0]["geometry"])))
+
+    def test_ids_length(self):
+        with self.assertRaises(ValueError):
+            AoiIndex([shapely.box(0, 0, 1, 1)], ids=["a", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import logging
+import unittest
+import threading
+from unittest import mock
+from pixutils import command_runner
+from pixutils.command_runner import *
+
+
+def python(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+class TestCommandRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CommandRunner(max_workers=2)
+
+    def tearDown(self):
+        self.runner.cancel()
+        self.runner.close()
+
+    def test_run(self):
+        """
+        Tests that output, the exit code and timings are returned
+        """
+        result = self.runner.run(python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"))
+
+        self.assertEqual(3, result.returncode)
+        self.assertEqual("out\n", result.stdout)
+        self.assertEqual("err\n", result.stderr)
+        self.assertFalse(result.timed_out)
+        self.assertFalse(result.cancelled)
+        self.assertGreater(result.wall_time, 0)
+        self.assertIsNotNone(result.cpu_time)
+
+    def test_string_command(self):
+        """
+        Tests that string commands are split with shell-like quoting and not passed to a shell
+        """
+        result = self.runner.run("{} -c \"print('a b')\" ; echo".format(sys.executable))
+        self.assertEqual(0, result.returncode)
+        self.assertEqual("a b\n", result.stdout)
+
+    def test_merge_stderr(self):
+        result = self.runner.run(python("import sys; print('err', file=sys.stderr)"), merge_stderr=True)
+        self.assertEqual("err\n", result.stdout)
+        self.assertEqual("", result.stderr)
+
+    def test_bytes_output(self):
+        """
+        Tests that output that isn't valid UTF-8 is returned byte for byte when it isn't decoded
+        """
+        code = "import sys; sys.stdout.buffer.write(b'\\xff\\xfeok\\n'); sys.stderr.buffer.write(b'\\x80')"
+        result = self.runner.run(python(code), text=False)
+        self.assertEqual(b"\xff\xfeok\n", result.stdout)
+        self.assertEqual(b"\x80", result.stderr)
+
+        result = self.runner.run(python(code))
+        self.assertEqual("\ufffd\ufffdok\n", result.stdout)
+
+    def test_missing_executable(self):
+        """
+        Tests that a command that can't be started is reported rather than raised
+        """
+        result = self.runner.run(["pixutils-no-such-command"])
+        self.assertIsNone(result.returncode)
+        self.assertNotEqual("", result.stderr)
+
+    def test_streaming(self):
+        """
+        Tests that output lines are logged while the command is still running
+        """
+        with self.assertLogs("command_runner", level=logging.INFO) as logs:
+            future = self.runner.submit(python("import time; print('first', flush=True); time.sleep(0.5); "
+                                               "print('second')"))
+            deadline = time.monotonic() + 5
+            while not any("first" in o for o in logs.output) and time.monotonic() < deadline:
+                time.sleep(0.02)
+            self.assertFalse(future.done())
+            future.result()
+
+        self.assertTrue(any("stdout] first" in o for o in logs.output))
+        self.assertTrue(any("stdout] second" in o for o in logs.output))
+
+    def test_timeout(self):
+        result = self.runner.run(python("import time; time.sleep(10)"), timeout=0.5)
+
+        self.assertTrue(result.timed_out)
+        self.assertIsNone(result.returncode)
+        self.assertLess(result.wall_time, 5)
+
+    def test_cpu_time(self):
+        """
+        Tests that CPU time is measured for the command rather than this process
+        """
+        busy = self.runner.run(python("t = __import__('time').process_time()\n"
+                                      "while __import__('time').process_time() - t < 0.3: pass"))
+        idle = self.runner.run(python("import time; time.sleep(0.3)"))
+
+        self.assertGreater(busy.cpu_time, 0.25)
+        self.assertLess(idle.cpu_time, busy.cpu_time)
+
+    def test_run_all(self):
+        """
+        Tests that commands run side by side, at most 'max_workers' at a time, with results in command order
+        """
+        start = time.perf_counter()
+        results = self.runner.run_all([python("import time; time.sleep(0.4); print({})".format(i)) for i in range(4)])
+        wall_time = time.perf_counter() - start
+
+        self.assertEqual(["{}\n".format(i) for i in range(4)], [r.stdout for r in results])
+        self.assertLess(wall_time, sum(r.wall_time for r in results))
+        self.assertGreater(wall_time, 0.75)
+
+    def test_cancel(self):
+        """
+        Tests that cancelling kills running commands and stops queued ones from starting
+        """
+        futures = [self.runner.submit(python("import time; time.sleep(10)")) for _ in range(4)]
+        time.sleep(0.5)
+        start = time.perf_counter()
+        self.runner.cancel()
+        results = [result_of(f) for f in futures]
+
+        self.assertLess(time.perf_counter() - start, 5)
+        self.assertTrue(all(r.cancelled and r.returncode is None for r in results))
+
+        #   the runner is still usable after cancelling
+        self.assertEqual(0, self.runner.run(python("pass")).returncode)
+
+    def test_kill_after_exit(self):
+        """
+        Tests that a kill racing with the command's exit doesn't signal the process group once the process is reaped,
+        as its id may already have been reused
+        """
+        job = command_runner._Job(python("pass"), logging.getLogger("test"), logging.DEBUG, True, False)
+        wait4 = os.wait4
+        killers = []
+
+        def reap_then_kill(*args):
+            reaped = wait4(*args)
+            killers.append(threading.Thread(target=job.kill, kwargs={"timed_out": True}))
+            killers[0].start()
+            killers[0].join(0.2)
+            return reaped
+
+        with mock.patch.object(command_runner.os, "wait4", side_effect=reap_then_kill), \
+                mock.patch.object(command_runner.os, "killpg") as killpg:
+            result = job.wait(None)
+            killers[0].join()
+
+        killpg.assert_not_called()
+        self.assertEqual(0, result.returncode)
+        self.assertFalse(result.timed_out)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import date, timedelta
+import numpy as np
+from pixutils import date_conversion
+
+
+class TestDateConversion(unittest.TestCase):
+    def setUp(self):
+        #   every day from 1899 to 2101, covering the 1900 and 2000 century rules
+        days = [date(1899, 1, 1) + timedelta(days=i) for i in range((date(2102, 1, 1) - date(1899, 1, 1)).days)]
+        self.Y = np.array([d.year for d in days])
+        self.M = np.array([d.month for d in days])
+        self.D = np.array([d.day for d in days])
+        self.N = np.array([d.timetuple().tm_yday for d in days])
+        self.dates = np.array(days, dtype="datetime64[D]")
+
+    def test_matches_scalar(self):
+        for i in range(0, len(self.Y), 97):
+            self.assertEqual(date_conversion.is_leap_year(self.Y[i]), date_conversion.is_leap_year_array(self.Y[i]))
+            self.assertEqual(date_conversion.doy(self.Y[i], self.M[i], self.D[i]),
+                             date_conversion.doy_array(self.Y[i], self.M[i], self.D[i]))
+            self.assertEqual(date_conversion.ymd(self.Y[i], self.N[i]),
+                             tuple(int(v) for v in date_conversion.ymd_array(self.Y[i], self.N[i])))
+
+    def test_arrays(self):
+        np.testing.assert_array_equal(self.N, date_conversion.doy_array(self.Y, self.M, self.D))
+        for expected, result in zip((self.Y, self.M, self.D), date_conversion.ymd_array(self.Y, self.N)):
+            np.testing.assert_array_equal(expected, result)
+
+        #   any shape is accepted
+        shape = (len(self.Y) // 2, 2)
+        np.testing.assert_array_equal(self.N[:shape[0] * 2].reshape(shape),
+                                      date_conversion.doy_array(*(a[:shape[0] * 2].reshape(shape)
+                                                                  for a in (self.Y, self.M, self.D))))
+
+    def test_datetime64(self):
+        np.testing.assert_array_equal(self.dates, date_conversion.doy_to_datetime64(self.Y, self.N))
+        np.testing.assert_array_equal(self.dates, date_conversion.ymd_to_datetime64(self.Y, self.M, self.D))
+        for expected, result in zip((self.Y, self.N), date_conversion.datetime64_to_doy(self.dates)):
+            np.testing.assert_array_equal(expected, result)
+        for expected, result in zip((self.Y, self.M, self.D), date_conversion.datetime64_to_ymd(self.dates)):
+            np.testing.assert_array_equal(expected, result)
+
+
+if __name__ == '__main__':
+    unittest.main()
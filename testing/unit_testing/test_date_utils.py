@@ -0,0 +1,39 @@
+import unittest
+from datetime import date, datetime
+import numpy as np
+from pixutils.date_utils import *
+
+
+class TestDateUtils(unittest.TestCase):
+    def test_date_range_strings(self):
+        self.assertEqual(["20191230", "20191231", "20200101"], date_range_strings("20191230", "20200101").tolist())
+        self.assertEqual(["2020366", "2021001"],
+                         date_range_strings(date(2020, 12, 31), datetime(2021, 1, 1), day_of_year=True).tolist())
+        self.assertEqual(["2020005"], format_dates(["2020-01-05"], day_of_year=True).tolist())
+        self.assertEqual(0, len(date_range_strings("20200102", "20200101")))
+
+    def test_date_range_array(self):
+        dates = date_range_array("20200101", "20201231")
+        self.assertEqual(366, len(dates))
+        self.assertEqual([d for d in date_iterator(date(2020, 1, 1), date(2020, 12, 31))], dates.tolist())
+
+    def test_prev_month(self):
+        dates = ["20200403", "20200301", "20200115"]
+        np.testing.assert_array_equal(np.array([first_day_of_prev_month(d).date() for d in dates], "datetime64[D]"),
+                                      first_day_of_prev_month_array(dates))
+        np.testing.assert_array_equal(np.array([last_day_of_prev_month(d).date() for d in dates], "datetime64[D]"),
+                                      last_day_of_prev_month_array(dates))
+
+    def test_invalid_dates(self):
+        for bad in ["20201301", "20200230", "2020013", "20200001", "2020-01-0x", ""]:
+            with self.assertRaises(ValueError, msg=bad):
+                to_datetime64_array(bad)
+        with self.assertRaises(ValueError):
+            to_datetime64_array(["20200101", "20200132"])
+        with self.assertRaises(ValueError):
+            date_range_strings("20200101", "20201301")
+        self.assertEqual(np.datetime64("2020-02-29"), to_datetime64_array("2020-02-29"))
+
+
+if __name__ == '__main__':
+    unittest.main()
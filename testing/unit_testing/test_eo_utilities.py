@@ -0,0 +1,123 @@
+import os
+import sys
+import shlex
+import tempfile
+import unittest
+from unittest import mock
+
+#   GDAL is replaced by a mock in these tests, so they run where it isn't installed
+try:
+    import osgeo
+except ImportError:
+    #   only for the import, so other modules still see GDAL as missing.  The modules eo_utilities imports are imported
+    #   first, so they don't pick up the mock.
+    from pixutils import command_runner, date_utils, quicklook
+    _OSGEO_MODULES = ["osgeo", "osgeo.gdal", "osgeo.ogr"]
+    sys.modules.update((name, mock.MagicMock()) for name in _OSGEO_MODULES)
+    try:
+        from pixutils import eo_utilities
+    finally:
+        for name in _OSGEO_MODULES:
+            del sys.modules[name]
+else:
+    from pixutils import eo_utilities
+from pixutils.eo_utilities import execmd, geotiff_filename, netcdf_subdatasets, netcdf_to_geotiff
+
+
+def mock_gdal(subdatasets: dict) -> mock.MagicMock:
+    """
+    Returns a mock of the gdal module, opening a dataset with the given subdataset metadata and writing an empty
+    file for each translation
+    """
+    gdal = mock.MagicMock()
+    gdal.Open.return_value.GetMetadata.return_value = subdatasets
+
+    def translate(destination, source, options=None):
+        open(destination, "w").close()
+        return mock.MagicMock()
+
+    gdal.Translate.side_effect = translate
+    return gdal
+
+
+class TestGeotiffFilename(unittest.TestCase):
+
+    def test_geotiff_filename(self):
+        self.assertEqual(os.path.join("out", "era5_t2m.tif"), geotiff_filename(os.path.join("out", "era5.tif"), "t2m"))
+        self.assertEqual("era5_t2m.tiff", geotiff_filename("era5.tiff", "t2m"))
+        self.assertEqual("era5_t2m.tif", geotiff_filename("era5", "t2m"))
+        self.assertEqual("era5_2m_temperature_K.tif", geotiff_filename("era5.tif", " 2m temperature (K)"))
+
+
+class TestExecmd(unittest.TestCase):
+
+    def test_bytes_output(self):
+        """
+        Tests that the output of a command is returned byte for byte, even where it isn't valid UTF-8
+        """
+        code = "import sys; sys.stdout.buffer.write(b'\\xff\\xfeok\\n'); sys.stdout.flush(); " \
+               "sys.stderr.buffer.write(b'\\x80')"
+        self.assertEqual(b"\xff\xfeok\n\x80", execmd(shlex.join([sys.executable, "-c", code]), False))
+        self.assertIsNone(execmd(shlex.join([sys.executable, "-c", "pass"]), False))
+
+
+class TestNetcdfToGeotiff(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.netcdf_file = os.path.join(self.folder.name, "era5.nc")
+        open(self.netcdf_file, "w").close()
+        self.geotiff_file = os.path.join(self.folder.name, "era5.tif")
+        names = ["t2m", "tp", "u10", "v10", "d2m", "sp", "ssrd", "strd", "skt", "lai_hv", "lai_lv"]
+        self.subdatasets = {}
+        for i, name in enumerate(names):
+            self.subdatasets["SUBDATASET_{}_NAME".format(i + 1)] = 'NETCDF:"{}":{}'.format(self.netcdf_file, name)
+            self.subdatasets["SUBDATASET_{}_DESC".format(i + 1)] = "[1x10x10] {} (16-bit integer)".format(name)
+        self.names = names
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_subdatasets(self):
+        with mock.patch.object(eo_utilities, "gdal", mock_gdal(self.subdatasets)):
+            subdatasets = netcdf_subdatasets(self.netcdf_file)
+
+        #   in subdataset order, not the string order of the metadata keys
+        self.assertEqual(self.names, [v for _, v in subdatasets])
+        self.assertEqual('NETCDF:"{}":lai_lv'.format(self.netcdf_file), subdatasets[-1][0])
+
+    def test_convert(self):
+        gdal = mock_gdal(self.subdatasets)
+        with mock.patch.object(eo_utilities, "gdal", gdal):
+            outputs = netcdf_to_geotiff(self.netcdf_file, self.geotiff_file, variables=["tp", "t2m"])
+
+        expected = [os.path.join(self.folder.name, "era5_{}.tif".format(v)) for v in ("t2m", "tp")]
+        self.assertEqual(expected, outputs)
+        self.assertEqual([mock.call(e, 'NETCDF:"{}":{}'.format(self.netcdf_file, v), options=mock.ANY)
+                          for e, v in zip(expected, ("t2m", "tp"))], gdal.Translate.call_args_list)
+        #   GDAL's exception mode is a process-wide setting, and is left alone
+        gdal.UseExceptions.assert_not_called()
+
+    def test_single_variable(self):
+        with mock.patch.object(eo_utilities, "gdal", mock_gdal({})):
+            outputs = netcdf_to_geotiff(self.netcdf_file, self.geotiff_file)
+        self.assertEqual([self.geotiff_file], outputs)
+
+    def test_errors(self):
+        gdal = mock_gdal(self.subdatasets)
+        gdal.Translate.side_effect = None
+        gdal.Translate.return_value = None
+        gdal.GetLastErrorMsg.return_value = "Permission denied"
+        with mock.patch.object(eo_utilities, "gdal", gdal):
+            with self.assertRaisesRegex(RuntimeError, "Permission denied"):
+                netcdf_to_geotiff(self.netcdf_file, self.geotiff_file)
+
+            gdal.Open.return_value = None
+            with self.assertRaises(RuntimeError):
+                netcdf_to_geotiff(self.netcdf_file, self.geotiff_file)
+            with self.assertRaises(FileNotFoundError):
+                netcdf_to_geotiff(os.path.join(self.folder.name, "missing.nc"), self.geotiff_file)
+
+
+if __name__ == '__main__':
+    unittest.main()
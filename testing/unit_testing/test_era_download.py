@@ -0,0 +1,144 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import netCDF4
+from datetime import datetime
+from pixutils import era_download
+from pixutils.era_download import *
+from pixutils import instrumentation
+from testing.unit_testing.fixtures import ERA5_TIME_UNITS, write_era5_netcdf
+
+
+def make_netcdf(path: str, variables, hours: int = 30, months: bool = False) -> dict:
+    """
+    Writes a small ERA5-like hourly netCDF file with random, packed fields
+    :param months: if True, the time steps are the first of each month, as in a monthly means file
+    :return: the unpacked fields keyed by short name
+    """
+    rng = np.random.default_rng(0)
+    times = np.arange(hours) if not months else netCDF4.date2num(
+        [datetime(2020 + m // 12, m % 12 + 1, 1) for m in range(hours)], ERA5_TIME_UNITS, "gregorian")
+    write_era5_netcdf(path, variables, lats=[55, 54, 53, 52], lons=[-4, -3, -2, -1, 0], times=times,
+                      values=lambda name, start, stop: rng.uniform(-20, 40, (stop - start, 4, 5)), dtype="i2",
+                      chunksizes=(8, 4, 5), scale_factor=0.001, add_offset=10.0)
+    with netCDF4.Dataset(path) as nc:
+        return {name: nc[name][:].astype(float) for name in variables}
+
+
+class TestDeriveVariables(unittest.TestCase):
+
+    def test_derive(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5.nc")
+            fields = make_netcdf(path, ["u10", "v10", "t2m", "swvl1", "swvl2", "tp"])
+
+            #   a small block size, so the file is derived over several blocks of time chunks
+            block_bytes = era_download.DERIVED_BLOCK_BYTES
+            era_download.DERIVED_BLOCK_BYTES = 1
+            try:
+                output_path = derive_variables(path)
+            finally:
+                era_download.DERIVED_BLOCK_BYTES = block_bytes
+
+            self.assertEqual(os.path.join(folder, "era5_derived.nc"), output_path)
+            with netCDF4.Dataset(output_path) as nc:
+                self.assertEqual({"time", "latitude", "longitude", "wind_speed_10m", "wind_direction_10m",
+                                  "temperature_2m_celsius", "soil_water_0_7cm", "soil_water_0_28cm",
+                                  "precipitation_rate"}, set(nc.variables))
+                self.assertEqual(30, len(nc.dimensions["time"]))
+                np.testing.assert_array_equal(np.arange(30), nc.variables["time"][:])
+                self.assertEqual("degC", nc.variables["temperature_2m_celsius"].units)
+
+                rtol = 1e-6
+                np.testing.assert_allclose(np.hypot(fields["u10"], fields["v10"]),
+                                           nc.variables["wind_speed_10m"][:], rtol=rtol)
+                np.testing.assert_allclose(fields["t2m"] - 273.15, nc.variables["temperature_2m_celsius"][:],
+                                           rtol=rtol)
+                np.testing.assert_allclose((7 * fields["swvl1"] + 21 * fields["swvl2"]) / 28,
+                                           nc.variables["soil_water_0_28cm"][:], rtol=rtol)
+                np.testing.assert_allclose(fields["tp"] * 1000, nc.variables["precipitation_rate"][:], rtol=rtol)
+
+    def test_instrumented(self):
+        """
+        Tests that the read, compute and write phases are timed when instrumentation is enabled
+        """
+        sink = instrumentation.MemorySink()
+        previous = instrumentation.set_sink(sink)
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "era5.nc")
+                make_netcdf(path, ["t2m"], hours=5)
+                derive_variables(path)
+        finally:
+            instrumentation.set_sink(previous)
+
+        phases = {name for name, kind, _ in sink.summary() if kind == "timer"}
+        self.assertEqual({"read", "compute", "write"}, phases)
+        rows = [m.value for m in sink.metrics if m.name == "rows"]
+        self.assertEqual(5, sum(rows))
+
+    def test_wind_direction(self):
+        """
+        Tests that the direction is the one the wind blows from, clockwise from north
+        """
+        direction = derived_variables["wind_direction_10m"].function
+        u, v = np.array([0.0, -1.0, 0.0, 1.0]), np.array([-1.0, 0.0, 1.0, 0.0])
+        np.testing.assert_allclose([0, 90, 180, 270], direction({"u10": u, "v10": v}))
+
+    def test_monthly_precipitation_rate(self):
+        """
+        Tests that monthly means, which hold the mean daily accumulation, are converted to a rate over a day rather than
+        an hour
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5_land_monthly.nc")
+            fields = make_netcdf(path, ["tp"], hours=14, months=True)
+            with netCDF4.Dataset(derive_variables(path)) as nc:
+                np.testing.assert_allclose(fields["tp"] * 1000 / 24, nc.variables["precipitation_rate"][:],
+                                           rtol=1e-6)
+
+    def test_unknown_accumulation_period(self):
+        """
+        Tests that the precipitation rate of a single time step file is only derived when the period is given
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5.nc")
+            fields = make_netcdf(path, ["tp", "t2m"], hours=1)
+            with self.assertRaises(ValueError):
+                derive_variables(path, ["precipitation_rate"])
+
+            with self.assertLogs("era_download", "WARNING"):
+                with netCDF4.Dataset(derive_variables(path)) as nc:
+                    self.assertNotIn("precipitation_rate", nc.variables)
+                    self.assertIn("temperature_2m_celsius", nc.variables)
+
+            output_path = derive_variables(path, ["precipitation_rate"], accumulation_hours=24)
+            with netCDF4.Dataset(output_path) as nc:
+                np.testing.assert_allclose(fields["tp"] * 1000 / 24, nc.variables["precipitation_rate"][:],
+                                           rtol=1e-6)
+
+    def test_missing_inputs(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5.nc")
+            make_netcdf(path, ["u10"])
+            with self.assertRaises(ValueError):
+                derive_variables(path, ["wind_speed_10m"])
+            with self.assertRaises(ValueError):
+                derive_variables(path)
+            with self.assertRaises(ValueError):
+                derive_variables(path, ["not_a_variable"])
+
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [os.path.join(folder, "era5_{}.nc".format(m)) for m in (1, 2)]
+            for path in paths:
+                make_netcdf(path, ["t2m"], hours=5)
+            outputs = derive_variables_batch(paths + [os.path.join(folder, "missing.nc")], max_workers=1)
+
+            self.assertTrue(all(os.path.isfile(outputs[p]) for p in paths))
+            self.assertIsNone(outputs[os.path.join(folder, "missing.nc")])
+
+
+if __name__ == '__main__':
+    unittest.main()
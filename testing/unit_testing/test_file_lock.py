@@ -0,0 +1,156 @@
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import unittest
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+from pixutils import era_download
+from pixutils.file_lock import *
+from datetime import date, time as dt_time
+
+
+def produce_once(output_path: str) -> bool:
+    """
+    Produces a file under 'single_flight', counting the number of times it is actually produced
+    :return: True if this call produced the file
+    """
+    with single_flight(output_path, poll_interval=0.05) as produce:
+        if produce:
+            with open(output_path + ".count", "a") as f:
+                f.write("x")
+            time.sleep(0.5)
+            with open(partial_path(output_path), "w") as f:
+                f.write("done")
+            os.replace(partial_path(output_path), output_path)
+    return produce
+
+
+def write_lock(path: str, pid: int, host: str, created: float) -> None:
+    with open(path, "w") as f:
+        json.dump({"pid": pid, "host": host, "created": created, "token": "other"}, f)
+
+
+class TestFileLock(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "file.lock")
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_acquire_release(self):
+        with FileLock(self.path) as lock:
+            info = read_lock(self.path)
+            self.assertEqual(os.getpid(), info.pid)
+            self.assertEqual(socket.gethostname(), info.host)
+            self.assertFalse(lock.waited)
+            with self.assertRaises(TimeoutError):
+                FileLock(self.path, timeout=0.2, poll_interval=0.05).acquire()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_stale_local_lock(self):
+        """
+        Tests that a lock held by a process that has exited is broken
+        """
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        write_lock(self.path, process.pid, socket.gethostname(), time.time())
+
+        with FileLock(self.path, timeout=1) as lock:
+            self.assertEqual(lock.token, read_lock(self.path).token)
+        self.assertEqual([], os.listdir(self.folder.name))
+
+    def test_other_host(self):
+        """
+        Tests that locks from other hosts are only stale once they are older than 'max_age'
+        """
+        write_lock(self.path, 1, "elsewhere", time.time())
+        with self.assertRaises(TimeoutError):
+            FileLock(self.path, timeout=0.2, poll_interval=0.05, max_age=60).acquire()
+
+        write_lock(self.path, 1, "elsewhere", time.time() - 120)
+        with FileLock(self.path, timeout=0.2, max_age=60):
+            self.assertEqual(os.getpid(), read_lock(self.path).pid)
+
+    def test_empty_lock(self):
+        """
+        Tests that an empty lock file is dated by its modification time, and broken once it is past the grace period
+        """
+        open(self.path, "w").close()
+        info = read_lock(self.path)
+        self.assertEqual(os.stat(self.path).st_mtime, info.created)
+        with self.assertRaises(TimeoutError):
+            FileLock(self.path, timeout=0.2, poll_interval=0.05).acquire()
+
+        old = time.time() - UNREADABLE_MAX_AGE - 1
+        os.utime(self.path, (old, old))
+        with FileLock(self.path, timeout=0.2) as lock:
+            self.assertEqual(lock.token, read_lock(self.path).token)
+        self.assertEqual([], os.listdir(self.folder.name))
+
+    def test_release_only_own_lock(self):
+        lock = FileLock(self.path).acquire()
+        write_lock(self.path, 1, "elsewhere", time.time())
+        lock.release()
+        self.assertTrue(os.path.exists(self.path))
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_processes(self):
+        """
+        Tests that concurrent processes producing the same file produce it once, and all of them see it complete
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            output_path = os.path.join(folder, "output.tif")
+            with ProcessPoolExecutor(max_workers=4) as executor:
+                produced = list(executor.map(produce_once, [output_path] * 4))
+
+            self.assertEqual(1, sum(produced))
+            with open(output_path + ".count") as f:
+                self.assertEqual("x", f.read())
+            with open(output_path) as f:
+                self.assertEqual("done", f.read())
+            self.assertEqual({"output.tif", "output.tif.count"}, set(os.listdir(folder)))
+
+    def test_era5_download(self):
+        """
+        Tests that concurrent ERA5 downloads of the same file retrieve it once
+        """
+        retrieved = []
+
+        class Client:
+            def retrieve(self, name, request, target):
+                retrieved.append(target)
+                time.sleep(0.5)
+                with open(target, "w") as f:
+                    f.write("grib")
+
+        with tempfile.TemporaryDirectory() as folder, mock.patch.object(era_download.cdsapi, "Client", Client):
+            file_path = os.path.join(folder, "era5.grib")
+            results = []
+
+            def download():
+                results.append(era_download.download_era5_reanalysis_data(
+                    era_download.Var.temperature_2m, date(2020, 1, 1), dt_time(12), "[0, 0, 0, 0]", "hourly",
+                    file_path))
+
+            threads = [threading.Thread(target=download) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual([partial_path(file_path)], retrieved)
+            self.assertEqual([file_path] * 3, results)
+            self.assertEqual(["era5.grib"], os.listdir(folder))
+
+
+if __name__ == '__main__':
+    unittest.main()
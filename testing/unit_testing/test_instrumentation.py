@@ -0,0 +1,150 @@
+import os
+import json
+import tempfile
+import unittest
+import threading
+from pixutils import instrumentation
+from pixutils.instrumentation import *
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.previous = set_sink(None)
+
+    def tearDown(self):
+        set_sink(self.previous)
+
+    def test_disabled(self):
+        """
+        Tests that nothing is recorded, and decorated functions still run, when there's no sink
+        """
+        @timed("work")
+        def work(x):
+            return x * 2
+
+        self.assertFalse(enabled())
+        self.assertEqual(4, work(2))
+        with timed("phase") as timer:
+            count("bytes", 10)
+        self.assertIsNone(timer._start)
+
+    def test_memory_sink(self):
+        sink = MemorySink()
+        set_sink(sink)
+
+        @timed("work", operation="double")
+        def work(x):
+            return x * 2
+
+        self.assertEqual(work.__name__, "work")
+        self.assertEqual(6, work(3))
+        with timed("transfer", source="ceres"):
+            count("bytes", 100, phase="transfer", source="ceres")
+            count("bytes", 50, phase="transfer", source="ceres")
+        with self.assertRaises(KeyError):
+            with timed("transfer", source="ceres"):
+                raise KeyError("x")
+
+        summary = sink.summary()
+        self.assertEqual(1, summary[("work", "timer", (("operation", "double"),))][0])
+        self.assertEqual((2, 150), summary[("bytes", "counter", (("phase", "transfer"), ("source", "ceres")))])
+        self.assertEqual(1, summary[("transfer", "timer", (("source", "ceres"),))][0])
+        self.assertEqual(1, summary[("transfer", "timer", (("error", "KeyError"), ("source", "ceres")))][0])
+        self.assertTrue(all(m.value >= 0 and m.pid == os.getpid() for m in sink.metrics))
+
+    def test_json_lines_sink(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "metrics.jsonl")
+            sink = sink_from_spec("jsonl:" + path)
+            set_sink(sink)
+            with timed("read", operation="derive"):
+                count("rows", 24, phase="read")
+            sink.close()
+
+            with open(path) as f:
+                records = [json.loads(line) for line in f]
+
+        self.assertEqual(["rows", "read"], [r["name"] for r in records])
+        self.assertEqual({"phase": "read"}, records[0]["labels"])
+        self.assertEqual("timer", records[1]["kind"])
+
+    def test_prometheus_sink(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "pixutils.prom")
+            sink = PrometheusSink(path, flush_interval=3600)
+            set_sink(sink)
+            for _ in range(2):
+                with timed("transfer", source="era5"):
+                    count("bytes", 1024, phase="transfer", source="era5")
+            sink.close()
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertIn("# TYPE pixutils_bytes_total counter", lines)
+        self.assertIn('pixutils_bytes_total{phase="transfer",source="era5"} 2048', lines)
+        self.assertIn('pixutils_transfer_calls_total{source="era5"} 2', lines)
+        self.assertTrue(any(line.startswith('pixutils_transfer_seconds_total{source="era5"} ') for line in lines))
+
+    def test_concurrent_flushes(self):
+        """
+        Tests that threads flushing the same Prometheus file at once don't collide on the temporary file
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "pixutils.prom")
+            sink = PrometheusSink(path, flush_interval=0)
+            set_sink(sink)
+            errors = []
+
+            def work():
+                try:
+                    for _ in range(50):
+                        count("bytes", 1)
+                        sink.flush()
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            sink.close()
+
+            self.assertEqual([], errors)
+            self.assertEqual(["pixutils.prom"], os.listdir(folder))
+            with open(path) as f:
+                self.assertIn("pixutils_bytes_total 400", f.read().splitlines())
+
+    def test_sink_errors(self):
+        """
+        Tests that a failing sink doesn't change the behaviour of the instrumented code
+        """
+        class FailingSink(MemorySink):
+            def write(self, metric):
+                raise OSError("disk full")
+
+        set_sink(FailingSink())
+
+        @timed("work")
+        def work(x):
+            return x * 2
+
+        with self.assertLogs("instrumentation", "WARNING"):
+            self.assertEqual(4, work(2))
+            count("bytes", 10)
+        with self.assertRaises(KeyError), self.assertLogs("instrumentation", "WARNING"):
+            with timed("phase"):
+                raise KeyError("x")
+
+    def test_sink_from_spec(self):
+        self.assertIsInstance(sink_from_spec("memory"), MemorySink)
+        with self.assertRaises(ValueError):
+            sink_from_spec("prometheus")
+        with self.assertRaises(ValueError):
+            sink_from_spec("statsd:localhost")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+from pixutils.job_scheduler import *
+
+
+def concatenate(output_path: str, *input_paths: str) -> str:
+    """
+    Writes the contents of the input files, and one line naming the output, to the output file
+    """
+    text = ""
+    for path in input_paths:
+        with open(path) as f:
+            text += f.read()
+    with open(output_path, "w") as f:
+        f.write(text + os.path.basename(output_path) + "\n")
+    return output_path
+
+
+def fail_if_exists(flag_path: str, output_path: str) -> str:
+    if os.path.exists(flag_path):
+        raise RuntimeError("Failed as '{}' exists.".format(flag_path))
+    return concatenate(output_path)
+
+
+def record_interval(output_path: str, seconds: float) -> None:
+    start = time.time()
+    time.sleep(seconds)
+    with open(output_path, "w") as f:
+        f.write("{} {}".format(start, time.time()))
+
+
+def exit_process(code: int) -> None:
+    """
+    Ends the worker process running the task, as if it were killed
+    """
+    os._exit(code)
+
+
+def call_exit(code: int) -> None:
+    sys.exit(code)
+
+
+def chain(folder: str, flag_path: str = None):
+    """
+    Returns tasks a -> b -> d and c -> d, with a failing if the flag file exists
+    """
+    path = lambda name: os.path.join(folder, name + ".txt")
+    a = Task("a", fail_if_exists, (flag_path or path("flag"), path("a")), outputs=[path("a")])
+    return [
+        Task("d", concatenate, (path("d"), path("b"), path("c")), inputs=[path("b"), path("c")], outputs=[path("d")]),
+        Task("b", concatenate, (path("b"), path("a")), inputs=[path("a")], outputs=[path("b")]),
+        Task("c", concatenate, (path("c"),), outputs=[path("c")], resources={"network": 1}),
+        a,
+    ]
+
+
+class TestTaskScheduler(unittest.TestCase):
+
+    def test_graph(self):
+        with tempfile.TemporaryDirectory() as folder:
+            scheduler = TaskScheduler(chain(folder), resources={"network": 1, "cpu": 2})
+            self.assertEqual({"b", "c"}, scheduler.depends["d"])
+            self.assertEqual({"a"}, scheduler.depends["b"])
+            self.assertEqual(["a", "b", "d"], scheduler.critical_path())
+
+    def test_run(self):
+        for max_workers in (1, 3):
+            with tempfile.TemporaryDirectory() as folder:
+                results = run_tasks(chain(folder), resources={"network": 1, "cpu": 2}, max_workers=max_workers)
+
+                self.assertEqual(["d", "b", "c", "a"], list(results))
+                self.assertTrue(all(r.status == DONE for r in results.values()))
+                with open(os.path.join(folder, "d.txt")) as f:
+                    self.assertEqual(["a.txt", "b.txt", "c.txt", "d.txt"], f.read().split())
+
+    def test_up_to_date(self):
+        with tempfile.TemporaryDirectory() as folder:
+            run_tasks(chain(folder), max_workers=1)
+            results = run_tasks(chain(folder), max_workers=1)
+            self.assertTrue(all(r.status == UP_TO_DATE for r in results.values()))
+
+            #   a changed input re-runs the tasks downstream of it
+            c_path = os.path.join(folder, "c.txt")
+            os.utime(c_path, ns=(os.stat(c_path).st_mtime_ns + 10 ** 9,) * 2)
+            results = run_tasks(chain(folder), max_workers=1)
+            self.assertEqual({"a": UP_TO_DATE, "b": UP_TO_DATE, "c": UP_TO_DATE, "d": DONE},
+                             {n: r.status for n, r in results.items()})
+
+            results = run_tasks(chain(folder), max_workers=1, force=True)
+            self.assertTrue(all(r.status == DONE for r in results.values()))
+
+    def test_resume(self):
+        with tempfile.TemporaryDirectory() as folder:
+            state_path = os.path.join(folder, "state.json")
+            flag_path = os.path.join(folder, "flag")
+            open(flag_path, "w").close()
+
+            results = run_tasks(chain(folder, flag_path), max_workers=2, state_path=state_path)
+            self.assertEqual({"a": FAILED, "b": BLOCKED, "c": DONE, "d": BLOCKED},
+                             {n: r.status for n, r in results.items()})
+            self.assertIsInstance(results["a"].error, RuntimeError)
+
+            os.remove(flag_path)
+            results = run_tasks(chain(folder, flag_path), max_workers=2, state_path=state_path)
+            self.assertEqual({"a": DONE, "b": DONE, "c": UP_TO_DATE, "d": DONE},
+                             {n: r.status for n, r in results.items()})
+
+            #   a changed definition re-runs the task, even though its output is newer than its inputs
+            tasks = chain(folder, flag_path)
+            tasks[2] = tasks[2]._replace(args=tasks[2].args + (os.path.join(folder, "a.txt"),))
+            results = run_tasks(tasks, max_workers=1, state_path=state_path)
+            self.assertEqual(DONE, results["c"].status)
+
+    def test_journal_fallback(self):
+        """
+        Tests that tasks with up to date outputs but no journal entry aren't run again
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            run_tasks(chain(folder), max_workers=1)
+            state_path = os.path.join(folder, "state.json")
+            results = run_tasks(chain(folder), max_workers=1, state_path=state_path)
+            self.assertTrue(all(r.status == UP_TO_DATE for r in results.values()))
+
+    def test_failed_outputs_rerun(self):
+        """
+        Tests that a task that failed is run again on resume, even if it left up to date outputs behind
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            state_path = os.path.join(folder, "state.json")
+            flag_path = os.path.join(folder, "flag")
+            run_tasks(chain(folder, flag_path), max_workers=1, state_path=state_path)
+            open(flag_path, "w").close()
+            results = run_tasks(chain(folder, flag_path), max_workers=1, state_path=state_path, force=True)
+            self.assertEqual(FAILED, results["a"].status)
+
+            os.remove(flag_path)
+            results = run_tasks(chain(folder, flag_path), max_workers=1, state_path=state_path)
+            self.assertEqual(DONE, results["a"].status)
+
+    def test_broken_pool(self):
+        """
+        Tests that the run returns when a worker process dies, failing or blocking the tasks that can't be run
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            tasks = chain(folder)
+            tasks[3] = tasks[3]._replace(function=exit_process, args=(1,), cost=10)
+            tasks[2] = tasks[2]._replace(resources=None)
+            #   one cpu slot, so 'a' heading the longest chain runs alone and 'c' is still to start when it dies
+            results = run_tasks(tasks, resources={"cpu": 1}, max_workers=2)
+
+            for name in ("a", "c"):
+                self.assertEqual(FAILED, results[name].status)
+                self.assertIsInstance(results[name].error, BrokenProcessPool)
+            self.assertEqual(BLOCKED, results["b"].status)
+            self.assertEqual(BLOCKED, results["d"].status)
+
+    def test_system_exit(self):
+        """
+        Tests that a task calling sys.exit() fails without stopping the run, in this process or in a worker
+        """
+        for max_workers in (1, 2):
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "b.txt")
+                tasks = [Task("a", call_exit, (1,)), Task("b", concatenate, (path,), outputs=[path])]
+                results = run_tasks(tasks, resources={"cpu": 1}, max_workers=max_workers)
+                self.assertEqual({"a": FAILED, "b": DONE}, {n: r.status for n, r in results.items()})
+                self.assertIsInstance(results["a"].error, SystemExit)
+
+    def test_resource_limits(self):
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [os.path.join(folder, "{}.txt".format(i)) for i in range(3)]
+            tasks = [Task(str(i), record_interval, (p, 0.3), outputs=[p], resources={"network": 1})
+                     for i, p in enumerate(paths)]
+            results = run_tasks(tasks, resources={"network": 1, "cpu": 4}, max_workers=3)
+            self.assertTrue(all(r.status == DONE for r in results.values()))
+
+            intervals = []
+            for path in paths:
+                with open(path) as f:
+                    intervals.append(tuple(map(float, f.read().split())))
+            intervals.sort()
+            for (_, end), (start, _) in zip(intervals, intervals[1:]):
+                self.assertLessEqual(end, start)
+
+    def test_missing_input(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_path = os.path.join(folder, "out.txt")
+            task = Task("x", concatenate, (output_path,), inputs=[os.path.join(folder, "missing.txt")],
+                        outputs=[output_path])
+            results = run_tasks([task], max_workers=1)
+            self.assertEqual(FAILED, results["x"].status)
+            self.assertIsInstance(results["x"].error, FileNotFoundError)
+
+    def test_invalid(self):
+        with tempfile.TemporaryDirectory() as folder:
+            a, b = (os.path.join(folder, n) for n in ("a", "b"))
+            with self.assertRaises(ValueError):
+                TaskScheduler([Task("x", concatenate, inputs=[a], outputs=[b]),
+                               Task("y", concatenate, inputs=[b], outputs=[a])])
+            with self.assertRaises(ValueError):
+                TaskScheduler([Task("x", concatenate, outputs=[a]), Task("y", concatenate, outputs=[a])])
+            with self.assertRaises(ValueError):
+                TaskScheduler([Task("x", concatenate), Task("x", concatenate)])
+            with self.assertRaises(ValueError):
+                TaskScheduler([Task("x", concatenate, depends=["z"])])
+            with self.assertRaises(ValueError):
+                TaskScheduler([Task("x", concatenate, resources={"gpu": 1})])
+
+
+if __name__ == '__main__':
+    unittest.main()
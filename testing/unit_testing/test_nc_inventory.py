@@ -0,0 +1,128 @@
+import os
+import time
+import tempfile
+import unittest
+import numpy as np
+from pixutils.nc_inventory import *
+from testing.unit_testing.fixtures import write_era5_netcdf
+
+
+def make_netcdf(path: str, variables=("t2m",), start_hour: int = 0, hours: int = 24,
+                lats=(50.0, 55.0), lons=(-5.0, 2.0)) -> None:
+    """
+    Writes a small ERA5-like netCDF file of hourly fields on a regular grid
+    """
+    write_era5_netcdf(path, variables, lats=np.linspace(lats[1], lats[0], 6), lons=np.linspace(lons[0], lons[1], 8),
+                      times=np.arange(start_hour, start_hour + hours), scale_factor=np.float32(0.5), units="K",
+                      attributes={"Conventions": "CF-1.6"})
+
+
+class TestReadHeader(unittest.TestCase):
+
+    def test_read_header(self):
+        """
+        Tests that dimensions, variables, attributes, coordinate bounds and the time range are read
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.nc")
+            make_netcdf(path, variables=("t2m", "tp"))
+            record = read_netcdf_header(path)
+
+        self.assertEqual({"Conventions": "CF-1.6"}, record["attributes"])
+        self.assertEqual({"size": 24, "unlimited": True}, record["dimensions"]["time"])
+        self.assertEqual(["time", "latitude", "longitude"], record["variables"]["t2m"]["dimensions"])
+        self.assertEqual([24, 6, 8], record["variables"]["tp"]["shape"])
+        self.assertEqual(0.5, record["variables"]["t2m"]["attributes"]["scale_factor"])
+        self.assertEqual({"axis": "lat", "size": 6, "min": 50.0, "max": 55.0}, record["coordinates"]["latitude"])
+        self.assertEqual(("lon", -5.0, 2.0), tuple(record["coordinates"]["longitude"][k] for k in ("axis", "min", "max")))
+        self.assertEqual({"variable": "time", "start": "2020-06-01T00:00:00", "end": "2020-06-01T23:00:00"},
+                         record["time"])
+
+
+class TestNcInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.data = os.path.join(self.folder.name, "data")
+        os.makedirs(os.path.join(self.data, "2020"))
+        make_netcdf(os.path.join(self.data, "2020", "june_01.nc"), ("t2m",), start_hour=0)
+        make_netcdf(os.path.join(self.data, "2020", "june_02.nc"), ("t2m", "tp"), start_hour=24)
+        make_netcdf(os.path.join(self.data, "tropics.nc"), ("tp",), start_hour=48, lats=(-10.0, 10.0),
+                    lons=(100.0, 120.0))
+        with open(os.path.join(self.data, "notes.txt"), "w") as f:
+            f.write("not a netcdf")
+        self.inventory = NcInventory(os.path.join(self.folder.name, "inventory.sqlite"))
+
+    def tearDown(self):
+        self.inventory.close()
+        self.folder.cleanup()
+
+    def path(self, *parts):
+        return os.path.join(self.data, *parts)
+
+    def test_scan_and_query(self):
+        self.assertEqual(3, self.inventory.scan(self.data, max_workers=2))
+
+        self.assertEqual([self.path("2020", "june_01.nc"), self.path("2020", "june_02.nc")],
+                         self.inventory.query(variable="t2m"))
+        self.assertEqual([self.path("2020", "june_02.nc")], self.inventory.query(variable="tp", end="2020-06-03"))
+        self.assertEqual([self.path("2020", "june_02.nc"), self.path("tropics.nc")],
+                         self.inventory.query(start="2020-06-02", end="2020-06-04"))
+        self.assertEqual([self.path("tropics.nc")], self.inventory.query(bbox=(90, -5, 130, 5)))
+        self.assertEqual([], self.inventory.query(variable="t2m", bbox=(90, -5, 130, 5)))
+        self.assertEqual(["time", "latitude", "longitude", "t2m", "tp"],
+                         list(self.inventory.header(self.path("2020", "june_02.nc"))["variables"]))
+
+    def test_query_longitudes(self):
+        """
+        Tests that bounding boxes match files whatever the longitude convention of either, and across the antimeridian
+        """
+        make_netcdf(self.path("global.nc"), ("sst",), lats=(-10.0, 10.0), lons=(0.0, 357.5))
+        make_netcdf(self.path("pacific.nc"), ("sst",), lats=(-10.0, 10.0), lons=(160.0, 200.0))
+        self.inventory.scan(self.data, max_workers=1)
+
+        query = lambda west, east: [os.path.basename(p) for p in self.inventory.query("sst", bbox=(west, -5, east, 5))]
+        self.assertEqual(["global.nc", "pacific.nc"], query(-175, -170))
+        self.assertEqual(["global.nc", "pacific.nc"], query(185, 190))
+        self.assertEqual(["global.nc", "pacific.nc"], query(175, -175))
+        self.assertEqual(["global.nc"], query(-20, -10))
+        self.assertEqual(["global.nc"], query(340, 350))
+        self.assertEqual(["global.nc", "pacific.nc"], query(-180, 180))
+
+    def test_missing_path(self):
+        """
+        Tests that a path that no longer exists is skipped rather than stopping the update
+        """
+        paths = find_netcdf_files(self.data)
+        with self.assertLogs("nc_inventory", "WARNING"):
+            self.assertEqual(3, self.inventory.update(paths + [self.path("deleted.nc")], max_workers=1))
+
+    def test_incremental(self):
+        """
+        Tests that unchanged files are skipped, changed files are re-read, and deleted files are removed
+        """
+        self.assertEqual(3, self.inventory.scan(self.data, max_workers=1))
+        self.assertEqual(0, self.inventory.scan(self.data, max_workers=1))
+
+        changed = self.path("2020", "june_01.nc")
+        make_netcdf(changed, ("t2m", "sp"), start_hour=0)
+        os.utime(changed, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        os.remove(self.path("tropics.nc"))
+
+        self.assertEqual(1, self.inventory.scan(self.data, max_workers=1))
+        self.assertEqual([changed], self.inventory.query(variable="sp"))
+        self.assertIsNone(self.inventory.header(self.path("tropics.nc")))
+
+    def test_unreadable_file(self):
+        """
+        Tests that files that can't be read are skipped rather than stopping the scan
+        """
+        with open(self.path("broken.nc"), "wb") as f:
+            f.write(b"not a netcdf")
+
+        self.assertEqual(3, self.inventory.scan(self.data, max_workers=1))
+        self.assertIsNone(self.inventory.header(self.path("broken.nc")))
+
+
+if __name__ == '__main__':
+    unittest.main()
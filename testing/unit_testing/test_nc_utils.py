@@ -0,0 +1,159 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+import netCDF4
+from pixutils.nc_utils import *
+from testing.unit_testing.fixtures import write_era5_netcdf
+
+
+class TestCoordinateSlices(unittest.TestCase):
+
+    def test_coordinate_slice(self):
+        values = np.arange(0, 10, dtype=float)
+        self.assertEqual(slice(2, 6), coordinate_slice(values, 2, 5))
+        self.assertEqual(slice(3, 6), coordinate_slice(values, 2.5, 5.5))
+        self.assertEqual(slice(10, 10), coordinate_slice(values, 20, 30))
+
+    def test_descending(self):
+        """
+        Tests that latitudes running north to south are handled
+        """
+        values = np.arange(90, -91, -1, dtype=float)
+        index = coordinate_slice(values, 49, 61)
+        np.testing.assert_array_equal(np.arange(61, 48, -1), values[index])
+
+    def test_longitude_slices(self):
+        lons_360 = np.arange(0, 360, 1.0)
+        lons_180 = np.arange(-180, 180, 1.0)
+
+        #   no wrap
+        self.assertEqual([slice(10, 21)], longitude_slices(lons_360, 10, 20))
+        self.assertEqual([slice(190, 201)], longitude_slices(lons_180, 10, 20))
+
+        #   -180-180 window on a 0-360 grid
+        self.assertEqual([slice(350, 356)], longitude_slices(lons_360, -10, -5))
+        self.assertEqual([slice(350, 360), slice(0, 11)], longitude_slices(lons_360, -10, 10))
+
+        #   across the antimeridian on a -180-180 grid, and 0-360 windows on a -180-180 grid
+        self.assertEqual([slice(350, 360), slice(0, 11)], longitude_slices(lons_180, 170, -170))
+        self.assertEqual([slice(350, 360), slice(0, 11)], longitude_slices(lons_180, 170, 190))
+
+        #   the whole globe
+        self.assertEqual([slice(0, 360)], longitude_slices(lons_360, -180, 180))
+
+
+class TestReadSubset(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "era5.nc")
+
+        self.lats = np.arange(90, -90.5, -2.5)
+        self.lons = np.arange(0, 360, 2.5)
+        self.data = np.arange(48 * self.lats.size * self.lons.size, dtype=np.float32).reshape(48, self.lats.size,
+                                                                                            self.lons.size)
+        write_era5_netcdf(self.path, lats=self.lats, lons=self.lons, times=np.arange(48),
+                          values=lambda name, start, stop: self.data[start:stop], chunksizes=(5, 20, 20), zlib=True)
+        self.nc_fid = netCDF4.Dataset(self.path, "r")
+
+    def tearDown(self):
+        self.nc_fid.close()
+        self.folder.cleanup()
+
+    def test_full(self):
+        subset = read_subset(self.nc_fid, "t2m")
+
+        np.testing.assert_array_equal(self.data, subset.data)
+        self.assertEqual(("time", "latitude", "longitude"), subset.dimensions)
+        np.testing.assert_array_equal(self.lons, subset.lons)
+        self.assertEqual(48, len(subset.times))
+
+    def test_bbox_and_time(self):
+        """
+        Tests that the box is inclusive, the time window is half open, and descending latitudes are handled
+        """
+        subset = read_subset(self.nc_fid, "t2m", bbox=(10, 50, 20, 60), time_window=("2020-06-01T06:00", "2020-06-02"))
+
+        lat_index = (self.lats >= 50) & (self.lats <= 60)
+        lon_index = (self.lons >= 10) & (self.lons <= 20)
+        np.testing.assert_array_equal(self.data[6:24][:, lat_index][:, :, lon_index], subset.data)
+        np.testing.assert_array_equal([60, 57.5, 55, 52.5, 50], subset.lats)
+        np.testing.assert_array_equal([10, 12.5, 15, 17.5, 20], subset.lons)
+        self.assertEqual(datetime(2020, 6, 1, 6), datetime.fromisoformat(subset.times[0].isoformat()))
+        self.assertEqual(18, len(subset.times))
+
+    def test_wrap(self):
+        """
+        Tests that a window across the 0/360 seam of the grid is read in two parts and joined west to east
+        """
+        subset = read_subset(self.nc_fid, "t2m", bbox=(-5, -2.5, 5, 2.5), time_window=(datetime(2020, 6, 2), None))
+
+        lat_index = np.abs(self.lats) <= 2.5
+        expected = np.concatenate([self.data[24:][:, lat_index][:, :, -2:], self.data[24:][:, lat_index][:, :, :3]],
+                                  axis=2)
+        np.testing.assert_array_equal(expected, subset.data)
+        np.testing.assert_array_equal([-5, -2.5, 0, 2.5, 5], subset.lons)
+
+    def test_empty(self):
+        subset = read_subset(self.nc_fid, "t2m", time_window=("2021-01-01", "2021-02-01"))
+        self.assertEqual((0, self.lats.size, self.lons.size), subset.data.shape)
+
+
+class TestBinnedRendering(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.x = rng.uniform(0, 360, 20000)
+        self.y = rng.uniform(-90, 90, 20000)
+        self.z = rng.normal(size=20000)
+
+    def test_bin_count_matches_histogram(self):
+        grid = bin_xyz(self.x, self.y, self.z, (18, 36), (0, 360, -90, 90), "count")
+        expected, _, _ = np.histogram2d(self.y, self.x, bins=(18, 36), range=((-90, 90), (0, 360)))
+
+        np.testing.assert_array_equal(expected, grid)
+
+    def test_bin_statistics(self):
+        """
+        Tests the mean, max and min of each cell against a per-cell loop
+        """
+        shape, extent = (6, 12), (0, 360, -90, 90)
+        rows = np.minimum((self.y + 90) // 30, 5).astype(int)
+        columns = np.minimum(self.x // 30, 11).astype(int)
+
+        for statistic, function in [("mean", np.mean), ("max", np.max), ("min", np.min)]:
+            grid = bin_xyz(self.x, self.y, self.z, shape, extent, statistic)
+            for r in range(6):
+                for c in range(12):
+                    values = self.z[(rows == r) & (columns == c)]
+                    self.assertAlmostEqual(function(values), grid[r, c])
+
+    def test_empty_cells_and_invalid_points(self):
+        """
+        Tests that cells without points are NaN, and that NaN, masked and out of extent points are ignored
+        """
+        x = np.array([0.5, 0.5, 1.5, 5.0, 0.5])
+        y = np.array([0.5, 0.5, 0.5, 0.5, 0.5])
+        z = np.ma.array([1.0, 3.0, np.nan, 7.0, 100.0], mask=[False, False, False, False, True])
+        grid = bin_xyz(x, y, z, (2, 2), (0, 2, 0, 2), "mean")
+
+        self.assertEqual(2.0, grid[0, 0])
+        self.assertTrue(np.isnan(grid[0, 1]))
+        self.assertTrue(np.isnan(grid[1, 1]))
+
+        with self.assertRaises(ValueError):
+            bin_xyz(x, y, z, (2, 2), (0, 2, 0, 2), "median")
+
+    def test_plotxyz_binned(self):
+        with tempfile.TemporaryDirectory() as folder:
+            pngfile = os.path.join(folder, "plot.png")
+            plotxyz(self.x, self.y, self.z, "Title", "Values", pngfile, mode="binned", statistic="max",
+                    shape=(90, 180))
+
+            self.assertTrue(os.path.getsize(pngfile) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import netCDF4
+from pixutils.point_extraction import *
+from testing.unit_testing.fixtures import write_era5_netcdf
+
+
+def make_netcdf(path: str, hours: int = 10, chunksizes=(4, 3, 5), lons=np.arange(0.0, 360.0, 30.0)) -> np.ndarray:
+    """
+    Writes an ERA5-like netCDF file of hourly fields on a global grid with descending latitudes, with known values.
+    Without chunk sizes the variable is contiguous.
+    :return: the field as (time, latitude, longitude)
+    """
+    lats = np.linspace(60.0, -60.0, 7)
+    field = (np.arange(hours)[:, None, None] * 1000 + np.arange(lats.size)[None, :, None] * 100 +
+             np.arange(lons.size)[None, None, :]).astype(np.float32)
+    write_era5_netcdf(path, lats=lats, lons=lons, times=np.arange(hours),
+                      values=lambda name, start, stop: field[start:stop], chunksizes=chunksizes,
+                      contiguous=chunksizes is None)
+    return field
+
+
+class TestGridIndex(unittest.TestCase):
+
+    def test_nearest(self):
+        index = GridIndex(np.array([10.0, 0.0, -10.0]), np.arange(0.0, 360.0, 10.0), [9, -4, 0], [-2, 14, 356])
+        np.testing.assert_array_equal([[0], [1], [1]], index.rows)
+        np.testing.assert_array_equal([[0], [1], [0]], index.columns)
+
+    def test_bilinear(self):
+        """
+        Tests that a linear field is reproduced exactly, including across the antimeridian of a global grid
+        """
+        grid_lats, grid_lons = np.array([20.0, 10.0, 0.0]), np.arange(-180.0, 180.0, 10.0)
+        field = np.add.outer(grid_lats, np.zeros(grid_lons.size)) + 0.1 * np.add.outer(np.zeros(3), grid_lons)
+        index = GridIndex(grid_lats, grid_lons, [12.5, 5, 15], [33, -178, 0], method="bilinear")
+
+        np.testing.assert_allclose([12.5 + 3.3, 5 - 17.8, 15], index.extract(field))
+        #   half way between the last column (170) and the first (-180)
+        index = GridIndex(grid_lats, grid_lons, [10], [175], method="bilinear")
+        np.testing.assert_allclose([10 + 0.5 * (17 - 18)], index.extract(field))
+
+    def test_outside_and_missing(self):
+        grid_lats, grid_lons = np.array([0.0, 1.0]), np.array([0.0, 1.0])
+        field = np.ma.masked_array([[1.0, 2.0], [3.0, 4.0]], mask=[[False, True], [False, False]])
+        index = GridIndex(grid_lats, grid_lons, [0, 10, 0.5], [0.5, 0, 0.5], method="bilinear")
+
+        np.testing.assert_allclose([1.0, np.nan, 8 / 3], index.extract(field))
+
+    def test_curvilinear(self):
+        """
+        Tests the KD-tree index on a 2-D grid against a brute force search
+        """
+        rows, columns = np.meshgrid(np.arange(20.0), np.arange(30.0), indexing="ij")
+        grid_lats, grid_lons = 40 + rows * 0.5 + columns * 0.1, -10 + columns * 0.5 - rows * 0.1
+        rng = np.random.default_rng(0)
+        lats, lons = rng.uniform(42, 48, 50), rng.uniform(-8, 2, 50)
+        index = GridIndex(grid_lats, grid_lons, lats, lons)
+
+        distance = (np.subtract.outer(lats, grid_lats.ravel()) ** 2 +
+                    (np.subtract.outer(lons, grid_lons.ravel()) * np.cos(np.radians(lats))[:, None]) ** 2)
+        expected = np.unravel_index(distance.argmin(axis=1), grid_lats.shape)
+        np.testing.assert_array_equal(expected[0], index.rows[:, 0])
+        np.testing.assert_array_equal(expected[1], index.columns[:, 0])
+
+        with self.assertRaises(ValueError):
+            GridIndex(grid_lats, grid_lons, lats, lons, method="bilinear")
+
+    def test_blocks(self):
+        """
+        Tests that every cell of every point is taken from exactly one chunk, which holds it
+        """
+        rng = np.random.default_rng(1)
+        index = GridIndex(np.linspace(60, -60, 121), np.arange(0.0, 360.0, 1.0), rng.uniform(-60, 60, 1000),
+                          rng.uniform(-180, 180, 1000), method="bilinear")
+        blocks = index.blocks((16, 32))
+
+        cells = np.concatenate([c for _, _, c in blocks])
+        np.testing.assert_array_equal(np.arange(4000), np.sort(cells))
+        for rows, columns, c in blocks:
+            self.assertLessEqual(rows.stop - rows.start, 16)
+            self.assertLessEqual(columns.stop - columns.start, 32)
+            self.assertTrue(np.all((index.rows.ravel()[c] >= rows.start) & (index.rows.ravel()[c] < rows.stop)))
+            self.assertTrue(np.all((index.columns.ravel()[c] >= columns.start) &
+                                   (index.columns.ravel()[c] < columns.stop)))
+
+
+class TestExtractNetcdf(unittest.TestCase):
+
+    def test_extract(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5.nc")
+            field = make_netcdf(path)
+            with netCDF4.Dataset(path) as nc:
+                values, times, index = extract_netcdf(nc, "t2m", [60, 0, -40, 20], [0, -30, 95, 359])
+                again, _, _ = extract_netcdf(nc, "t2m", None, None, index=index)
+
+        self.assertEqual((10, 4), values.shape)
+        np.testing.assert_array_equal(field[:, [0, 3, 5, 2], [0, 11, 3, 0]], values)
+        np.testing.assert_array_equal(values, again)
+        self.assertEqual(np.datetime64("2020-06-01T09:00"), times[-1])
+
+    def test_matches_full_read(self):
+        """
+        Tests that chunk-wise bilinear extraction of many points matches interpolating the whole field in memory
+        """
+        rng = np.random.default_rng(2)
+        lats, lons = rng.uniform(-60, 60, 500), rng.uniform(-180, 180, 500)
+        with tempfile.TemporaryDirectory() as folder:
+            for chunksizes in [(4, 3, 5), None]:
+                path = os.path.join(folder, "era5_{}.nc".format(chunksizes is None))
+                field = make_netcdf(path, chunksizes=chunksizes)
+                with netCDF4.Dataset(path) as nc:
+                    values, _, index = extract_netcdf(nc, "t2m", lats, lons, method="bilinear")
+                np.testing.assert_allclose(index.extract(field), values)
+
+    def test_dataframe(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "era5.nc")
+            make_netcdf(path, hours=3)
+            with netCDF4.Dataset(path) as nc:
+                values, times, _ = extract_netcdf(nc, "t2m", [0, 20], [0, 30])
+
+        frame = to_dataframe(values, times, point_ids=["a", "b"], name="t2m")
+        self.assertEqual(["time", "point", "t2m"], list(frame.columns))
+        self.assertEqual(6, len(frame))
+        self.assertEqual(["a", "b"] * 3, list(frame["point"]))
+        self.assertEqual(2000 + 201, frame["t2m"].iloc[5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from pixutils import product_catalog
+from pixutils.product_catalog import *
+
+S1_NAME = "S1A_IW_GRDH_1SDV_20190925T062938_20190925T063003_029174_035008_F845.SAFE.zip"
+S2_TITLE = "S2A_MSIL1C_20200617T105031_N0209_R051_T30UXC_20200617T125633"
+
+
+class TestProductCatalog(unittest.TestCase):
+    def setUp(self):
+        self.parent = tempfile.mkdtemp()
+        self.folder = os.path.join(self.parent, "zipped")
+        os.mkdir(self.folder)
+        for name in [S1_NAME, S2_TITLE + ".zip", "not_a_product.txt"]:
+            open(os.path.join(self.folder, name), "w").close()
+        self.catalog = ProductCatalog(default_catalog_path(self.folder))
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.parent)
+
+    def test_default_catalog_path(self):
+        self.assertEqual(os.path.join(self.parent, ".zipped" + DEFAULT_CATALOG_SUFFIX),
+                         default_catalog_path(self.folder + os.sep))
+
+    def test_lookup(self):
+        self.assertEqual(2, self.catalog.scan(self.folder))
+
+        self.assertTrue(self.catalog.contains(self.folder, S2_TITLE))
+        self.assertFalse(self.catalog.contains(self.folder, S2_TITLE.replace("T30UXC", "T30UXD")))
+        self.assertEqual([os.path.join(self.folder, S1_NAME)],
+                         self.catalog.find(self.folder, start_dates=["20190925"]))
+        self.assertEqual([os.path.join(self.folder, S2_TITLE + ".zip")],
+                         self.catalog.find(self.folder, start_dates=["20200617", "20200618"], suffix=".zip"))
+
+    def test_incremental_scan(self):
+        self.catalog.scan(self.folder)
+
+        #   an unchanged folder isn't re-listed, although each scan commits to the catalog
+        with mock.patch.object(product_catalog.os, "scandir", wraps=os.scandir) as scandir:
+            for _ in range(3):
+                self.assertEqual(0, self.catalog.scan(self.folder))
+            scandir.assert_not_called()
+
+        #   partial downloads are ignored
+        os.remove(os.path.join(self.folder, S1_NAME))
+        open(os.path.join(self.folder, S2_TITLE.replace("T30UXC", "T30UXD") + ".zip.incomplete"), "w").close()
+        os.utime(self.folder, ns=(0, os.stat(self.folder).st_mtime_ns + 1))
+
+        self.assertEqual(1, self.catalog.scan(self.folder))
+        self.assertEqual([], self.catalog.find(self.folder, start_dates=["20190925"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
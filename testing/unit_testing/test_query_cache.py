@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pixutils.query_cache import *
+
+FOOTPRINT = "POLYGON((-1 50, 1 50, 1 52, -1 52, -1 50))"
+QUERY_ARGS = dict(platformname="Sentinel-2", producttype="S2MSI1C", cloudcoverpercentage=(0, 60))
+
+
+class FakeAPI:
+    """
+    Stands in for sentinelsat.SentinelAPI, returning one product per day of the searched window
+    """
+    def __init__(self):
+        self.searches = []
+
+    def query(self, footprint, date, **kwargs):
+        self.searches.append(date)
+        start, end = (datetime.strptime(d, "%Y%m%d") for d in date)
+        return {"uuid-{:%Y%m%d}".format(start + timedelta(days=i)): {"beginposition": start + timedelta(days=i)}
+                for i in range((end - start).days)}
+
+
+class TestQueryCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.api = FakeAPI()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_query_key(self):
+        self.assertEqual(query_key(FOOTPRINT, **QUERY_ARGS),
+                         query_key("polygon ((-1 50,1 50, 1 52, -1 52, -1 50))", **QUERY_ARGS))
+        self.assertNotEqual(query_key(FOOTPRINT, **QUERY_ARGS),
+                            query_key(FOOTPRINT, "Sentinel-2", "S2MSI2A", (0, 60)))
+
+    def test_partial_overlap(self):
+        with QueryCache(os.path.join(self.folder, "cache.sqlite")) as cache:
+            cache.query(self.api, FOOTPRINT, date=("20200601", "20200611"), **QUERY_ARGS)
+            products = cache.query(self.api, FOOTPRINT, date=("20200605", "20200615"), **QUERY_ARGS)
+
+        #   only the uncovered part of the second window is searched
+        self.assertEqual([("20200601", "20200611"), ("20200611", "20200615")], self.api.searches)
+        self.assertEqual(["uuid-202006{:02}".format(d) for d in range(5, 15)], list(products))
+
+    def test_expiry(self):
+        with QueryCache(os.path.join(self.folder, "cache.sqlite"), ttl=timedelta(0)) as cache:
+            cache.query(self.api, FOOTPRINT, date=("20200601", "20200603"), **QUERY_ARGS)
+            cache.query(self.api, FOOTPRINT, date=("20200601", "20200603"), **QUERY_ARGS)
+
+        self.assertEqual(2, len(self.api.searches))
+
+
+if __name__ == '__main__':
+    unittest.main()
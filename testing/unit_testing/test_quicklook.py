@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import matplotlib.pyplot as plt
+from pixutils.quicklook import *
+from pixutils import quicklook as quicklook_module
+
+
+class TestDecimate(unittest.TestCase):
+
+    def test_shape(self):
+        """
+        Tests that the longest side is reduced to at most 'size' and the aspect ratio is kept
+        """
+        self.assertEqual((250, 125), decimate(np.zeros((1000, 500)), 256).shape)
+        self.assertEqual((100, 34), decimate(np.zeros((1000, 333)), 100).shape)
+        self.assertEqual((10, 20), decimate(np.zeros((10, 20)), 256).shape)
+        self.assertEqual((50, 50, 3), decimate(np.zeros((200, 200, 3)), 50).shape)
+
+    def test_block_average(self):
+        """
+        Tests that each output pixel is the mean of samples from its own block
+        """
+        blocks = np.arange(16, dtype=np.float32).reshape(4, 4)
+        array = np.kron(blocks, np.ones((8, 8))) + np.tile([[0, 1], [1, 0]], (16, 16))
+        result = decimate(array, 4, samples=2)
+
+        np.testing.assert_allclose(blocks + 0.5, result)
+
+    def test_nan(self):
+        array = np.ones((100, 100))
+        array[:50] = np.nan
+        array[50:, :50:2] = np.nan
+        result = decimate(array, 10)
+
+        self.assertTrue(np.all(np.isnan(result[:5])))
+        np.testing.assert_array_equal(np.ones((5, 10)), result[5:])
+
+    def test_memmap(self):
+        """
+        Tests that memory mapped arrays can be decimated
+        """
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "a.raw")
+            mapped = np.memmap(path, dtype=np.uint16, mode="w+", shape=(2000, 3000))
+            mapped[:] = 7
+            mapped.flush()
+            result = decimate(np.memmap(path, dtype=np.uint16, mode="r", shape=(2000, 3000)), 300)
+            del mapped
+
+        self.assertEqual((200, 300), result.shape)
+        self.assertTrue(np.all(result == 7))
+
+
+class TestQuicklook(unittest.TestCase):
+
+    def test_array_quicklook(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_path = os.path.join(folder, "scene.png")
+            array = np.add.outer(np.arange(3000), np.arange(2000)).astype(np.float32)
+            array[:100, :100] = np.nan
+
+            self.assertEqual(output_path, quicklook(array, output_path, size=300))
+            image = plt.imread(output_path)
+
+        self.assertEqual((300, 200, 4), image.shape)
+        self.assertEqual(0, image[0, 0, 3])
+        self.assertEqual(1, image[-1, -1, 3])
+
+    def test_rgb_quicklook(self):
+        with tempfile.TemporaryDirectory() as folder:
+            output_path = os.path.join(folder, "rgb.png")
+            quicklook(np.random.default_rng(0).random((400, 400, 3)), output_path, size=100)
+            image = plt.imread(output_path)
+
+        self.assertEqual((100, 100, 4), image.shape)
+
+    @unittest.skipIf(quicklook_module.gdal is None, "GDAL is not installed")
+    def test_batch(self):
+        from osgeo import gdal
+
+        with tempfile.TemporaryDirectory() as folder:
+            paths = []
+            for name in ["a", "b"]:
+                paths.append(os.path.join(folder, "{}.tif".format(name)))
+                dataset = gdal.GetDriverByName("GTiff").Create(paths[-1], 1000, 500, 1, gdal.GDT_Float32)
+                dataset.GetRasterBand(1).WriteArray(np.ones((500, 1000), np.float32))
+                dataset = None
+
+            outputs = quicklook_batch(paths + [os.path.join(folder, "missing.tif")],
+                                      os.path.join(folder, "quicklooks"), max_workers=2, size=100)
+
+            self.assertEqual((50, 100, 4), plt.imread(outputs[paths[0]]).shape)
+            self.assertIsNone(outputs[os.path.join(folder, "missing.tif")])
+
+
+if __name__ == '__main__':
+    unittest.main()
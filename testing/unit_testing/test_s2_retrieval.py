@@ -0,0 +1,69 @@
+import os
+import logging
+import tempfile
+import unittest
+from pixutils.instrumentation import MemorySink, set_sink
+from pixutils.product_catalog import ProductCatalog
+from testing.unit_testing.fixtures import fake_sentinelsat, import_s2_retrieval
+
+PRODUCTS = 5
+PAYLOAD_BYTES = 1024
+
+s2_retrieval = import_s2_retrieval(fake_sentinelsat(PRODUCTS, payload_bytes=PAYLOAD_BYTES))
+
+
+class TestS2Download(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.zip_folder = os.path.join(self.folder.name, "zip")
+        self.dl_folder = os.path.join(self.folder.name, "safe")
+        os.mkdir(self.zip_folder)
+        self.paths = [os.path.join(self.folder.name, n) for n in ("auth.txt", "tiles.csv", "aoi.geojson")]
+        for path, text in zip(self.paths, ["user,password\n", "Scenes\nS2A31UCS\n", "{}"]):
+            with open(path, "w") as f:
+                f.write(text)
+        self.logger = logging.getLogger("test_s2_retrieval")
+        self.sink = MemorySink()
+        self.previous = set_sink(self.sink)
+
+    def tearDown(self):
+        set_sink(self.previous)
+        self.folder.cleanup()
+
+    def test_download(self):
+        """
+        Tests a download against the stand-in hub, including the metrics recorded along the way
+        """
+        with ProductCatalog(os.path.join(self.folder.name, "catalog.db")) as catalog:
+            s2_retrieval._s2_download("20200601", "20200831", self.zip_folder, self.dl_folder, (0, 100), *self.paths,
+                                      "S2MSI2A", self.logger, catalog, None, None)
+
+        self.assertEqual(PRODUCTS, len([n for n in os.listdir(self.zip_folder) if n.endswith(".zip")]))
+        self.assertEqual(PRODUCTS, len([n for n in os.listdir(self.dl_folder) if n.endswith(".SAFE")]))
+
+        summary = self.sink.summary()
+        self.assertEqual((1, PRODUCTS), summary[("products", "counter", (("phase", "query"), ("source", "s2")))])
+        self.assertEqual((PRODUCTS, PRODUCTS * PAYLOAD_BYTES),
+                         summary[("bytes", "counter", (("phase", "transfer"), ("source", "s2")))])
+        self.assertEqual((PRODUCTS, PRODUCTS * PAYLOAD_BYTES),
+                         summary[("bytes", "counter", (("phase", "extraction"), ("source", "s2")))])
+        for phase in ("connect", "query", "transfer", "extraction"):
+            self.assertIn((phase, "timer", (("source", "s2"),)), summary)
+
+    def test_already_downloaded(self):
+        """
+        Tests that products already in the zip folder aren't downloaded again
+        """
+        arguments = ("20200601", "20200831", self.zip_folder, self.dl_folder, (0, 100), *self.paths, "S2MSI2A",
+                     self.logger)
+        s2_retrieval.s2_download(*arguments)
+        self.sink.metrics.clear()
+
+        s2files = s2_retrieval.s2_download(*arguments)
+        self.assertEqual(PRODUCTS, len(s2files))
+        self.assertNotIn(("transfer", "timer", (("source", "s2"),)), self.sink.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+from pixutils.safe_metadata import *
+from testing.unit_testing.fixtures import make_safe_stubs
+
+
+class TestSafeMetadata(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parse(self):
+        make_safe_stubs(self.folder, 1)
+        make_safe_stubs(self.folder, 1, zipped=True)
+        paths = find_products(self.folder)
+        self.assertEqual(2, len(paths))
+
+        for path in paths:
+            record = parse_product_metadata(path)
+            self.assertEqual("S2A_MSIL1C_20200617T000000_N0209_R051_T30UXC_20200617T125633.SAFE",
+                             record["product_uri"])
+            self.assertEqual("2020-06-17T10:50:31.024Z", record["sensing_time"])
+            self.assertEqual("02.09", record["processing_baseline"])
+            self.assertEqual(51, record["orbit_number"])
+            self.assertEqual(0.0, record["cloud_cover"])
+
+    def test_harvest(self):
+        make_safe_stubs(self.folder, 20)
+        with MetadataStore(os.path.join(self.folder, "metadata.sqlite")) as store:
+            self.assertEqual(20, store.harvest(find_products(self.folder), max_workers=2))
+
+            #   unchanged products aren't parsed again
+            self.assertEqual(0, store.harvest(find_products(self.folder), max_workers=1))
+
+            result = store.query(start="2020-06-17", end="2020-06-18", max_cloud_cover=4.5)
+            self.assertEqual([0, 1, 2, 3, 4], sorted(result["cloud_cover"].astype(int)))
+
+    def test_prune(self):
+        make_safe_stubs(self.folder, 5)
+        paths = find_products(self.folder)
+        with MetadataStore(os.path.join(self.folder, "metadata.sqlite")) as store:
+            store.harvest(paths, max_workers=1)
+
+            #   deleted products are pruned on the next harvest, and one whose metadata was removed is dropped
+            shutil.rmtree(paths[0])
+            os.remove(os.path.join(paths[1], "MTD_MSIL1C.xml"))
+            os.utime(paths[1], ns=(0, os.stat(paths[1]).st_mtime_ns + 10 ** 9))
+            self.assertEqual(0, store.harvest(find_products(self.folder), max_workers=1))
+            self.assertEqual(sorted(paths[2:]), sorted(store.query()["path"]))
+
+            shutil.rmtree(paths[2])
+            self.assertEqual(1, store.prune())
+            self.assertEqual(sorted(paths[3:]), sorted(store.query()["path"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
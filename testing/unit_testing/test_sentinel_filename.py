@@ -1,4 +1,7 @@
+import copy
+import pickle
 import unittest
+from datetime import datetime
 from pixutils.sentinel_filename import *
 
 
@@ -50,6 +53,67 @@ class TestSentinelFilename(unittest.TestCase):
                           parse_sentinel_filename,
                           "LC08_L1TP_200023_20180505_20180517_01_T1.tar")
 
+    def test_bulk(self):
+        result = parse_sentinel_filenames([
+            "/home/pixalytics/Desktop/batch_calibrate/in/S1A_IW_GRDH_1SDV_20190925T062938_20190925T063003_029174_035008_F845.SAFE.zip",
+            "LC08_L1TP_200023_20180505_20180517_01_T1.tar",
+            "S1B_IW_SLC__1SDV_20200229T235959_20200301T000010_020474_026CD1_ABCD.zip"])
+
+        self.assertEqual([True, False, True], result["valid"].tolist())
+        self.assertEqual(["S1A", "", "S1B"], result["mission_identifier"].tolist())
+        self.assertEqual(np.datetime64("2019-09-25T06:29:38"), result["start_date_time"][0])
+        self.assertEqual(np.datetime64("2020-03-01"), result["stop_date"][2])
+        self.assertEqual(np.timedelta64(10, "s"), result["stop_time"][2])
+        self.assertTrue(np.isnat(result["start_date"][1]))
+        self.assertEqual([29174, -1, 20474], result["absolute_orbit_number"].tolist())
+
+        #   the bulk parser agrees with the single filename parser
+        single = parse_sentinel_filename(result["filename"][2])
+        self.assertEqual(single.product_unique_identifier, result["product_unique_identifier"][2])
+        self.assertEqual(single.stop_date_time, result["stop_date_time"][2].item().strftime("%Y%m%dT%H%M%S"))
+
+    def test_product_name(self):
+        s1 = parse_product_name("/data/S1A_IW_GRDH_1SDV_20190925T062938_20190925T063003_029174_035008_F845.SAFE.zip")
+        self.assertIsInstance(s1, Sentinel1ProductName)
+        self.assertEqual("S1A_IW_GRDH_1SDV_20190925T062938_20190925T063003_029174_035008_F845", s1.title)
+        self.assertEqual(datetime(2019, 9, 25, 6, 30, 3), s1.stop_date_time)
+        self.assertEqual(29174, s1.absolute_orbit_number)
+        self.assertEqual("SAFE.zip", s1.product_format_extension)
+
+        s2 = parse_product_name("S2A_MSIL1C_20200617T105031_N0209_R051_T30UXC_20200617T125633")
+        self.assertIsInstance(s2, Sentinel2ProductName)
+        self.assertEqual("L1C", s2.processing_level)
+        self.assertEqual(datetime(2020, 6, 17, 10, 50, 31), s2.start_date_time)
+        self.assertEqual("02.09", s2.processing_baseline)
+        self.assertEqual(51, s2.relative_orbit_number)
+        self.assertEqual("T30UXC", s2.tile_number)
+        self.assertIsNone(s2.product_format_extension)
+
+        s3 = parse_product_name("S3A_OL_1_EFR____20200101T101010_20200101T101310_20200102T143025_0179_053_179_2160_"
+                                "LN1_O_NT_002.SEN3")
+        self.assertIsInstance(s3, Sentinel3ProductName)
+        self.assertEqual("EFR___", s3.data_type)
+        self.assertEqual("0179_053_179_2160", s3.instance_id)
+        self.assertEqual("SEN3", s3.product_format_extension)
+
+        #   records are compact and repeated names are served from the cache
+        self.assertFalse(hasattr(s2, "__dict__"))
+        self.assertIs(s2, parse_product_name("S2A_MSIL1C_20200617T105031_N0209_R051_T30UXC_20200617T125633"))
+
+        #   cached records can't be changed by one caller for all the others
+        with self.assertRaises(AttributeError):
+            s2.tile_number = "T31UCS"
+        with self.assertRaises(AttributeError):
+            del s2.title
+        self.assertEqual("T30UXC", s2.tile_number)
+        changed = s2._replace(tile_number="T31UCS")
+        self.assertEqual(("T31UCS", s2.title), (changed.tile_number, changed.title))
+        self.assertEqual(s2, pickle.loads(pickle.dumps(s2)))
+        self.assertEqual(s2, copy.copy(s2))
+
+        self.assertRaises(ValueError, parse_product_name, "LC08_L1TP_200023_20180505_20180517_01_T1.tar")
+        self.assertRaises(ValueError, parse_product_name, "S2A_MSIL1C_20200617T105031_N0209_R051")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from pixutils.bbox_utils import AoiIndex
+from pixutils.tile_registry import *
+
+#   two adjacent 1x1 degree tiles, and a third tile that isn't of interest
+GEOMETRIES = {
+    "30UXC": shapely.box(0, 50, 1, 51),
+    "30UXD": shapely.box(1, 50, 2, 51),
+    "31UCS": shapely.box(5, 50, 6, 51),
+}
+TITLE = "S2A_MSIL1C_20200617T105031_N0209_R051_{}_20200617T125633"
+
+
+class TestTileRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = TileRegistry(["T30UXC", "T30UXD"], GEOMETRIES)
+
+    def test_membership(self):
+        self.assertIn("T30UXC", self.registry)
+        self.assertIn("30uxd", self.registry)
+        self.assertNotIn("T31UCS", self.registry)
+
+    def test_footprint(self):
+        self.assertEqual({"30UXC"}, self.registry.tiles_for_footprint("POLYGON((0.2 50.2, 0.8 50.2, 0.8 50.8, 0.2 50.2))"))
+        self.assertEqual({"30UXC", "30UXD"}, self.registry.tiles_for_footprint(shapely.box(0.5, 50.5, 1.5, 50.6)))
+        self.assertIsNone(self.registry.query_footprint(shapely.box(5.2, 50.2, 5.8, 50.8)))
+
+        #   the search area is clipped to the tiles of interest
+        footprint = self.registry.query_footprint(shapely.box(-1, 50.5, 1.5, 52))
+        self.assertAlmostEqual(0.75, shapely.from_wkt(footprint).area)
+
+    def test_filter_products(self):
+        products = {
+            "a": {"title": TITLE.format("T30UXC"), "footprint": shapely.box(0, 50, 1, 51).wkt},
+            "b": {"title": TITLE.format("T30UXD"), "footprint": shapely.box(1, 50, 2, 51).wkt},
+            "c": {"title": TITLE.format("T31UCS"), "footprint": shapely.box(5, 50, 6, 51).wkt},
+        }
+        self.assertEqual(["a", "b"], list(self.registry.filter_products(products)))
+        self.assertEqual(["a"], list(self.registry.filter_products(products, shapely.box(0.2, 50.2, 0.8, 50.8))))
+
+        #   product footprints are used without tile geometries; products without one are kept, with a warning
+        registry = TileRegistry(["T30UXC", "T30UXD"])
+        del products["a"]["footprint"]
+        with self.assertLogs("tile_registry", "WARNING"):
+            self.assertEqual(["a"], list(registry.filter_products(products, shapely.box(5, 50, 6, 51))))
+        self.assertEqual(["a", "b"], list(registry.filter_products(products, shapely.box(1.2, 50.2, 1.8, 50.8))))
+
+    def test_filter_products_by_aois(self):
+        """
+        Tests that products intersecting any one of several areas of interest are kept
+        """
+        products = {k: {"title": TITLE.format("T30UXC"), "footprint": shapely.box(x, 50, x + 0.2, 51).wkt}
+                    for k, x in [("a", 0.1), ("b", 0.4), ("c", 0.7)]}
+        aois = AoiIndex([shapely.box(0, 50, 0.2, 51), shapely.box(0.8, 50, 1, 51)])
+        self.assertEqual(["a", "c"], list(self.registry.filter_products(products, aois)))
+
+
+if __name__ == '__main__':
+    unittest.main()
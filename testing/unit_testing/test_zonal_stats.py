@@ -0,0 +1,134 @@
+import os
+import json
+import tempfile
+import unittest
+import numpy as np
+from shapely.geometry import box, Polygon
+from pixutils import zonal_stats
+from pixutils.zonal_stats import *
+
+#   a 40 x 60 grid of 1 unit pixels, with its top left corner at (0, 40)
+GRID = GridDefinition(60, 40, (0.0, 1.0, 0.0, 40.0, 0.0, -1.0), "")
+
+
+def write_geojson(path: str, geometries, ids) -> None:
+    features = [{"type": "Feature", "properties": {"name": i}, "geometry": g.__geo_interface__}
+                for g, i in zip(geometries, ids)]
+    with open(path, "w") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+
+def pixel_centres():
+    columns, rows = np.meshgrid(np.arange(GRID.width) + 0.5, 40 - (np.arange(GRID.height) + 0.5))
+    return columns, rows
+
+
+class TestRasterise(unittest.TestCase):
+
+    def test_rasterise(self):
+        triangle = Polygon([(30, 5), (55, 5), (55, 35)])
+        with self.assertLogs("zonal_stats", "WARNING") as logs:
+            labels = rasterise([box(2, 10, 12, 30), None, triangle, box(8, 0, 20, 15)], GRID)
+        #   the overlap of the first and last boxes is reported
+        self.assertIn("20 pixels", logs.output[0])
+        self.assertIn("geometries 0 and 3 overlap", logs.output[0])
+
+        x, y = pixel_centres()
+        expected = np.zeros((GRID.height, GRID.width), dtype=LABEL_DTYPE)
+        expected[(x > 2) & (x < 12) & (y > 10) & (y < 30)] = 1
+        expected[(x > 30) & (x < 55) & (y > 5) & (y < 5 + (x - 30) * 30 / 25)] = 3
+        #   the later geometry wins where they overlap
+        expected[(x > 8) & (x < 20) & (y < 15)] = 4
+        np.testing.assert_array_equal(expected, labels)
+
+    def test_outside_grid(self):
+        with self.assertNoLogs("zonal_stats", "WARNING"):
+            labels = rasterise([box(100, 100, 110, 110), box(-5, -5, 1, 1)], GRID)
+        self.assertEqual({0, 2}, set(np.unique(labels)))
+        self.assertEqual(1, (labels == 2).sum())
+
+    def test_rotated(self):
+        with self.assertRaises(ValueError):
+            rasterise([box(0, 0, 1, 1)], GRID._replace(geotransform=(0, 1, 0.1, 40, 0, -1)))
+
+
+class TestZonalStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.vector_path = os.path.join(self.folder.name, "farms.geojson")
+        write_geojson(self.vector_path, [box(2, 10, 12, 30), box(30, 5, 55, 35), box(100, 100, 110, 110)],
+                      ["north", "east", "away"])
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_statistics(self):
+        zones = load_zones(self.vector_path, GRID, id_field="name")
+        rng = np.random.default_rng(0)
+        rasters = [300 + rng.standard_normal((GRID.height, GRID.width)) for _ in range(3)]
+        rasters[1][0:20, :] = np.nan
+        rasters[2][rasters[2] > 301] = -9999
+
+        #   one block per row, so statistics are merged across many blocks
+        block_bytes = zonal_stats.BLOCK_BYTES
+        zonal_stats.BLOCK_BYTES = 1
+        try:
+            stats = zonal_statistics(rasters, zones, nodata=-9999)
+        finally:
+            zonal_stats.BLOCK_BYTES = block_bytes
+
+        self.assertEqual(3, len(stats))
+        for raster, s in zip(rasters, stats):
+            np.testing.assert_array_equal(["north", "east", "away"], s.ids)
+            for i in range(2):
+                values = raster[zones.labels == i + 1]
+                values = values[np.isfinite(values) & (values != -9999)]
+                self.assertEqual(len(values), s.count[i])
+                np.testing.assert_allclose([values.mean(), values.min(), values.max(), values.std()],
+                                           [s.mean[i], s.min[i], s.max[i], s.std[i]], rtol=1e-12)
+            #   the zone outside the grid has no pixels
+            self.assertEqual(0, s.count[2])
+            self.assertTrue(np.isnan([s.mean[2], s.min[2], s.max[2], s.std[2]]).all())
+
+        frame = to_dataframe(stats, ["2020-06-01", "2020-06-02", "2020-06-03"])
+        self.assertEqual(["source", "zone", "count", "mean", "min", "max", "std"], list(frame.columns))
+        self.assertEqual(9, len(frame))
+
+    def test_not_aligned(self):
+        zones = load_zones(self.vector_path, GRID)
+        with self.assertRaises(ValueError):
+            zonal_statistics(np.zeros((10, 10)), zones)
+
+    def test_cache(self):
+        cache_folder = os.path.join(self.folder.name, "cache")
+        zones = load_zones(self.vector_path, GRID, cache_folder=cache_folder)
+        self.assertIs(zones, load_zones(self.vector_path, GRID, cache_folder=cache_folder))
+        self.assertFalse(zones.labels.flags.writeable)
+        np.testing.assert_array_equal([0, 1, 2], zones.ids)
+        self.assertEqual(1, len(os.listdir(cache_folder)))
+
+        #   the label raster is read back from the cache folder, rather than rasterised again
+        zonal_stats._load_zones.cache_clear()
+        rasterise = zonal_stats.rasterise
+        zonal_stats.rasterise = None
+        try:
+            cached = load_zones(self.vector_path, GRID, cache_folder=cache_folder)
+        finally:
+            zonal_stats.rasterise = rasterise
+        np.testing.assert_array_equal(zones.labels, cached.labels)
+
+        #   a changed layer is rasterised again
+        write_geojson(self.vector_path, [box(0, 0, 5, 5)], ["south"])
+        os.utime(self.vector_path, ns=(os.stat(self.vector_path).st_mtime_ns + 10 ** 9,) * 2)
+        changed = load_zones(self.vector_path, GRID, id_field="name", cache_folder=cache_folder)
+        np.testing.assert_array_equal(["south"], changed.ids)
+        self.assertEqual(25, (changed.labels == 1).sum())
+
+    def test_missing_id_field(self):
+        with self.assertRaises(ValueError):
+            read_zones(self.vector_path, "area")
+
+
+if __name__ == '__main__':
+    unittest.main()